@@ -0,0 +1,402 @@
+"""Bulk import of parents and children from CSV or JSON.
+
+Onboarding a class or an after-school program goes through one call instead
+of thousands of ``/auth/register`` requests::
+
+    python -m backend.bulk_import families.csv [--dry-run]
+
+or ``POST /api/auth/import`` with the file as multipart ``file``.
+
+Columns (CSV header / JSON keys): ``name``, ``role`` (parent/child), ``pin``,
+``email``, ``age``, ``daily_game_limit_minutes``, ``ref`` and either
+``parent_ref`` (the ``ref`` of a parent row in the same file) or
+``parent_id`` (an existing parent) for children. JSON is a list of objects,
+or ``{"users": [...]}``.
+
+Every row is validated up front and a bad row is reported with its number
+instead of aborting the import. PINs are bcrypt-hashed in a process pool of
+``BULK_IMPORT_WORKERS`` processes, users go in with one multi-row
+``INSERT … RETURNING`` per chunk and wallets with one executemany. A chunk
+that still hits a constraint (e.g. an e-mail registered meanwhile) is
+retried row by row, each in its own savepoint.
+
+bcrypt dominates the wall time (~0.25 s per PIN per core); rows without a
+PIN cost next to nothing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.database import Base, SessionLocal, engine
+from backend.models import ActivityWallet, User, UserRole
+from backend.schemas import BulkUserRow
+from backend.security import hash_pin
+
+logger = logging.getLogger(__name__)
+
+BULK_IMPORT_WORKERS = int(os.getenv("BULK_IMPORT_WORKERS", "0")) or os.cpu_count()
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", "5000"))
+BULK_IMPORT_CHUNK = 1000
+# Below this many PINs a process pool costs more than it saves
+POOL_MIN_PINS = 8
+
+
+class BulkImportError(ValueError):
+    """The file as a whole cannot be read (bad format, too many rows)."""
+
+
+@dataclass
+class ImportResult:
+    created: list[dict] = field(default_factory=list)
+    errors: list[dict] = field(default_factory=list)
+    dry_run: bool = False
+
+    def fail(self, row: int, error: str):
+        self.errors.append({"row": row, "error": error})
+
+    def summary(self) -> dict:
+        return {
+            "created": len(self.created),
+            "failed": len(self.errors),
+            "dry_run": self.dry_run,
+            "users": self.created,
+            "errors": sorted(self.errors, key=lambda e: e["row"]),
+        }
+
+
+# --- Parsing ---
+
+
+def parse_rows(content: str | bytes, fmt: str) -> list[dict]:
+    """Raw rows of a ``csv`` or ``json`` file; empty CSV cells are left out."""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(content))
+        rows = [
+            {
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if key and value and value.strip()
+            }
+            for row in reader
+        ]
+    elif fmt == "json":
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise BulkImportError(f"JSON を読み込めません: {e}") from e
+        rows = data.get("users") if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            raise BulkImportError("JSON はユーザーの配列である必要があります")
+    else:
+        raise BulkImportError(f"未対応の形式です: {fmt}")
+    if len(rows) > BULK_IMPORT_MAX_ROWS:
+        raise BulkImportError(
+            f"一度に取り込めるのは {BULK_IMPORT_MAX_ROWS} 件までです ({len(rows)} 件)"
+        )
+    return rows
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    if (filename or "").lower().endswith(".json") or "json" in (content_type or ""):
+        return "json"
+    return "csv"
+
+
+# --- PIN hashing ---
+
+
+def hash_pins(pins: list[Optional[str]], workers: int = BULK_IMPORT_WORKERS) -> list:
+    """bcrypt-hash ``pins`` (None stays None) on a process pool.
+
+    Workers are spawned, not forked: forking the server process would copy
+    its threads' locks, the event loop and open DB connections into them.
+    """
+    todo = [i for i, pin in enumerate(pins) if pin]
+    hashed: list[Optional[str]] = [None] * len(pins)
+    if workers <= 1 or len(todo) < POOL_MIN_PINS:
+        for i in todo:
+            hashed[i] = hash_pin(pins[i])
+        return hashed
+    chunksize = max(1, len(todo) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        for i, value in zip(
+            todo,
+            pool.map(hash_pin, [pins[i] for i in todo], chunksize=chunksize),
+            strict=False,
+        ):
+            hashed[i] = value
+    return hashed
+
+
+# --- Validation ---
+
+
+def _validate(db: Session, raw_rows: list, result: ImportResult) -> list[tuple]:
+    """``(row number, BulkUserRow)`` of the rows that can be imported.
+
+    Parents come first so children can resolve ``parent_ref``.
+    """
+    parsed: list[tuple[int, BulkUserRow]] = []
+    for number, raw in enumerate(raw_rows, start=1):
+        if not isinstance(raw, dict):
+            result.fail(number, "行の形式が正しくありません")
+            continue
+        try:
+            row = BulkUserRow.model_validate(raw)
+        except ValidationError as e:
+            result.fail(
+                number,
+                "; ".join(
+                    f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}"
+                    for err in e.errors()
+                ),
+            )
+            continue
+        if not row.name:
+            result.fail(number, "name: 名前は必須です")
+            continue
+        row.email = row.email or None  # blank e-mail would collide on UNIQUE
+        parsed.append((number, row))
+
+    emails = {row.email for _, row in parsed if row.email}
+    taken = _existing_emails(db, emails)
+    parent_ids = {row.parent_id for _, row in parsed if row.parent_id}
+    known_parents = _existing_parents(db, parent_ids)
+
+    seen_emails: set[str] = set()
+    parent_refs: set[str] = set()
+    valid = []
+    for number, row in sorted(parsed, key=lambda item: item[1].role != "parent"):
+        if row.email in taken:
+            result.fail(number, "このメールアドレスは既に登録されています")
+            continue
+        if row.email and row.email in seen_emails:
+            result.fail(number, "メールアドレスがファイル内で重複しています")
+            continue
+        if row.role == "parent":
+            if row.parent_ref or row.parent_id:
+                result.fail(number, "親ユーザーに親は指定できません")
+                continue
+            if row.ref and row.ref in parent_refs:
+                result.fail(number, f"ref '{row.ref}' がファイル内で重複しています")
+                continue
+            if row.ref:
+                parent_refs.add(row.ref)
+        elif row.parent_ref and row.parent_ref not in parent_refs:
+            result.fail(number, f"親 '{row.parent_ref}' がファイル内に見つかりません")
+            continue
+        elif row.parent_id and row.parent_id not in known_parents:
+            result.fail(number, f"親ユーザー {row.parent_id} が見つかりません")
+            continue
+        if row.email:
+            seen_emails.add(row.email)
+        valid.append((number, row))
+    return valid
+
+
+def _existing_emails(db: Session, emails: set[str]) -> set[str]:
+    found: set[str] = set()
+    emails_list = sorted(emails)
+    for start in range(0, len(emails_list), BULK_IMPORT_CHUNK):
+        batch = emails_list[start : start + BULK_IMPORT_CHUNK]
+        found.update(
+            email for (email,) in db.query(User.email).filter(User.email.in_(batch))
+        )
+    return found
+
+
+def _existing_parents(db: Session, parent_ids: set[int]) -> set[int]:
+    if not parent_ids:
+        return set()
+    return {
+        user_id
+        for (user_id,) in db.query(User.id).filter(
+            User.id.in_(parent_ids), User.role == UserRole.PARENT
+        )
+    }
+
+
+# --- Insert ---
+
+
+def _user_values(row: BulkUserRow, pin: Optional[str], parent_id) -> dict:
+    return {
+        "name": row.name,
+        "role": UserRole(row.role),
+        "pin": pin,
+        "email": row.email,
+        "parent_id": parent_id,
+        "age": row.age,
+        "daily_game_limit_minutes": row.daily_game_limit_minutes,
+    }
+
+
+def _insert_users(db: Session, batch: list[tuple], result: ImportResult) -> list:
+    """Insert ``(number, row, values)`` items; returns ``(number, row, id)``.
+
+    One multi-row INSERT per chunk; on a constraint violation the chunk is
+    redone row by row so only the offending rows are reported.
+    """
+    stmt = insert(User).returning(User.id, sort_by_parameter_order=True)
+    try:
+        with db.begin_nested():
+            ids = db.scalars(stmt, [values for _, _, values in batch]).all()
+        return [
+            (number, row, user_id)
+            for (number, row, _), user_id in zip(batch, ids, strict=False)
+        ]
+    except IntegrityError:
+        pass
+    inserted = []
+    for number, row, values in batch:
+        try:
+            with db.begin_nested():
+                user_id = db.scalars(stmt, [values]).one()
+        except IntegrityError as e:
+            result.fail(number, f"登録できませんでした: {e.orig}")
+            continue
+        inserted.append((number, row, user_id))
+    return inserted
+
+
+def _record(result: ImportResult, number: int, row: BulkUserRow, user_id):
+    result.created.append(
+        {
+            "row": number,
+            "id": user_id,
+            "name": row.name,
+            "role": row.role,
+            "ref": row.ref,
+        }
+    )
+
+
+def import_users(
+    db: Session,
+    raw_rows: list,
+    dry_run: bool = False,
+    workers: int = BULK_IMPORT_WORKERS,
+) -> dict:
+    """Validate, hash and insert ``raw_rows``; returns the per-row summary.
+
+    Committed chunk by chunk, so rows imported before an unexpected failure
+    stay imported.
+    """
+    result = ImportResult(dry_run=dry_run)
+    valid = _validate(db, raw_rows, result)
+    if dry_run:
+        for number, row in valid:
+            _record(result, number, row, None)
+        return result.summary()
+
+    pins = hash_pins([row.pin for _, row in valid], workers=workers)
+    parents = [
+        (n, r, p) for (n, r), p in zip(valid, pins, strict=False) if r.role == "parent"
+    ]
+    children = [
+        (n, r, p) for (n, r), p in zip(valid, pins, strict=False) if r.role == "child"
+    ]
+
+    parent_ids: dict[str, int] = {}
+    for start in range(0, len(parents), BULK_IMPORT_CHUNK):
+        batch = [
+            (number, row, _user_values(row, pin, None))
+            for number, row, pin in parents[start : start + BULK_IMPORT_CHUNK]
+        ]
+        for number, row, user_id in _insert_users(db, batch, result):
+            _record(result, number, row, user_id)
+            if row.ref:
+                parent_ids[row.ref] = user_id
+        db.commit()
+
+    for start in range(0, len(children), BULK_IMPORT_CHUNK):
+        batch = []
+        for number, row, pin in children[start : start + BULK_IMPORT_CHUNK]:
+            parent_id = row.parent_id
+            if row.parent_ref:
+                parent_id = parent_ids.get(row.parent_ref)
+                if parent_id is None:
+                    result.fail(number, f"親 '{row.parent_ref}' を登録できませんでした")
+                    continue
+            batch.append((number, row, _user_values(row, pin, parent_id)))
+        inserted = _insert_users(db, batch, result)
+        if inserted:
+            db.execute(
+                insert(ActivityWallet),
+                [
+                    {
+                        "child_id": user_id,
+                        "balance_minutes": 0,
+                        "daily_limit_minutes": row.daily_game_limit_minutes or 60,
+                    }
+                    for _, row, user_id in inserted
+                ],
+            )
+        for number, row, user_id in inserted:
+            _record(result, number, row, user_id)
+        db.commit()
+
+    logger.info(
+        f"Bulk import: {len(result.created)} created, {len(result.errors)} failed"
+    )
+    return result.summary()
+
+
+# --- CLI ---
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Import parents and children from CSV or JSON"
+    )
+    parser.add_argument("path", help="CSV or JSON file")
+    parser.add_argument(
+        "--format", choices=["csv", "json"], help="default: from the file extension"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=BULK_IMPORT_WORKERS,
+        help="processes for PIN hashing",
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.path, "rb") as f:
+        content = f.read()
+    rows = parse_rows(content, args.format or detect_format(args.path, None))
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        result = import_users(db, rows, dry_run=args.dry_run, workers=args.workers)
+    finally:
+        db.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    main()
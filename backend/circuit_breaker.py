@@ -0,0 +1,146 @@
+"""Circuit breaker with per-operation latency budgets for outbound calls.
+
+- closed: calls go through, each bounded by its operation's latency budget.
+  ``failure_threshold`` consecutive failures (errors or budget overruns)
+  open the circuit.
+- open: calls fail fast with :class:`CircuitOpenError` for ``reset_timeout``
+  seconds instead of queuing behind a dead upstream.
+- half-open: up to ``half_open_probes`` calls are let through as probes; a
+  success closes the circuit, a failure opens it again.
+
+Exceptions listed in ``ignore`` (e.g. a rejected session token) mean the
+upstream answered, so they count as successes for the breaker.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import enum
+import logging
+import time
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, enum.Enum):
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+        half_open_probes: int = 1,
+        budgets: dict[str, float] | None = None,
+        ignore: tuple[type[BaseException], ...] = (),
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = max(1, half_open_probes)
+        # operation -> latency budget in seconds (missing / 0 = unbounded)
+        self.budgets = budgets if budgets is not None else {}
+        self.ignore = ignore
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if (
+            self._state is CircuitState.OPEN
+            and time.monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            self._transition(CircuitState.HALF_OPEN)
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 unless open)."""
+        if self.state is not CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def reset(self):
+        self._transition(CircuitState.CLOSED)
+
+    async def call(self, operation: str, coro):
+        """Await ``coro`` under the breaker and ``operation``'s latency budget.
+
+        Raises :class:`CircuitOpenError` (closing ``coro`` unawaited) when the
+        circuit is open or every half-open probe slot is taken, and
+        ``TimeoutError`` when the budget is exceeded.
+        """
+        state = self.state
+        if state is CircuitState.OPEN or (
+            state is CircuitState.HALF_OPEN and self._probes >= self.half_open_probes
+        ):
+            coro.close()
+            metrics.CIRCUIT_BREAKER_REJECTIONS.inc(
+                breaker=self.name, operation=operation
+            )
+            raise CircuitOpenError(self.name, self.retry_after() or 1.0)
+
+        probe = state is CircuitState.HALF_OPEN
+        if probe:
+            self._probes += 1
+        try:
+            budget = self.budgets.get(operation)
+            result = await (asyncio.wait_for(coro, budget) if budget else coro)
+        except self.ignore:
+            self._record_success()
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._record_failure(operation, e)
+            raise
+        else:
+            self._record_success()
+            return result
+        finally:
+            if probe:
+                self._probes -= 1
+
+    def _record_success(self):
+        self._failures = 0
+        if self._state is not CircuitState.CLOSED:
+            self._transition(CircuitState.CLOSED)
+
+    def _record_failure(self, operation: str, error: Exception):
+        self._failures += 1
+        if self._state is CircuitState.HALF_OPEN or (
+            self._state is CircuitState.CLOSED
+            and self._failures >= self.failure_threshold
+        ):
+            logger.warning(
+                f"{self.name} circuit opened after {self._failures} failure(s); "
+                f"last: {operation} {error!r}"
+            )
+            self._transition(CircuitState.OPEN)
+
+    def _transition(self, state: CircuitState):
+        if state is CircuitState.OPEN:
+            self._opened_at = time.monotonic()
+        elif state is CircuitState.CLOSED:
+            self._failures = 0
+        if state is not self._state:
+            self._state = state
+            metrics.CIRCUIT_BREAKER_TRANSITIONS.inc(
+                breaker=self.name, state=state.value
+            )
@@ -0,0 +1,336 @@
+"""Response compression (gzip / brotli) for the large read endpoints.
+
+Compression is opt-in per route: decorate the endpoint function with
+:func:`compressible` (below the ``@router.get`` decorator) and
+:class:`CompressionMiddleware` will compress its responses when the client
+accepts it and the body is above ``COMPRESSION_MIN_SIZE`` bytes.
+
+- Buffered responses are compressed in one shot.
+- Streaming responses (e.g. NDJSON exports) are compressed chunk by chunk with
+  a sync flush after every chunk, so lines reach the client as they are produced.
+- Handlers that serve payloads from :class:`PrecompressedCache` return bytes that
+  are already encoded; the middleware leaves those untouched.
+
+brotli is optional — when the ``brotli`` package is missing only gzip is offered.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from itertools import chain
+from typing import Hashable, Iterable
+
+from sqlalchemy import event
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+_COMPRESSIBLE_ATTR = "__s2a_compressible__"
+
+
+def compressible(endpoint):
+    """Mark a route endpoint as eligible for response compression."""
+    setattr(endpoint, _COMPRESSIBLE_ATTR, True)
+    return endpoint
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """Pick the best supported encoding from an Accept-Encoding header."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+
+    def ok(name: str) -> bool:
+        return accepted.get(name, accepted.get("*", 0.0)) > 0
+
+    if brotli is not None and ok("br"):
+        return "br"
+    if ok("gzip"):
+        return "gzip"
+    return None
+
+
+class _StreamCompressor:
+    """Incremental gzip / brotli encoder."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + self._br.flush() if flush else out
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._gz.flush(zlib.Z_FINISH)
+
+
+def compress_bytes(body: bytes, encoding: str) -> bytes:
+    """Compress a complete body in one shot."""
+    compressor = _StreamCompressor(encoding)
+    return compressor.compress(body) + compressor.finish()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses of routes marked :func:`compressible`."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(scope, send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, scope, send, encoding: str, minimum_size: int):
+        self.scope = scope
+        self.downstream = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.passthrough = False
+        self.compressor: _StreamCompressor | None = None
+
+    def _eligible(self, message) -> bool:
+        # The router fills in scope["endpoint"] before the handler runs.
+        endpoint = self.scope.get("endpoint")
+        if not getattr(endpoint, _COMPRESSIBLE_ATTR, False):
+            return False
+        if message["status"] < 200 or message["status"] in (204, 304):
+            return False
+        headers = Headers(raw=message["headers"])
+        return "content-encoding" not in headers
+
+    async def send(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            if self._eligible(message):
+                self.start_message = message
+            else:
+                self.passthrough = True
+                await self.downstream(message)
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                # Small buffered body — not worth the CPU.
+                self.passthrough = True
+                await self.downstream(self.start_message)
+                await self.downstream(message)
+                return
+
+            self.compressor = _StreamCompressor(self.encoding)
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(compressed))
+                await self.downstream(self.start_message)
+                await self.downstream(
+                    {"type": "http.response.body", "body": compressed}
+                )
+                return
+            await self.downstream(self.start_message)
+
+        if more_body:
+            chunk = self.compressor.compress(body, flush=True)
+        else:
+            chunk = self.compressor.compress(body) + self.compressor.finish()
+        await self.downstream(
+            {"type": "http.response.body", "body": chunk, "more_body": more_body}
+        )
+
+
+class _CacheEntry:
+    """A serialized payload plus its lazily-built compressed variants."""
+
+    __slots__ = ("body", "created_at", "generation", "_variants", "_lock")
+
+    def __init__(self, body: bytes, generation: int):
+        self.body = body
+        self.created_at = time.monotonic()
+        self.generation = generation
+        self._variants: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding: str) -> bytes:
+        encoded = self._variants.get(encoding)
+        if encoded is None:
+            with self._lock:
+                encoded = self._variants.get(encoding)
+                if encoded is None:
+                    encoded = compress_bytes(self.body, encoding)
+                    self._variants[encoding] = encoded
+        return encoded
+
+
+class PrecompressedCache:
+    """Short-TTL cache of serialized JSON payloads.
+
+    Each entry keeps the compressed bytes per encoding, so repeated hits pay
+    for compression only once. A commit in this process that wrote to one of
+    ``tables`` (any table when None) bumps the cache generation, which
+    invalidates all entries written before it; read-only commits and writes
+    elsewhere (sync outbox, schedulers) leave the cache alone.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int = 512,
+        tables: Iterable[str] | None = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.tables = frozenset(tables) if tables is not None else None
+        self._entries: OrderedDict[Hashable, _CacheEntry] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        # session.info flag: this transaction wrote to a watched table
+        self._dirty_key = f"precompressed_cache_dirty_{id(self)}"
+        event.listen(Session, "after_flush", self._on_flush)
+        event.listen(Session, "do_orm_execute", self._on_execute)
+        event.listen(Session, "after_commit", self._on_commit)
+        event.listen(Session, "after_soft_rollback", self._on_rollback)
+
+    def _mark(self, session, tables: set[str]):
+        if self.tables is None or not self.tables.isdisjoint(tables):
+            session.info[self._dirty_key] = True
+
+    def _on_flush(self, session, flush_context):
+        objects = chain(session.new, session.dirty, session.deleted)
+        self._mark(
+            session,
+            {t.name for obj in objects for t in sa_inspect(obj).mapper.tables},
+        )
+
+    def _on_execute(self, orm_execute_state):
+        # Bulk insert()/update()/delete() statements bypass the flush
+        state = orm_execute_state
+        if state.is_insert or state.is_update or state.is_delete:
+            table = getattr(state.statement, "table", None)
+            if table is None:
+                state.session.info[self._dirty_key] = True
+            else:
+                self._mark(state.session, {table.name})
+
+    def _on_commit(self, session):
+        # A released savepoint is not visible to other sessions yet
+        if session.in_nested_transaction():
+            return
+        if session.info.pop(self._dirty_key, False):
+            self.invalidate_all()
+
+    def _on_rollback(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop(self._dirty_key, None)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def get(self, key: Hashable) -> _CacheEntry | None:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if (
+                entry.generation != self._generation
+                or time.monotonic() - entry.created_at > self.ttl
+            ):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, body: bytes, generation: int) -> _CacheEntry:
+        """Store ``body``; ``generation`` must be read before building it."""
+        entry = _CacheEntry(body, generation)
+        if self.ttl <= 0:
+            return entry
+        with self._lock:
+            if generation != self._generation:
+                # A commit landed while the payload was being built.
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+
+def precompressed_response(
+    request: Request,
+    entry: _CacheEntry,
+    media_type: str = "application/json",
+) -> Response:
+    """Build a response from a cache entry, reusing its compressed bytes."""
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    if encoding is None or len(entry.body) < COMPRESSION_MIN_SIZE:
+        return Response(content=entry.body, media_type=media_type)
+    return Response(
+        content=entry.variant(encoding),
+        media_type=media_type,
+        headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+    )
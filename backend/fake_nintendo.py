@@ -0,0 +1,499 @@
+"""Local stand-in for the Nintendo account / Parental Controls APIs.
+
+An aiohttp app implementing the endpoints ``pynintendoauth`` and
+``pynintendoparental`` call (token exchange, ``users/me``, owned devices,
+summaries, parental control settings, play timer updates), so the whole sync
+pipeline can be exercised — and load-tested — offline with realistic network
+behaviour:
+
+- latency: ``latency_ms`` ± ``latency_jitter_ms`` per request
+- errors: ``error_rate`` share of requests fail with 503, and requests beyond
+  ``rate_limit`` per second get 429
+- tokens: access tokens expire after ``access_token_ttl`` seconds (401 after
+  that), and an ``expired_token_rate`` share of session tokens is rejected
+  with ``invalid_grant`` (the app sees ``InvalidSessionTokenException``)
+- devices: ``devices_per_account`` Switch consoles per session token; limits
+  written through ``updatePlayTimer`` are kept per account
+
+Record/replay: with ``record_to`` the server forwards everything to the real
+Nintendo hosts and appends each exchange to a JSON-lines cassette. Tokens are
+redacted in the cassette, never in the response. With ``replay_from``, GET
+responses of the device APIs come from the cassette, and limits written since
+then are overlaid on them.
+
+Point the backend at it with ``NINTENDO_API_BASE_URL`` (see
+``backend/http_clients.py``)::
+
+    python -m backend.fake_nintendo --port 9100 --latency-ms 80 --error-rate 0.02
+    NINTENDO_API_BASE_URL=http://127.0.0.1:9100 uvicorn backend.main:app
+
+Requests arrive as ``/<original host>/<original path>``. ``GET /_fake/stats``
+returns request and injected-error counts.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import random
+import secrets
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+ACCOUNTS_HOST = "accounts.nintendo.com"
+ACCOUNT_API_HOST = "api.accounts.nintendo.com"
+PARENTAL_HOST = "app.lp1.znma.srv.nintendo.net"
+
+_REDACTED_KEYS = {
+    "session_token",
+    "session_token_code",
+    "session_token_code_verifier",
+    "access_token",
+    "id_token",
+    "refresh_token",
+}
+
+
+@dataclass
+class FakeNintendoConfig:
+    latency_ms: float = 80.0
+    latency_jitter_ms: float = 40.0
+    error_rate: float = 0.0
+    rate_limit: float = 0.0  # requests per second, 0 = unlimited
+    access_token_ttl: int = 900
+    expired_token_rate: float = 0.0
+    devices_per_account: int = 2
+    default_limit: int = 120
+    record_to: str | None = None
+    replay_from: str | None = None
+    seed: int = 0
+
+
+@dataclass
+class _Account:
+    account_id: str
+    devices: dict[str, dict]  # device id → raw ownedDevice
+    regulations: dict[str, dict] = field(default_factory=dict)  # device id → PTR
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {
+            k: "<redacted>" if k in _REDACTED_KEYS else _redact(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [_redact(v) for v in value]
+    return value
+
+
+def _default_regulations(limit: int) -> dict:
+    no_bedtime = {"enabled": False, "startingTime": None, "endingTime": None}
+    daily = {
+        "timeToPlayInOneDay": {"enabled": True, "limitTime": limit},
+        "bedtime": dict(no_bedtime),
+    }
+    return {
+        "timerMode": "DAILY",
+        "restrictionMode": "FORCED_TERMINATION",
+        "dailyRegulations": daily,
+        "eachDayOfTheWeekRegulations": {
+            day: copy.deepcopy(daily)
+            for day in (
+                "monday",
+                "tuesday",
+                "wednesday",
+                "thursday",
+                "friday",
+                "saturday",
+                "sunday",
+            )
+        },
+    }
+
+
+class FakeNintendoServer:
+    """In-process fake; ``await start()`` returns its base URL."""
+
+    def __init__(self, config: FakeNintendoConfig | None = None):
+        self.config = config or FakeNintendoConfig()
+        self.stats: Counter = Counter()
+        self._rng = random.Random(self.config.seed)
+        self._accounts: dict[str, _Account] = {}  # session token → account
+        # access / id token → (session token, expiry)
+        self._bearer_tokens: dict[str, tuple[str, float]] = {}
+        self._window = (0, 0)  # (second, requests) for rate_limit
+        self._cassette: dict[tuple, dict] = {}
+        self._replay_devices: set[str] = set()
+        self._record_file = None
+        self._upstream: aiohttp.ClientSession | None = None
+        self._runner: web.AppRunner | None = None
+        if self.config.replay_from:
+            self._load_cassette(self.config.replay_from)
+
+        self.app = web.Application()
+        self.app.router.add_get("/_fake/stats", self._stats)
+        self.app.router.add_route("*", "/{host}/{path:.*}", self._handle)
+
+    # --- Lifecycle ---
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        if self.config.record_to:
+            self._record_file = open(self.config.record_to, "a", encoding="utf-8")
+            self._upstream = aiohttp.ClientSession()
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        bound_port = self._runner.addresses[0][1]
+        return f"http://{host}:{bound_port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._upstream is not None:
+            await self._upstream.close()
+            self._upstream = None
+        if self._record_file is not None:
+            self._record_file.close()
+            self._record_file = None
+
+    # --- Request handling ---
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        host = request.match_info["host"]
+        path = "/" + request.match_info["path"]
+        self.stats[f"{request.method} {path}"] += 1
+
+        cfg = self.config
+        delay = cfg.latency_ms + self._rng.uniform(
+            -cfg.latency_jitter_ms, cfg.latency_jitter_ms
+        )
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if self._rate_limited():
+            self.stats["injected_429"] += 1
+            return self._problem(429, "Too many requests")
+        if cfg.error_rate and self._rng.random() < cfg.error_rate:
+            self.stats["injected_503"] += 1
+            return self._problem(503, "Service temporarily unavailable (fake)")
+
+        if self._upstream is not None:
+            return await self._forward(request, host, path)
+        if host == ACCOUNTS_HOST:
+            return await self._accounts_api(request, path)
+        if host == ACCOUNT_API_HOST and path.endswith("/users/me"):
+            return self._users_me(request)
+        if host == PARENTAL_HOST:
+            return await self._parental_api(request, path)
+        return self._problem(404, f"Unknown endpoint {host}{path}")
+
+    def _rate_limited(self) -> bool:
+        if self.config.rate_limit <= 0:
+            return False
+        second = int(time.monotonic())
+        window, count = self._window
+        count = count + 1 if window == second else 1
+        self._window = (second, count)
+        return count > self.config.rate_limit
+
+    @staticmethod
+    def _problem(status: int, detail: str) -> web.Response:
+        return web.json_response(
+            {"detail": detail, "status": status},
+            status=status,
+            content_type="application/problem+json",
+        )
+
+    # --- accounts.nintendo.com / api.accounts.nintendo.com ---
+
+    async def _accounts_api(self, request: web.Request, path: str) -> web.Response:
+        if path.endswith("/api/session_token"):
+            form = await request.post()
+            code = form.get("session_token_code", "")
+            return web.json_response({"session_token": f"fake-session-{code}"})
+        if path.endswith("/api/token"):
+            body = await request.json()
+            session_token = body.get("session_token") or ""
+            if self._session_expired(session_token):
+                self.stats["rejected_session_tokens"] += 1
+                return web.json_response({"error": "invalid_grant"}, status=400)
+            self._account(session_token)
+            # users/me takes the access token, the parental API the id token
+            access_token, id_token = (
+                secrets.token_urlsafe(24),
+                secrets.token_urlsafe(24),
+            )
+            now = time.time()
+            if len(self._bearer_tokens) > 10000:
+                self._bearer_tokens = {
+                    k: v for k, v in self._bearer_tokens.items() if v[1] > now
+                }
+            expiry = now + self.config.access_token_ttl
+            self._bearer_tokens[access_token] = (session_token, expiry)
+            self._bearer_tokens[id_token] = (session_token, expiry)
+            return web.json_response(
+                {
+                    "access_token": access_token,
+                    "id_token": id_token,
+                    "expires_in": self.config.access_token_ttl,
+                    "token_type": "Bearer",
+                    "scope": ["openid", "user"],
+                }
+            )
+        return self._problem(404, f"Unknown endpoint {path}")
+
+    def _users_me(self, request: web.Request) -> web.Response:
+        account = self._authorized(request)
+        if account is None:
+            return self._problem(401, "Invalid token")
+        return web.json_response(
+            {"id": account.account_id, "nickname": "FakeParent", "country": "JP"}
+        )
+
+    def _session_expired(self, session_token: str) -> bool:
+        if not session_token or self.config.expired_token_rate <= 0:
+            return not session_token
+        # Deterministic per token: an expired token stays expired
+        digest = hashlib.sha256(session_token.encode()).digest()
+        return (
+            int.from_bytes(digest[:4], "big") / 2**32 < self.config.expired_token_rate
+        )
+
+    def _account(self, session_token: str) -> _Account:
+        account = self._accounts.get(session_token)
+        if account is None:
+            account_id = hashlib.sha256(session_token.encode()).hexdigest()[:16]
+            devices = {}
+            for i in range(self.config.devices_per_account):
+                device_id = f"{account_id}{i:04d}"
+                devices[device_id] = {
+                    "deviceId": device_id,
+                    "label": f"Switch {i + 1}",
+                    "platformGeneration": "P00",
+                    "parentalControlSettingState": {"updatedAt": int(time.time())},
+                    "alarmSetting": {"visibility": "VISIBLE"},
+                    "synchronizedParentalControlSetting": {
+                        "synchronizedAt": int(time.time())
+                    },
+                }
+            account = _Account(account_id=account_id, devices=devices)
+            self._accounts[session_token] = account
+        return account
+
+    def _authorized(self, request: web.Request) -> _Account | None:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        session = self._bearer_tokens.get(token)
+        if session is None or session[1] < time.time():
+            self.stats["unauthorized"] += 1
+            return None
+        return self._account(session[0])
+
+    # --- app.lp1.znma.srv.nintendo.net ---
+
+    async def _parental_api(self, request: web.Request, path: str) -> web.Response:
+        account = self._authorized(request)
+        if account is None:
+            return self._problem(401, "Invalid token")
+        device_id = request.query.get("deviceId")
+
+        if request.method == "POST" and path.endswith("/updatePlayTimer"):
+            body = await request.json()
+            device_id = body.get("deviceId")
+            if not self._has_device(account, device_id):
+                return self._problem(404, "Device not found")
+            account.regulations[device_id] = body.get("playTimerRegulations") or {}
+            return web.json_response(self._pcs(account, device_id))
+
+        if request.method == "GET" and self._cassette:
+            recorded = self._cassette.get((path, tuple(sorted(request.query.items()))))
+            if recorded is not None:
+                return web.json_response(
+                    self._overlay(account, path, device_id, recorded["body"]),
+                    status=recorded["status"],
+                )
+
+        if path.endswith("/fetchOwnedDevices"):
+            return web.json_response({"ownedDevices": list(account.devices.values())})
+        if device_id is not None and not self._has_device(account, device_id):
+            return self._problem(404, "Device not found")
+        if path.endswith("/fetchOwnedDevice"):
+            return web.json_response(
+                {"ownedDevice": {"device": self._device(account, device_id)}}
+            )
+        if path.endswith("/fetchParentalControlSetting"):
+            return web.json_response(self._pcs(account, device_id))
+        if path.endswith("/fetchDailySummaries"):
+            today = date.today().isoformat()
+            return web.json_response(
+                {
+                    "dailySummaries": [
+                        {
+                            "date": today,
+                            "playingTime": 0,
+                            "disabledTime": 0,
+                            "exceededTime": 0,
+                            "players": [],
+                        }
+                    ]
+                }
+            )
+        if path.endswith("/fetchLatestMonthlySummary"):
+            return web.json_response({"available": []})
+        return self._problem(404, f"Unknown endpoint {path}")
+
+    def _has_device(self, account: _Account, device_id: str | None) -> bool:
+        return device_id in account.devices or device_id in self._replay_devices
+
+    def _device(self, account: _Account, device_id: str) -> dict:
+        return account.devices.get(device_id) or {"deviceId": device_id}
+
+    def _pcs(self, account: _Account, device_id: str) -> dict:
+        regulations = account.regulations.get(device_id) or _default_regulations(
+            self.config.default_limit
+        )
+        return {
+            "parentalControlSetting": {
+                "playTimerRegulations": copy.deepcopy(regulations),
+                "functionalRestrictionLevel": "CHILDREN",
+                "whitelistedApplicationList": [],
+                "customSettings": {},
+                "etag": hashlib.md5(
+                    json.dumps(regulations, sort_keys=True).encode()
+                ).hexdigest(),
+            },
+            "ownedDevice": {"device": self._device(account, device_id)},
+        }
+
+    def _overlay(self, account: _Account, path, device_id, body: dict) -> dict:
+        """Recorded body with limits written since then applied."""
+        body = copy.deepcopy(body)
+        regulations = account.regulations.get(device_id)
+        if regulations and path.endswith("/fetchParentalControlSetting"):
+            body.setdefault("parentalControlSetting", {})["playTimerRegulations"] = (
+                copy.deepcopy(regulations)
+            )
+        return body
+
+    # --- Record / replay ---
+
+    def _load_cassette(self, filename: str):
+        with open(filename, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["host"] != PARENTAL_HOST or entry["method"] != "GET":
+                    continue
+                key = (entry["path"], tuple(sorted(entry["query"].items())))
+                self._cassette[key] = entry
+                for device in (entry.get("body") or {}).get("ownedDevices", []):
+                    self._replay_devices.add(device["deviceId"])
+        logger.info(f"Replaying {len(self._cassette)} recorded responses")
+
+    async def _forward(
+        self, request: web.Request, host: str, path: str
+    ) -> web.Response:
+        headers = {
+            k: v
+            for k, v in request.headers.items()
+            if k.lower() not in ("host", "content-length")
+        }
+        body = await request.read()
+        async with self._upstream.request(
+            request.method,
+            f"https://{host}{path}",
+            params=request.query,
+            headers=headers,
+            data=body or None,
+        ) as upstream:
+            payload = await upstream.read()
+            content_type = upstream.content_type
+            status = upstream.status
+        try:
+            parsed = json.loads(payload) if payload else None
+        except ValueError:
+            parsed = None
+        self._record_file.write(
+            json.dumps(
+                {
+                    "recorded_at": datetime.utcnow().isoformat(),
+                    "method": request.method,
+                    "host": host,
+                    "path": path,
+                    "query": _redact(dict(request.query)),
+                    "status": status,
+                    "body": _redact(parsed),
+                },
+                ensure_ascii=False,
+            )
+            + "\n"
+        )
+        self._record_file.flush()
+        return web.Response(body=payload, status=status, content_type=content_type)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local fake Nintendo API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=40.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--rate-limit", type=float, default=0.0, help="requests/s before 429"
+    )
+    parser.add_argument("--token-ttl", type=int, default=900)
+    parser.add_argument("--expired-token-rate", type=float, default=0.0)
+    parser.add_argument("--devices", type=int, default=2, help="devices per account")
+    parser.add_argument("--seed", type=int, default=0)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--record", metavar="FILE", help="proxy to Nintendo and record")
+    mode.add_argument("--replay", metavar="FILE", help="serve recorded responses")
+    return parser.parse_args(argv)
+
+
+async def serve(argv=None):
+    args = parse_args(argv)
+    server = FakeNintendoServer(
+        FakeNintendoConfig(
+            latency_ms=args.latency_ms,
+            latency_jitter_ms=args.latency_jitter_ms,
+            error_rate=args.error_rate,
+            rate_limit=args.rate_limit,
+            access_token_ttl=args.token_ttl,
+            expired_token_rate=args.expired_token_rate,
+            devices_per_account=args.devices,
+            record_to=args.record,
+            replay_from=args.replay,
+            seed=args.seed,
+        )
+    )
+    base_url = await server.start(args.host, args.port)
+    print(f"Fake Nintendo API listening — export NINTENDO_API_BASE_URL={base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,489 @@
+"""Fleet-wide Switch limit push (every linked household in one run).
+
+Used at the daily reset (in-process scheduler, ``SWITCH_FLEET_SCHEDULE``) or
+after a bulk rule change (``python -m backend.fleet_sync run``). For every
+parent with a ``nintendo_session_token`` each child's limit is applied to the
+child's consoles (:func:`sync_utils.household_targets`) with
+:func:`sync_utils.apply_switch_limit` (delta only, so accounts already at the
+target cost no Nintendo call).
+
+Budgeting:
+
+- every outbound Nintendo call made by the run takes a token from one shared
+  :class:`TokenBucket` (``SWITCH_FLEET_RATE`` calls/s, bursts up to
+  ``SWITCH_FLEET_BURST``). A run over N accounts therefore takes about
+  ``calls_per_account * N / SWITCH_FLEET_RATE`` seconds, e.g. 3 calls × 5,000
+  accounts at 10 calls/s ≈ 25 min. Interactive requests are not charged.
+- at most ``SWITCH_FLEET_CONCURRENCY`` accounts are in flight.
+- each account gets its own DB session and ``SWITCH_FLEET_ACCOUNT_TIMEOUT``;
+  a failing account is counted and logged and never stops the run.
+
+Progress is kept in a ``SwitchFleetRun`` row (counters, cursor, heartbeat),
+saved every ``SWITCH_FLEET_PROGRESS_EVERY`` accounts. A run whose heartbeat is
+older than ``SWITCH_FLEET_LEASE`` seconds was abandoned (crash / deploy) and is
+resumed from its cursor by ``resume`` or the next scheduler tick. Accounts
+finished past the cursor are pushed again on resume (harmless: delta only).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from datetime import time as dt_time
+
+from pynintendoauth.exceptions import InvalidSessionTokenException
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend import metrics
+from backend.database import Base, SessionLocal, engine
+from backend.models import (
+    FleetRunStatus,
+    SwitchFleetRun,
+    User,
+    UserRole,
+)
+from backend.switch_service import nintendo_call_budget
+from backend.sync_utils import apply_switch_limit, household_targets
+
+logger = logging.getLogger(__name__)
+
+SWITCH_FLEET_RATE = float(os.getenv("SWITCH_FLEET_RATE", "5"))
+SWITCH_FLEET_BURST = float(os.getenv("SWITCH_FLEET_BURST", "10"))
+SWITCH_FLEET_CONCURRENCY = int(os.getenv("SWITCH_FLEET_CONCURRENCY", "8"))
+SWITCH_FLEET_ACCOUNT_TIMEOUT = float(os.getenv("SWITCH_FLEET_ACCOUNT_TIMEOUT", "120"))
+SWITCH_FLEET_PAGE_SIZE = int(os.getenv("SWITCH_FLEET_PAGE_SIZE", "500"))
+SWITCH_FLEET_PROGRESS_EVERY = int(os.getenv("SWITCH_FLEET_PROGRESS_EVERY", "25"))
+SWITCH_FLEET_LEASE = float(os.getenv("SWITCH_FLEET_LEASE", "300"))
+# Daily push time "HH:MM" (server local time); empty disables the scheduler.
+SWITCH_FLEET_SCHEDULE = os.getenv("SWITCH_FLEET_SCHEDULE", "")
+SWITCH_FLEET_CHECK_INTERVAL = float(os.getenv("SWITCH_FLEET_CHECK_INTERVAL", "60"))
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, at most ``burst`` saved.
+
+    Waiters are served in arrival order. ``rate <= 0`` disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+def _linked_parents(db: Session):
+    return db.query(User.id).filter(
+        User.role == UserRole.PARENT, User.nintendo_session_token.isnot(None)
+    )
+
+
+def run_summary(run: SwitchFleetRun) -> dict:
+    end = run.finished_at or datetime.utcnow()
+    return {
+        "id": run.id,
+        "trigger": run.trigger,
+        "status": FleetRunStatus(run.status).value,
+        "total": run.total,
+        "processed": run.processed,
+        "synced": run.synced,
+        "skipped": run.skipped,
+        "failed": run.failed,
+        "cursor": run.cursor,
+        "last_error": run.last_error,
+        "started_at": run.started_at.isoformat(),
+        "finished_at": run.finished_at.isoformat() if run.finished_at else None,
+        "elapsed_s": round((end - run.started_at).total_seconds(), 1),
+    }
+
+
+def recent_runs(db: Session, limit: int = 10) -> list[dict]:
+    runs = (
+        db.query(SwitchFleetRun).order_by(SwitchFleetRun.id.desc()).limit(limit).all()
+    )
+    return [run_summary(r) for r in runs]
+
+
+class FleetPush:
+    """Pushes limits to every linked account within a shared call budget."""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        *,
+        rate: float = SWITCH_FLEET_RATE,
+        burst: float = SWITCH_FLEET_BURST,
+        concurrency: int = SWITCH_FLEET_CONCURRENCY,
+    ):
+        self._session_factory = session_factory
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = max(1, concurrency)
+
+    async def run(
+        self, trigger: str = "manual", schedule_key: str | None = None
+    ) -> dict | None:
+        """Start a new run. Returns its summary, or None if it was not started
+        (another run is active, or ``schedule_key`` was already taken)."""
+        run_id = self._create(trigger, schedule_key)
+        if run_id is None:
+            return None
+        return await self._execute(run_id)
+
+    async def resume(self) -> list[dict]:
+        """Finish every abandoned run (stale heartbeat) from its cursor."""
+        summaries = []
+        while (run_id := self._claim_abandoned()) is not None:
+            summaries.append(await self._execute(run_id))
+        return summaries
+
+    # --- Run bookkeeping ---
+
+    def _stale_before(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=SWITCH_FLEET_LEASE)
+
+    def _create(self, trigger: str, schedule_key: str | None) -> int | None:
+        db = self._session_factory()
+        try:
+            active = (
+                db.query(SwitchFleetRun.id)
+                .filter(
+                    SwitchFleetRun.status == FleetRunStatus.RUNNING,
+                    SwitchFleetRun.heartbeat_at >= self._stale_before(),
+                )
+                .first()
+            )
+            if active is not None:
+                logger.info(f"Fleet push not started: run {active.id} is active")
+                return None
+            run = SwitchFleetRun(
+                trigger=trigger,
+                schedule_key=schedule_key,
+                total=_linked_parents(db).count(),
+            )
+            db.add(run)
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                logger.info(f"Fleet push {schedule_key} already started elsewhere")
+                return None
+            logger.info(f"Fleet push run {run.id} started: {run.total} account(s)")
+            return run.id
+        finally:
+            db.close()
+
+    def _claim_abandoned(self) -> int | None:
+        db = self._session_factory()
+        try:
+            stale = self._stale_before()
+            run = (
+                db.query(SwitchFleetRun)
+                .filter(
+                    SwitchFleetRun.status == FleetRunStatus.RUNNING,
+                    SwitchFleetRun.heartbeat_at < stale,
+                )
+                .order_by(SwitchFleetRun.id)
+                .first()
+            )
+            if run is None:
+                return None
+            # Conditional UPDATE so only one process takes the run over
+            result = db.execute(
+                update(SwitchFleetRun)
+                .where(
+                    SwitchFleetRun.id == run.id,
+                    SwitchFleetRun.heartbeat_at == run.heartbeat_at,
+                )
+                .values(heartbeat_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            if result.rowcount != 1:
+                return None
+            logger.info(
+                f"Resuming fleet push run {run.id} after parent {run.cursor} "
+                f"({run.processed}/{run.total} done)"
+            )
+            return run.id
+        finally:
+            db.close()
+
+    def _save(self, db: Session, run: SwitchFleetRun):
+        run.heartbeat_at = datetime.utcnow()
+        db.commit()
+        logger.info(
+            f"Fleet push run {run.id}: {run.processed}/{run.total} "
+            f"(synced {run.synced}, skipped {run.skipped}, failed {run.failed})"
+        )
+
+    # --- Execution ---
+
+    async def _execute(self, run_id: int) -> dict:
+        db = self._session_factory()
+        budget = nintendo_call_budget.set(TokenBucket(self.rate, self.burst))
+        try:
+            run = db.get(SwitchFleetRun, run_id)
+            await self._push_all(db, run)
+            run.status = FleetRunStatus.DONE
+            run.finished_at = datetime.utcnow()
+            self._save(db, run)
+            return run_summary(run)
+        finally:
+            nintendo_call_budget.reset(budget)
+            db.close()
+
+    async def _push_all(self, db: Session, run: SwitchFleetRun):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # Parent id → finished, in id order; the cursor advances over the
+        # finished prefix so a resume never skips an unfinished account.
+        in_flight: OrderedDict[int, bool] = OrderedDict()
+        tasks: set[asyncio.Task] = set()
+        last_save = time.monotonic()
+
+        async def push(parent_id: int):
+            nonlocal last_save
+            try:
+                result, error = await self._push_account(parent_id)
+            finally:
+                semaphore.release()
+            in_flight[parent_id] = True
+            while in_flight and next(iter(in_flight.values())):
+                run.cursor = in_flight.popitem(last=False)[0]
+            run.processed += 1
+            setattr(run, result, getattr(run, result) + 1)
+            if error:
+                run.last_error = error[:2000]
+            metrics.SWITCH_FLEET_ACCOUNTS.inc(result=result)
+            if (
+                run.processed % max(1, SWITCH_FLEET_PROGRESS_EVERY) == 0
+                or time.monotonic() - last_save > SWITCH_FLEET_LEASE / 3
+            ):
+                self._save(db, run)
+                last_save = time.monotonic()
+
+        after = run.cursor
+        try:
+            while True:
+                ids = [
+                    parent_id
+                    for (parent_id,) in _linked_parents(db)
+                    .filter(User.id > after)
+                    .order_by(User.id)
+                    .limit(SWITCH_FLEET_PAGE_SIZE)
+                    .all()
+                ]
+                if not ids:
+                    break
+                for parent_id in ids:
+                    await semaphore.acquire()
+                    in_flight[parent_id] = False
+                    task = asyncio.create_task(push(parent_id))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                after = ids[-1]
+            if tasks:
+                await asyncio.gather(*tasks)
+        except BaseException:
+            # On cancellation keep the run RUNNING with its cursor saved; its
+            # heartbeat goes stale and the run is resumed later.
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self._save(db, run)
+            raise
+
+    async def _push_account(self, parent_id: int) -> tuple[str, str | None]:
+        """Returns ``(result, error)``; result is synced / skipped / failed."""
+        db = self._session_factory()
+        try:
+            parent = db.get(User, parent_id)
+            token = parent.get_nintendo_token() if parent else None
+            if not token:
+                return "skipped", None
+            targets = household_targets(db, parent_id)
+            if not targets:
+                return "skipped", None
+            synced, failed = await asyncio.wait_for(
+                self._push_targets(db, parent_id, token, targets),
+                timeout=SWITCH_FLEET_ACCOUNT_TIMEOUT,
+            )
+            if failed:
+                error = f"parent {parent_id}: devices failed: " + ", ".join(failed)
+                logger.warning(f"Fleet push: {error}")
+                return "failed", error
+            return "synced", None
+        except InvalidSessionTokenException:
+            error = f"parent {parent_id}: Nintendo session token rejected"
+            logger.warning(f"Fleet push: {error}")
+            return "failed", error
+        except Exception as e:
+            error = f"parent {parent_id}: {e!r}"
+            logger.error(f"Fleet push failed for {error}")
+            return "failed", error
+        finally:
+            db.close()
+
+    async def _push_targets(self, db: Session, parent_id: int, token: str, targets):
+        synced, failed = [], []
+        for _child_id, limit, devices in targets:
+            names, errors = await apply_switch_limit(
+                db, parent_id, token, limit, devices
+            )
+            synced += names
+            failed += errors
+        return synced, failed
+
+
+def _parse_schedule(value: str) -> dt_time | None:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%H:%M").time()
+    except ValueError:
+        logger.error(f"Invalid SWITCH_FLEET_SCHEDULE {value!r} (expected HH:MM)")
+        return None
+
+
+class FleetScheduler:
+    """Starts the daily fleet push and resumes abandoned runs.
+
+    Every process may run a scheduler: the daily run is keyed
+    ``daily:<date>`` (unique), so only one of them starts it.
+    """
+
+    def __init__(self, fleet: FleetPush | None = None, at: str = SWITCH_FLEET_SCHEDULE):
+        self.fleet = fleet or FleetPush()
+        self.at = _parse_schedule(at)
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.at is not None
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def tick(self, now: datetime | None = None) -> list[dict]:
+        """Resume abandoned runs, then start today's run if it is due."""
+        now = now or datetime.now()
+        summaries = await self.fleet.resume()
+        if self.enabled and now.time() >= self.at:
+            key = f"daily:{now.date().isoformat()}"
+            db = self.fleet._session_factory()
+            try:
+                started = (
+                    db.query(SwitchFleetRun.id)
+                    .filter(SwitchFleetRun.schedule_key == key)
+                    .first()
+                )
+            finally:
+                db.close()
+            if started is None:
+                summary = await self.fleet.run(trigger="schedule", schedule_key=key)
+                if summary is not None:
+                    summaries.append(summary)
+        return summaries
+
+    async def _run(self):
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Fleet push scheduler tick failed")
+            await asyncio.sleep(SWITCH_FLEET_CHECK_INTERVAL)
+
+
+fleet_scheduler = FleetScheduler()
+
+
+# --- CLI ---
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Push Switch limits to every linked household"
+    )
+    parser.add_argument(
+        "command",
+        choices=["run", "resume", "status"],
+        help="start a new run / resume abandoned runs / show recent runs",
+    )
+    parser.add_argument("--rate", type=float, default=SWITCH_FLEET_RATE)
+    parser.add_argument("--burst", type=float, default=SWITCH_FLEET_BURST)
+    parser.add_argument("--concurrency", type=int, default=SWITCH_FLEET_CONCURRENCY)
+    parser.add_argument("--limit", type=int, default=10, help="runs shown by status")
+    return parser.parse_args(argv)
+
+
+async def _run_command(args: argparse.Namespace):
+    from backend import http_clients
+
+    fleet = FleetPush(rate=args.rate, burst=args.burst, concurrency=args.concurrency)
+    try:
+        if args.command == "run":
+            return await fleet.run(trigger="cli")
+        return await fleet.resume()
+    finally:
+        await http_clients.aclose()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    Base.metadata.create_all(bind=engine)
+    if args.command == "status":
+        db = SessionLocal()
+        try:
+            result = recent_runs(db, args.limit)
+        finally:
+            db.close()
+    else:
+        result = asyncio.run(_run_command(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    main()
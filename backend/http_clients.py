@@ -0,0 +1,170 @@
+"""Long-lived HTTP client pools for outbound calls.
+
+- Nintendo: one ``aiohttp.ClientSession`` with keep-alive, a per-host
+  connection limit and DNS caching, shared by every ``SwitchService`` call.
+- LINE: one ``httpx.AsyncClient`` with keep-alive connections, used by the
+  notification workers in ``backend/services/line_notify.py``.
+
+Both are created lazily and closed by the application lifespan
+(:func:`aclose`). Both are bound to an event loop, so a new one is created if
+the running loop changes (e.g. between test clients) and the old one is
+closed on its own loop, or on the current one if its loop is gone.
+
+With ``NINTENDO_API_BASE_URL`` set, requests to the Nintendo hosts are sent to
+``<base>/<host>/<path>`` instead, e.g. the local fake server in
+``backend/fake_nintendo.py``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+
+import aiohttp
+import httpx
+from yarl import URL
+
+logger = logging.getLogger(__name__)
+
+NINTENDO_HTTP_TIMEOUT = float(os.getenv("NINTENDO_HTTP_TIMEOUT", "20"))
+NINTENDO_CONNECT_TIMEOUT = float(os.getenv("NINTENDO_CONNECT_TIMEOUT", "5"))
+NINTENDO_MAX_CONNECTIONS = int(os.getenv("NINTENDO_MAX_CONNECTIONS", "100"))
+NINTENDO_MAX_CONNECTIONS_PER_HOST = int(
+    os.getenv("NINTENDO_MAX_CONNECTIONS_PER_HOST", "20")
+)
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+
+# Redirect Nintendo API calls (e.g. to backend.fake_nintendo) — empty = real hosts
+NINTENDO_API_BASE_URL = os.getenv("NINTENDO_API_BASE_URL", "").rstrip("/")
+NINTENDO_HOSTS = frozenset(
+    {
+        "accounts.nintendo.com",
+        "api.accounts.nintendo.com",
+        "app.lp1.znma.srv.nintendo.net",
+    }
+)
+
+LINE_HTTP_TIMEOUT = float(os.getenv("LINE_HTTP_TIMEOUT", "10"))
+LINE_MAX_CONNECTIONS = int(os.getenv("LINE_MAX_CONNECTIONS", "20"))
+
+_nintendo_session: aiohttp.ClientSession | None = None
+_nintendo_loop: asyncio.AbstractEventLoop | None = None
+
+_line_client: httpx.AsyncClient | None = None
+_line_loop: asyncio.AbstractEventLoop | None = None
+# Close tasks of clients replaced after a loop change (kept from GC)
+_retiring: set[asyncio.Task] = set()
+
+
+async def _redirect_nintendo_hosts(request: aiohttp.ClientRequest, handler):
+    """aiohttp client middleware sending Nintendo calls to NINTENDO_API_BASE_URL."""
+    if request.url.host in NINTENDO_HOSTS:
+        target = URL(
+            f"{NINTENDO_API_BASE_URL}/{request.url.host}{request.url.raw_path_qs}",
+            encoded=True,
+        )
+        request.url = target
+        request.headers["Host"] = target.host_port_subcomponent
+    return await handler(request)
+
+
+def nintendo_session() -> aiohttp.ClientSession:
+    """Shared aiohttp session for the running event loop."""
+    global _nintendo_session, _nintendo_loop
+    loop = asyncio.get_running_loop()
+    if (
+        _nintendo_session is None
+        or _nintendo_session.closed
+        or _nintendo_loop is not loop
+    ):
+        if _nintendo_session is not None and not _nintendo_session.closed:
+            _retire(_nintendo_session.close, _nintendo_loop)
+        connector = aiohttp.TCPConnector(
+            limit=NINTENDO_MAX_CONNECTIONS,
+            limit_per_host=NINTENDO_MAX_CONNECTIONS_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+        )
+        options = {}
+        if NINTENDO_API_BASE_URL:
+            # Client middlewares need aiohttp >= 3.12; only pass them when used
+            options["middlewares"] = (_redirect_nintendo_hosts,)
+        _nintendo_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=NINTENDO_HTTP_TIMEOUT, connect=NINTENDO_CONNECT_TIMEOUT
+            ),
+            **options,
+        )
+        _nintendo_loop = loop
+    return _nintendo_session
+
+
+def line_client() -> httpx.AsyncClient:
+    """Shared async httpx client for LINE Notify (running event loop)."""
+    global _line_client, _line_loop
+    loop = asyncio.get_running_loop()
+    if _line_client is None or _line_client.is_closed or _line_loop is not loop:
+        if _line_client is not None and not _line_client.is_closed:
+            _retire(_line_client.aclose, _line_loop)
+        _line_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LINE_HTTP_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=LINE_MAX_CONNECTIONS,
+                max_keepalive_connections=LINE_MAX_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+            ),
+        )
+        _line_loop = loop
+    return _line_client
+
+
+async def _close_quietly(close):
+    try:
+        await close()
+    except Exception:
+        # Sockets of a closed loop cannot be shut down cleanly; drop them
+        logger.debug("Closing a stale HTTP client failed", exc_info=True)
+
+
+def _running_elsewhere(loop: asyncio.AbstractEventLoop | None) -> bool:
+    return (
+        loop is not None
+        and loop is not asyncio.get_running_loop()
+        and not loop.is_closed()
+        and loop.is_running()
+    )
+
+
+def _retire(close, loop: asyncio.AbstractEventLoop | None):
+    """Close a client replaced after a loop change, without waiting for it."""
+    if _running_elsewhere(loop):
+        asyncio.run_coroutine_threadsafe(_close_quietly(close), loop)
+        return
+    task = asyncio.get_running_loop().create_task(_close_quietly(close))
+    _retiring.add(task)
+    task.add_done_callback(_retiring.discard)
+
+
+async def _close_on_loop(close, loop: asyncio.AbstractEventLoop | None):
+    """Close on the loop the client belongs to (here if that loop is gone)."""
+    if _running_elsewhere(loop):
+        asyncio.run_coroutine_threadsafe(_close_quietly(close), loop)
+    else:
+        await _close_quietly(close)
+
+
+async def aclose():
+    """Close the pools (called on application shutdown)."""
+    global _nintendo_session, _nintendo_loop, _line_client, _line_loop
+    session, loop = _nintendo_session, _nintendo_loop
+    _nintendo_session = _nintendo_loop = None
+    if session is not None and not session.closed:
+        await _close_on_loop(session.close, loop)
+
+    client, loop = _line_client, _line_loop
+    _line_client = _line_loop = None
+    if client is not None and not client.is_closed:
+        await _close_on_loop(client.aclose, loop)
@@ -0,0 +1,152 @@
+"""Re-encrypt stored Nintendo session tokens with the current ENCRYPTION_KEY.
+
+Rotation without downtime:
+
+1. Deploy with the new key as ``ENCRYPTION_KEY`` and the old one(s) in
+   ``ENCRYPTION_OLD_KEYS``. Every worker now decrypts both (``MultiFernet``)
+   and encrypts new tokens with the new key.
+2. Run ``python -m backend.key_rotation``. Users are walked in id order in
+   chunks of ``--batch`` (keyset pagination, one short transaction per chunk,
+   no table lock). Each token is swapped with a conditional UPDATE, so a user
+   re-linking meanwhile keeps the newer token. Progress is logged per chunk;
+   ``--start-after`` resumes from the last reported id.
+3. Once it reports ``remaining: 0``, drop ``ENCRYPTION_OLD_KEYS``.
+
+Pending logins (``pending_nintendo_auths``) are not rotated; they expire
+within ``SWITCH_PENDING_AUTH_TTL``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+
+from cryptography.fernet import InvalidToken
+from sqlalchemy import update
+
+from backend.database import Base, SessionLocal, engine
+from backend.models import User
+from backend.security import needs_rotation, rotate_token
+
+logger = logging.getLogger(__name__)
+
+
+def rotate_nintendo_tokens(
+    session_factory=SessionLocal,
+    batch_size: int = 500,
+    start_after: int = 0,
+    dry_run: bool = False,
+    progress=None,
+) -> dict:
+    """Re-encrypt every ``nintendo_session_token`` not under ENCRYPTION_KEY.
+
+    ``progress`` (if given) is called with the running summary after each
+    chunk. Tokens no configured key can decrypt are counted as ``failed``
+    and left untouched.
+    """
+    summary = {
+        "scanned": 0,
+        "rotated": 0,
+        "current": 0,
+        "conflicts": 0,
+        "failed": 0,
+        "last_id": start_after,
+        "dry_run": dry_run,
+    }
+    while True:
+        db = session_factory()
+        try:
+            rows = (
+                db.query(User.id, User.nintendo_session_token)
+                .filter(
+                    User.id > summary["last_id"],
+                    User.nintendo_session_token.isnot(None),
+                )
+                .order_by(User.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            for user_id, encrypted in rows:
+                summary["scanned"] += 1
+                if not needs_rotation(encrypted):
+                    summary["current"] += 1
+                    continue
+                try:
+                    rotated = rotate_token(encrypted)
+                except InvalidToken:
+                    summary["failed"] += 1
+                    logger.warning(f"User {user_id}: token matches no configured key")
+                    continue
+                if dry_run:
+                    summary["rotated"] += 1
+                    continue
+                result = db.execute(
+                    update(User)
+                    .where(User.id == user_id, User.nintendo_session_token == encrypted)
+                    .values(nintendo_session_token=rotated)
+                )
+                if result.rowcount == 1:
+                    summary["rotated"] += 1
+                else:
+                    summary["conflicts"] += 1  # re-linked meanwhile
+            db.commit()
+            summary["last_id"] = rows[-1][0]
+        finally:
+            db.close()
+        logger.info(
+            f"Key rotation: {summary['scanned']} scanned, {summary['rotated']} "
+            f"rotated, {summary['failed']} failed (last id {summary['last_id']})"
+        )
+        if progress is not None:
+            progress(dict(summary))
+    return summary
+
+
+def remaining_tokens(session_factory=SessionLocal) -> int:
+    """Stored tokens not yet encrypted with ENCRYPTION_KEY."""
+    db = session_factory()
+    try:
+        return sum(
+            needs_rotation(encrypted)
+            for (encrypted,) in db.query(User.nintendo_session_token)
+            .filter(User.nintendo_session_token.isnot(None))
+            .yield_per(1000)
+        )
+    finally:
+        db.close()
+
+
+# --- CLI ---
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Re-encrypt Nintendo session tokens with ENCRYPTION_KEY"
+    )
+    parser.add_argument("--batch", type=int, default=500, help="users per chunk")
+    parser.add_argument(
+        "--start-after", type=int, default=0, help="resume after this user id"
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    Base.metadata.create_all(bind=engine)
+    result = rotate_nintendo_tokens(
+        batch_size=max(1, args.batch),
+        start_after=args.start_after,
+        dry_run=args.dry_run,
+    )
+    result["remaining"] = remaining_tokens()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    main()
@@ -0,0 +1,346 @@
+"""Load generator driving the full task lifecycle against a running backend.
+
+Simulates N families (one parent with a mock-linked Switch, one or more
+children) doing realistic work at a configurable arrival rate (open loop,
+Poisson arrivals):
+
+- dashboard polling (child / parent)
+- plan creation, start → complete → approve
+- activity consumption
+- Switch sync through the ``dummy_session_token_for_confirmation`` path, or
+  with ``--switch-accounts fake`` through real HTTP calls to the local fake
+  Nintendo server (``backend/fake_nintendo.py``)
+- weekly schedule / history reads
+
+Usage (against a local uvicorn instance, ENV != production)::
+
+    uvicorn backend.main:app --port 8000 &
+    python -m backend.loadtest --families 50 --rate 30 --duration 60
+
+Prints p50/p95/p99 latency, error rate and throughput per endpoint.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+
+import httpx
+
+SCENARIO_WEIGHTS = {
+    "poll_dashboards": 45,
+    "task_lifecycle": 20,
+    "create_plan": 10,
+    "consume": 10,
+    "switch_sync": 5,
+    "browse_history": 10,
+}
+
+SUBJECTS = ["算数", "国語", "理科", "社会", "英語", "漢字ドリル", "計算ドリル"]
+
+
+@dataclass
+class Family:
+    parent_id: int
+    child_ids: list[int]
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    client_errors: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.stats: dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self.families: list[Family] = []
+        headers = {"X-API-Key": args.api_key} if args.api_key else {}
+        self.client = httpx.AsyncClient(
+            base_url=args.base_url,
+            headers=headers,
+            timeout=args.timeout,
+            limits=httpx.Limits(
+                max_connections=args.concurrency,
+                max_keepalive_connections=args.concurrency,
+            ),
+        )
+
+    async def request(self, name: str, method: str, url: str, **kwargs):
+        """Send a request and record its latency under ``name``."""
+        stats = self.stats[name]
+        start = time.perf_counter()
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            stats.latencies.append(time.perf_counter() - start)
+            stats.errors += 1
+            return None
+        stats.latencies.append(time.perf_counter() - start)
+        if resp.status_code >= 500:
+            stats.errors += 1
+        elif resp.status_code >= 400:
+            stats.client_errors += 1
+        return resp
+
+    # --- Setup ---
+
+    async def setup(self):
+        rules = await self.client.get("/api/rules/", params={"active_only": True})
+        rules.raise_for_status()
+        if not rules.json():
+            (await self.client.post("/api/rules/seed-defaults")).raise_for_status()
+
+        sem = asyncio.Semaphore(self.args.concurrency)
+
+        async def create_family(i: int):
+            async with sem:
+                parent = await self.client.post(
+                    "/api/auth/register",
+                    json={"name": f"LT親{i}", "role": "parent"},
+                )
+                parent.raise_for_status()
+                parent_id = parent.json()["id"]
+                params = {}
+                if self.args.switch_accounts == "fake":
+                    # Distinct account per family on the fake Nintendo server
+                    params["session_token"] = f"loadtest-{self.args.seed}-{i}"
+                link = await self.client.post(
+                    f"/api/test/link-switch/{parent_id}", params=params
+                )
+                link.raise_for_status()
+                child_ids = []
+                for c in range(self.args.children):
+                    child = await self.client.post(
+                        "/api/auth/register",
+                        json={
+                            "name": f"LT子{i}-{c}",
+                            "role": "child",
+                            "parent_id": parent_id,
+                        },
+                    )
+                    child.raise_for_status()
+                    child_ids.append(child.json()["id"])
+                return Family(parent_id=parent_id, child_ids=child_ids)
+
+        self.families = await asyncio.gather(
+            *(create_family(i) for i in range(self.args.families))
+        )
+
+    # --- Scenarios ---
+
+    def _plan_payload(self, child_id: int) -> dict:
+        tasks = [
+            {
+                "subject": self.rng.choice(SUBJECTS),
+                "estimated_minutes": self.rng.choice([15, 20, 30, 45]),
+                "is_homework": self.rng.random() < 0.6,
+            }
+            for _ in range(self.rng.randint(2, 4))
+        ]
+        return {
+            "child_id": child_id,
+            "plan_date": str(date.today()),
+            "title": "ロードテスト計画",
+            "tasks": tasks,
+        }
+
+    async def poll_dashboards(self, family: Family, child_id: int):
+        await self.request(
+            "GET /api/tasks/dashboard/child/{child_id}",
+            "GET",
+            f"/api/tasks/dashboard/child/{child_id}",
+        )
+        await self.request(
+            "GET /api/tasks/dashboard/parent", "GET", "/api/tasks/dashboard/parent"
+        )
+
+    async def create_plan(self, family: Family, child_id: int):
+        return await self.request(
+            "POST /api/plans/", "POST", "/api/plans/", json=self._plan_payload(child_id)
+        )
+
+    async def task_lifecycle(self, family: Family, child_id: int):
+        resp = await self.create_plan(family, child_id)
+        if resp is None or resp.status_code != 200:
+            return
+        for task in resp.json()["tasks"]:
+            task_id = task["id"]
+            await self.request(
+                "POST /api/tasks/{task_id}/start", "POST", f"/api/tasks/{task_id}/start"
+            )
+            await self.request(
+                "POST /api/tasks/{task_id}/complete",
+                "POST",
+                f"/api/tasks/{task_id}/complete",
+                params={"actual_minutes": task["estimated_minutes"]},
+            )
+            await self.request(
+                "POST /api/tasks/{task_id}/approve",
+                "POST",
+                f"/api/tasks/{task_id}/approve",
+                params={"parent_id": family.parent_id},
+            )
+
+    async def consume(self, family: Family, child_id: int):
+        await self.request(
+            "POST /api/wallet/{child_id}/consume",
+            "POST",
+            f"/api/wallet/{child_id}/consume",
+            json={"activity_type": "switch", "consumed_minutes": 5},
+        )
+
+    async def switch_sync(self, family: Family, child_id: int):
+        await self.request(
+            "POST /api/switch/sync/{user_id}",
+            "POST",
+            f"/api/switch/sync/{family.parent_id}",
+        )
+
+    async def browse_history(self, family: Family, child_id: int):
+        await self.request(
+            "GET /api/plans/weekly",
+            "GET",
+            "/api/plans/weekly",
+            params={"child_id": child_id},
+        )
+        await self.request(
+            "GET /api/history/{child_id}", "GET", f"/api/history/{child_id}"
+        )
+
+    # --- Driver ---
+
+    async def run_session(self, sem: asyncio.Semaphore):
+        async with sem:
+            family = self.rng.choice(self.families)
+            child_id = self.rng.choice(family.child_ids)
+            scenario = self.rng.choices(
+                list(SCENARIO_WEIGHTS), weights=list(SCENARIO_WEIGHTS.values())
+            )[0]
+            await getattr(self, scenario)(family, child_id)
+
+    async def run(self) -> float:
+        sem = asyncio.Semaphore(self.args.concurrency)
+        tasks = set()
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        while time.perf_counter() < deadline:
+            task = asyncio.create_task(self.run_session(sem))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            await asyncio.sleep(self.rng.expovariate(self.args.rate))
+        if tasks:
+            await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, stats in sorted(self.stats.items()):
+            endpoints[name] = {
+                "requests": stats.count,
+                "p50_ms": round(stats.percentile(50) * 1000, 1),
+                "p95_ms": round(stats.percentile(95) * 1000, 1),
+                "p99_ms": round(stats.percentile(99) * 1000, 1),
+                "error_rate": (
+                    round(stats.errors / stats.count, 4) if stats.count else 0
+                ),
+                "client_errors": stats.client_errors,
+                "rps": round(stats.count / elapsed, 2) if elapsed else 0,
+            }
+        total = sum(s.count for s in self.stats.values())
+        errors = sum(s.errors for s in self.stats.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "families": len(self.families),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+            "error_rate": round(errors / total, 4) if total else 0,
+            "endpoints": endpoints,
+        }
+
+
+def _print_report(report: dict):
+    header = (
+        f"{'endpoint':44} {'reqs':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'err%':>6} {'4xx':>5} {'rps':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, row in report["endpoints"].items():
+        print(
+            f"{name:44} {row['requests']:>6} {row['p50_ms']:>8.1f} "
+            f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+            f"{row['error_rate'] * 100:>5.1f}% {row['client_errors']:>5} "
+            f"{row['rps']:>7.2f}"
+        )
+    print("-" * len(header))
+    print(
+        f"total: {report['requests']} requests in {report['elapsed_s']}s — "
+        f"{report['throughput_rps']} req/s, error rate {report['error_rate'] * 100:.2f}%"
+    )
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="S2A load generator")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-key", default=None, help="X-API-Key for Switch routes")
+    parser.add_argument("--families", type=int, default=20)
+    parser.add_argument("--children", type=int, default=1, help="children per family")
+    parser.add_argument(
+        "--rate", type=float, default=10.0, help="session arrivals per second"
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument(
+        "--concurrency", type=int, default=100, help="max concurrent sessions"
+    )
+    parser.add_argument(
+        "--switch-accounts",
+        choices=["mock", "fake"],
+        default="mock",
+        help="mock: in-process dummy token; fake: real HTTP calls to the server "
+        "behind NINTENDO_API_BASE_URL (python -m backend.fake_nintendo)",
+    )
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print JSON report")
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> dict:
+    args = parse_args(argv)
+    load_test = LoadTest(args)
+    try:
+        await load_test.setup()
+        elapsed = await load_test.run()
+    finally:
+        await load_test.client.aclose()
+    report = load_test.report(elapsed)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        _print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
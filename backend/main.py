@@ -1,16 +1,40 @@
 """Study to Activity (S2A) - FastAPI Application Entry Point."""
 
 import os
+from contextlib import asynccontextmanager
 from typing import Annotated
 
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 
-from backend import database
+from backend import (
+    database,
+    fleet_sync,
+    http_clients,
+    metrics,
+    pin_hashing,
+    sync_queue,
+)
+from backend.compression import CompressionMiddleware
 from backend.database import Base, engine
-from backend.routers import auth, history, notify, plans, rules, switch, tasks, wallet
+from backend.query_stats import QueryStatsMiddleware
+from backend.routers import (
+    auth,
+    debug,
+    history,
+    notify,
+    plans,
+    rules,
+    switch,
+    tasks,
+    wallet,
+)
+from backend.security import require_api_key
 from backend.seed import seed as _auto_seed
+from backend.services.line_notify import line_notifier
+from backend.switch_service import pending_auth_listener, pending_auth_sweeper
 
 # Create all tables
 Base.metadata.create_all(bind=engine)
@@ -24,10 +48,36 @@ _auto_seed_enabled = os.getenv("AUTO_SEED") == "1" or not IS_PROD_EARLY
 if _auto_seed_enabled:
     _auto_seed()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Durable Switch sync queue worker (see backend/sync_queue.py)
+    if sync_queue.SWITCH_SYNC_WORKER:
+        sync_queue.sync_worker.start()
+    # Daily fleet-wide Switch push, if SWITCH_FLEET_SCHEDULE is set
+    fleet_sync.fleet_scheduler.start()
+    # Expired pending Nintendo logins (see backend/pending_auth.py)
+    pending_auth_sweeper.start()
+    # Cross-worker wake-ups for auth-status long-polls (PostgreSQL only)
+    pending_auth_listener.start()
+    # LINE notification workers (see backend/services/line_notify.py)
+    line_notifier.start()
+    yield
+    await line_notifier.stop()
+    await pending_auth_listener.stop()
+    await pending_auth_sweeper.stop()
+    await fleet_sync.fleet_scheduler.stop()
+    await sync_queue.sync_worker.stop()
+    # Close pooled outbound HTTP clients (Nintendo / LINE)
+    await http_clients.aclose()
+    pin_hashing.pin_hasher.shutdown()
+
+
 app = FastAPI(
     title="Study to Activity (S2A)",
     description="学習進捗管理とアクティビティ報酬システム",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # ENV mode
@@ -59,6 +109,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip / brotli for routes marked @compressible (schedule, history, dashboards).
+# Threshold: COMPRESSION_MIN_SIZE bytes (default 1024).
+app.add_middleware(CompressionMiddleware)
+
+# Per-request SQL statement count / DB time → Server-Timing header + debug log
+app.add_middleware(QueryStatsMiddleware)
+
+# Per-route latency histograms and in-flight gauge for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Mount routers
 app.include_router(auth.router, prefix="/api/auth", tags=["認証"])
 app.include_router(plans.router, prefix="/api/plans", tags=["学習計画"])
@@ -68,6 +128,7 @@ app.include_router(wallet.router, prefix="/api/wallet", tags=["ウォレット"]
 app.include_router(switch.router, prefix="/api/switch", tags=["Nintendo Switch"])
 app.include_router(history.router, prefix="/api/history", tags=["学習履歴"])
 app.include_router(notify.router, prefix="/api/notify", tags=["通知"])
+app.include_router(debug.router, prefix="/api/debug", tags=["デバッグ"])
 
 
 @app.get("/")
@@ -80,6 +141,12 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_api_key)])
+def prometheus_metrics():
+    """Prometheus text exposition of the in-process metrics."""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # Test-only endpoint (DISABLED in production)
 @app.post("/api/test/reset")
 def reset_database(db: Annotated[Session, Depends(database.get_db)]):
@@ -102,6 +169,27 @@ def reset_database(db: Annotated[Session, Depends(database.get_db)]):
     return {"message": "Database reset for testing"}
 
 
+# Test-only endpoint (DISABLED in production): link a parent to the mock Switch
+# account so load tests / E2E can drive /api/switch/sync without Nintendo.
+# Pass session_token to link a fake-server account instead (backend.fake_nintendo).
+@app.post("/api/test/link-switch/{user_id}")
+def link_mock_switch(
+    user_id: int,
+    db: Annotated[Session, Depends(database.get_db)],
+    session_token: str = "dummy_session_token_for_confirmation",
+):
+    if IS_PROD:
+        raise HTTPException(status_code=403, detail="本番環境では利用できません")
+    from backend.models import User
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
+    user.set_nintendo_token(session_token)
+    db.commit()
+    return {"message": "Mock Switch account linked"}
+
+
 if __name__ == "__main__":
     import uvicorn
 
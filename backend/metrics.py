@@ -0,0 +1,542 @@
+"""In-process metrics exposed in Prometheus text format at ``/metrics``.
+
+Counters, gauges and histograms are plain Python objects guarded by a lock —
+no client library or external service is needed. Gauges can also be backed by
+a callback that is evaluated at scrape time (used for DB pool stats).
+
+Usage::
+
+    from backend import metrics
+
+    metrics.REWARD_GRANTS.inc(len(granted))
+    with metrics.outbound_call("nintendo", "get_devices"):
+        ...
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+from starlette.background import BackgroundTasks
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OUTBOUND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values, strict=True):
+        escaped = (
+            str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        )
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        registry: "Registry | None" = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> list[str]:  # pragma: no cover - overridden
+        return []
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+            for k, v in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        labelnames=(),
+        callback: Callable[[], dict[tuple[str, ...], float] | float] | None = None,
+        registry=None,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self._callback is not None:
+            result = self._callback()
+            items = (
+                sorted(result.items()) if isinstance(result, dict) else [((), result)]
+            )
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+            for k, v in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        labelnames=(),
+        buckets=DEFAULT_BUCKETS,
+        registry=None,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key -> [bucket counts..., sum, count]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        data = self._values.get(self._key(labels))
+        return int(data[-1]) if data else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, data in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, data[: len(self.buckets)], strict=True):
+                cumulative += n
+                labels = _format_labels(
+                    self.labelnames + ("le",), key + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            base = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{base} {_format_value(data[-2])}")
+            lines.append(f"{self.name}_count{base} {int(data[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- HTTP ---
+
+HTTP_REQUEST_DURATION = Histogram(
+    "s2a_http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "s2a_http_requests_in_flight",
+    "HTTP requests currently being served.",
+    ("method",),
+)
+
+
+# --- Database pool ---
+
+
+def _pool_stats() -> dict[tuple[str, ...], float]:
+    from backend.database import engine
+
+    pool = engine.pool
+    stats = {}
+    for name in ("checkedout", "overflow", "size", "checkedin"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            stats[(name,)] = fn()
+    return stats
+
+
+DB_POOL = Gauge(
+    "s2a_db_pool_connections",
+    "Database connection pool state (checked out, overflow, size, checked in).",
+    ("state",),
+    callback=_pool_stats,
+)
+
+
+# --- Rewards ---
+
+REWARD_EVALUATION_DURATION = Histogram(
+    "s2a_reward_evaluation_duration_seconds",
+    "Time spent evaluating reward rules for a child.",
+)
+REWARD_GRANTS = Counter(
+    "s2a_reward_grants_total",
+    "Reward grants written to the wallet.",
+)
+REWARD_GRANTED_MINUTES = Counter(
+    "s2a_reward_granted_minutes_total",
+    "Activity minutes granted by reward rules.",
+)
+
+
+# --- Outbound calls (Nintendo / LINE) ---
+
+OUTBOUND_DURATION = Histogram(
+    "s2a_outbound_request_duration_seconds",
+    "Latency of outbound calls to external services.",
+    ("service", "operation"),
+    buckets=OUTBOUND_BUCKETS,
+)
+OUTBOUND_ERRORS = Counter(
+    "s2a_outbound_request_errors_total",
+    "Outbound calls that raised or reported failure.",
+    ("service", "operation"),
+)
+
+
+@contextmanager
+def outbound_call(service: str, operation: str):
+    """Time an outbound call and count it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        OUTBOUND_ERRORS.inc(service=service, operation=operation)
+        raise
+    finally:
+        OUTBOUND_DURATION.observe(
+            time.perf_counter() - start, service=service, operation=operation
+        )
+
+
+def instrument_outbound(service: str, operation: str | None = None):
+    """Decorator form of :func:`outbound_call` for sync and async functions.
+
+    A return value of ``False`` is also counted as an error.
+    """
+
+    def decorator(func):
+        op = operation or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with outbound_call(service, op):
+                    result = await func(*args, **kwargs)
+                if result is False:
+                    OUTBOUND_ERRORS.inc(service=service, operation=op)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with outbound_call(service, op):
+                result = func(*args, **kwargs)
+            if result is False:
+                OUTBOUND_ERRORS.inc(service=service, operation=op)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# --- Circuit breakers (backend/circuit_breaker.py) ---
+
+_CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _circuit_states() -> dict[tuple[str, ...], float]:
+    from backend.switch_service import switch_service
+
+    breaker = switch_service.breaker
+    return {(breaker.name,): _CIRCUIT_STATE_VALUES[breaker.state.value]}
+
+
+CIRCUIT_BREAKER_STATE = Gauge(
+    "s2a_circuit_breaker_state",
+    "Circuit breaker state (0 = closed, 1 = half-open, 2 = open).",
+    ("breaker",),
+    callback=_circuit_states,
+)
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    "s2a_circuit_breaker_transitions_total",
+    "Circuit breaker state changes, by new state.",
+    ("breaker", "state"),
+)
+CIRCUIT_BREAKER_REJECTIONS = Counter(
+    "s2a_circuit_breaker_rejections_total",
+    "Calls failed fast because the circuit was open.",
+    ("breaker", "operation"),
+)
+
+
+# --- Switch sync queue ---
+
+
+def _sync_queue_stats() -> dict:
+    from backend.database import SessionLocal
+    from backend.sync_queue import queue_stats
+
+    db = SessionLocal()
+    try:
+        return queue_stats(db)
+    except Exception:
+        return {"depth": {}, "lag_seconds": 0.0}
+    finally:
+        db.close()
+
+
+SWITCH_SYNC_QUEUE_DEPTH = Gauge(
+    "s2a_switch_sync_jobs",
+    "Switch sync outbox jobs by status.",
+    ("status",),
+    callback=lambda: {
+        (status,): n for status, n in _sync_queue_stats()["depth"].items()
+    },
+)
+SWITCH_SYNC_QUEUE_LAG = Gauge(
+    "s2a_switch_sync_lag_seconds",
+    "Age of the oldest pending Switch sync job.",
+    callback=lambda: _sync_queue_stats()["lag_seconds"],
+)
+
+SWITCH_FLEET_ACCOUNTS = Counter(
+    "s2a_switch_fleet_accounts_total",
+    "Accounts processed by fleet-wide Switch limit pushes, by result.",
+    ("result",),
+)
+
+
+# --- PIN hashing (backend/pin_hashing.py) ---
+
+PIN_HASH_QUEUE_WAIT = Histogram(
+    "s2a_pin_hash_queue_wait_seconds",
+    "Time PIN hash / verify calls waited for a worker.",
+    ("operation",),
+)
+PIN_HASH_DURATION = Histogram(
+    "s2a_pin_hash_duration_seconds",
+    "bcrypt time per PIN hash / verify call.",
+    ("operation",),
+)
+PIN_HASH_REJECTIONS = Counter(
+    "s2a_pin_hash_rejections_total",
+    "PIN hash / verify calls rejected because the queue was full (429).",
+    ("operation",),
+)
+
+
+def _pin_hash_pending() -> float:
+    from backend.pin_hashing import pin_hasher
+
+    return pin_hasher.pending
+
+
+PIN_HASH_PENDING = Gauge(
+    "s2a_pin_hash_pending",
+    "PIN hash / verify calls running or waiting for a worker.",
+    callback=_pin_hash_pending,
+)
+
+
+# --- LINE notifications (backend/services/line_notify.py) ---
+
+
+def _line_queue_depth() -> float:
+    from backend.services.line_notify import line_notifier
+
+    return line_notifier.pending
+
+
+LINE_NOTIFY_QUEUE_DEPTH = Gauge(
+    "s2a_line_notify_queue_depth",
+    "LINE messages waiting for a delivery worker.",
+    callback=_line_queue_depth,
+)
+LINE_NOTIFY_DROPPED = Counter(
+    "s2a_line_notify_dropped_total",
+    "LINE messages dropped before delivery (queue full / notifier stopped).",
+    ("reason",),
+)
+LINE_NOTIFY_COALESCED = Counter(
+    "s2a_line_notify_coalesced_total",
+    "Notifications merged into another one's digest instead of sent alone.",
+    ("kind",),
+)
+
+
+# --- Background tasks ---
+
+BACKGROUND_TASKS_QUEUED = Gauge(
+    "s2a_background_tasks_queued",
+    "Background tasks scheduled but not yet finished.",
+    ("task",),
+)
+
+
+def add_background_task(background_tasks: BackgroundTasks, func, *args, **kwargs):
+    """``background_tasks.add_task`` that keeps the queue depth gauge current."""
+    name = getattr(func, "__name__", "task")
+    BACKGROUND_TASKS_QUEUED.inc(task=name)
+
+    if inspect.iscoroutinefunction(func):
+
+        async def run_async():
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                BACKGROUND_TASKS_QUEUED.dec(task=name)
+
+        background_tasks.add_task(run_async)
+    else:
+
+        def run():
+            try:
+                return func(*args, **kwargs)
+            finally:
+                BACKGROUND_TASKS_QUEUED.dec(task=name)
+
+        background_tasks.add_task(run)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and in-flight counts."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec(method=method)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=route,
+                status=str(status["code"]),
+            )
@@ -13,6 +13,7 @@ from sqlalchemy import (
     Integer,
     String,
     Text,
+    UniqueConstraint,
 )
 from sqlalchemy import (
     Enum as SAEnum,
@@ -44,6 +45,17 @@ class TriggerType(str, enum.Enum):
     STREAK = "streak"  # 連続達成
 
 
+class SyncJobStatus(str, enum.Enum):
+    PENDING = "pending"  # 未処理（リトライ待ちを含む）
+    DONE = "done"  # 同期済み
+    DEAD = "dead"  # リトライ上限・回復不能エラー
+
+
+class FleetRunStatus(str, enum.Enum):
+    RUNNING = "running"  # 実行中（中断された場合は再開対象）
+    DONE = "done"  # 全アカウント処理済み
+
+
 class ActivityType(str, enum.Enum):
     SWITCH = "switch"
     TABLET = "tablet"
@@ -85,10 +97,10 @@ class User(Base):
         return bool(self.nintendo_session_token)
 
     def get_nintendo_token(self) -> str:
-        from backend.security import decrypt_token
+        from backend.security import token_cache
 
         try:
-            return decrypt_token(self.nintendo_session_token)
+            return token_cache.decrypt(self.nintendo_session_token)
         except Exception:
             import logging
 
@@ -99,8 +111,9 @@ class User(Base):
             return None
 
     def set_nintendo_token(self, token: str):
-        from backend.security import encrypt_token
+        from backend.security import encrypt_token, token_cache
 
+        token_cache.forget(self.nintendo_session_token)
         self.nintendo_session_token = encrypt_token(token)
 
 
@@ -193,3 +206,115 @@ class RewardLog(Base):
     granted_minutes = Column(Integer, nullable=False)
     granted_date = Column(Date, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SwitchDeviceState(Base):
+    """Last play-time limit successfully applied to each Switch device.
+
+    Lets a sync skip the Nintendo device fetch entirely when every device of
+    the account already has today's target limit.
+    """
+
+    __tablename__ = "switch_device_states"
+    __table_args__ = (UniqueConstraint("parent_id", "device_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    parent_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    device_id = Column(String(100), nullable=False)
+    device_name = Column(String(200), nullable=True)
+    applied_limit = Column(Integer, nullable=False)
+    applied_on = Column(Date, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SwitchDeviceLink(Base):
+    """Which child a Switch console of the parent's Nintendo account belongs to.
+
+    A sync for a child pushes only to its linked consoles. Accounts without
+    any link keep the old behaviour (every console gets the limit); see
+    ``sync_utils.child_devices``.
+    """
+
+    __tablename__ = "switch_device_links"
+    __table_args__ = (UniqueConstraint("parent_id", "device_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    parent_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    child_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    device_id = Column(String(100), nullable=False)
+    device_name = Column(String(200), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SwitchSyncJob(Base):
+    """Outbox row for a pending Switch sync — at most one per child.
+
+    Re-enqueueing bumps ``version``; the worker computes the limit when it
+    pushes, ``desired_limit`` is the value at the last enqueue (diagnostics).
+    A worker holds a job by setting ``locked_until``; an expired lease (worker
+    crash / deploy) makes the job claimable again.
+    """
+
+    __tablename__ = "switch_sync_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    child_id = Column(
+        Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True
+    )
+    desired_limit = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=1)
+    status = Column(
+        SAEnum(SyncJobStatus), nullable=False, default=SyncJobStatus.PENDING
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    enqueued_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SwitchFleetRun(Base):
+    """Progress of a fleet-wide Switch limit push (see backend/fleet_sync.py).
+
+    Linked parents are processed in id order; ``cursor`` is the highest parent
+    id below which every account is finished, so a run interrupted by a crash
+    resumes from there. ``heartbeat_at`` is refreshed while a process owns the
+    run — a stale heartbeat means the run was abandoned. ``schedule_key`` is
+    unique so only one process starts each scheduled daily run.
+    """
+
+    __tablename__ = "switch_fleet_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    trigger = Column(String(20), nullable=False, default="manual")
+    schedule_key = Column(String(40), nullable=True, unique=True)
+    status = Column(
+        SAEnum(FleetRunStatus), nullable=False, default=FleetRunStatus.RUNNING
+    )
+    cursor = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    synced = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class PendingNintendoAuth(Base):
+    """In-flight Nintendo Account login shared by all workers (pending_auth.py).
+
+    ``verifier`` and ``session_token`` are Fernet-encrypted. Rows are swept
+    once ``expires_at`` passes.
+    """
+
+    __tablename__ = "pending_nintendo_auths"
+
+    state = Column(String(128), primary_key=True)
+    verifier = Column(Text, nullable=False)
+    session_token = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,429 @@
+"""Stores for in-flight Nintendo Account logins (``state`` → PKCE verifier).
+
+``GET /api/switch/auth-url`` records the verifier under the login ``state``;
+``/connect`` / ``/callback`` attach the session token once the user finishes,
+and ``GET /auth-status/{state}`` hands it out exactly once.
+
+- :class:`MemoryPendingAuthStore`: per process. Expiry is kept in a heap, so
+  sweeping costs O(log n) per expired entry instead of rebuilding the dict.
+- :class:`DbPendingAuthStore`: a ``pending_nintendo_auths`` table visible to
+  every worker (required when running several uvicorn/gunicorn workers).
+  Verifier and token are stored encrypted; sweeping is one indexed DELETE.
+
+``SWITCH_PENDING_AUTH_STORE`` selects the store (``db`` by default, ``memory``
+for a single process). Expired entries are swept every
+``SWITCH_PENDING_AUTH_SWEEP_INTERVAL`` seconds by :class:`PendingAuthSweeper`,
+started by the application lifespan.
+
+Instead of polling, clients can wait on a state (long-poll / SSE):
+:class:`PendingAuthWaiters` wakes local waiters when a login completes. With
+PostgreSQL, the db store also issues ``NOTIFY pending_nintendo_auth`` and
+:class:`PendingAuthListener` relays it to the waiters of every worker; other
+shared databases (SQLite) fall back to re-checking the store every
+``SWITCH_AUTH_WAIT_RECHECK`` seconds on the server side.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import os
+import select
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, text, update
+
+from backend.database import SessionLocal, engine
+from backend.models import PendingNintendoAuth
+from backend.security import decrypt_token, encrypt_token
+
+logger = logging.getLogger(__name__)
+
+SWITCH_PENDING_AUTH_STORE = os.getenv("SWITCH_PENDING_AUTH_STORE", "db")
+SWITCH_PENDING_AUTH_TTL = float(os.getenv("SWITCH_PENDING_AUTH_TTL", "600"))
+SWITCH_PENDING_AUTH_SWEEP_INTERVAL = float(
+    os.getenv("SWITCH_PENDING_AUTH_SWEEP_INTERVAL", "60")
+)
+# Longest a single long-poll request waits, and how often waiters re-check a
+# shared store when no cross-worker notification is available
+SWITCH_AUTH_WAIT_MAX = float(os.getenv("SWITCH_AUTH_WAIT_MAX", "25"))
+SWITCH_AUTH_WAIT_RECHECK = float(os.getenv("SWITCH_AUTH_WAIT_RECHECK", "1"))
+
+PENDING_AUTH_CHANNEL = "pending_nintendo_auth"
+
+
+@dataclass
+class PendingAuth:
+    state: str
+    verifier: str
+    created_at: float
+    expires_at: float
+    session_token: str | None = None
+
+    def expired(self, now: float | None = None) -> bool:
+        return (time.time() if now is None else now) >= self.expires_at
+
+
+def _to_datetime(timestamp: float) -> datetime:
+    # Naive UTC, like the other DateTime columns
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _to_timestamp(value: datetime) -> float:
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class PendingAuthStore(ABC):
+    """Interface shared by the memory and database stores."""
+
+    # True when other processes can complete logins in this store
+    shared = False
+
+    def __init__(self, ttl: float = SWITCH_PENDING_AUTH_TTL):
+        self.ttl = ttl
+
+    @abstractmethod
+    def put(self, state: str, verifier: str) -> PendingAuth:
+        """Start tracking a login."""
+
+    @abstractmethod
+    def get(self, state: str) -> PendingAuth | None:
+        """The entry for ``state`` (possibly expired), or None."""
+
+    @abstractmethod
+    def complete(self, state: str, session_token: str) -> bool:
+        """Attach the session token; False if the login is unknown or expired."""
+
+    @abstractmethod
+    def take_token(self, state: str) -> str | None:
+        """Remove a completed entry and return its token (once, across workers)."""
+
+    @abstractmethod
+    def discard(self, state: str):
+        """Forget ``state``."""
+
+    @abstractmethod
+    def sweep(self, now: float | None = None) -> int:
+        """Drop expired entries; returns how many were removed."""
+
+
+class MemoryPendingAuthStore(PendingAuthStore):
+    def __init__(self, ttl: float = SWITCH_PENDING_AUTH_TTL):
+        super().__init__(ttl)
+        self._entries: dict[str, PendingAuth] = {}
+        self._expiry: list[tuple[float, str]] = []  # heap of (expires_at, state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, state: str, verifier: str) -> PendingAuth:
+        now = time.time()
+        entry = PendingAuth(state, verifier, now, now + self.ttl)
+        with self._lock:
+            self._entries[state] = entry
+            heapq.heappush(self._expiry, (entry.expires_at, state))
+        self.sweep(now)
+        return entry
+
+    def get(self, state: str) -> PendingAuth | None:
+        return self._entries.get(state)
+
+    def complete(self, state: str, session_token: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(state)
+            if entry is None or entry.expired():
+                return False
+            entry.session_token = session_token
+            return True
+
+    def take_token(self, state: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(state)
+            if entry is None or not entry.session_token:
+                return None
+            del self._entries[state]
+            return entry.session_token
+
+    def discard(self, state: str):
+        with self._lock:
+            self._entries.pop(state, None)
+
+    def sweep(self, now: float | None = None) -> int:
+        now = time.time() if now is None else now
+        removed = 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, state = heapq.heappop(self._expiry)
+                entry = self._entries.get(state)
+                # Skip heap items left behind by re-put / taken entries
+                if entry is not None and entry.expires_at == expires_at:
+                    del self._entries[state]
+                    removed += 1
+        return removed
+
+
+class DbPendingAuthStore(PendingAuthStore):
+    shared = True
+
+    def __init__(
+        self, session_factory=SessionLocal, ttl: float = SWITCH_PENDING_AUTH_TTL
+    ):
+        super().__init__(ttl)
+        self._session_factory = session_factory
+
+    def put(self, state: str, verifier: str) -> PendingAuth:
+        now = time.time()
+        entry = PendingAuth(state, verifier, now, now + self.ttl)
+        db = self._session_factory()
+        try:
+            db.merge(
+                PendingNintendoAuth(
+                    state=state,
+                    verifier=encrypt_token(verifier),
+                    session_token=None,
+                    created_at=_to_datetime(now),
+                    expires_at=_to_datetime(entry.expires_at),
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+        return entry
+
+    def get(self, state: str) -> PendingAuth | None:
+        db = self._session_factory()
+        try:
+            row = db.get(PendingNintendoAuth, state)
+            if row is None:
+                return None
+            return PendingAuth(
+                state=row.state,
+                verifier=decrypt_token(row.verifier),
+                created_at=_to_timestamp(row.created_at),
+                expires_at=_to_timestamp(row.expires_at),
+                session_token=decrypt_token(row.session_token),
+            )
+        finally:
+            db.close()
+
+    def complete(self, state: str, session_token: str) -> bool:
+        db = self._session_factory()
+        try:
+            result = db.execute(
+                update(PendingNintendoAuth)
+                .where(
+                    PendingNintendoAuth.state == state,
+                    PendingNintendoAuth.expires_at > _to_datetime(time.time()),
+                )
+                .values(session_token=encrypt_token(session_token))
+            )
+            if result.rowcount == 1 and db.get_bind().dialect.name == "postgresql":
+                # Delivered on commit to every worker's PendingAuthListener
+                db.execute(
+                    text("SELECT pg_notify(:channel, :state)"),
+                    {"channel": PENDING_AUTH_CHANNEL, "state": state},
+                )
+            db.commit()
+            return result.rowcount == 1
+        finally:
+            db.close()
+
+    def take_token(self, state: str) -> str | None:
+        db = self._session_factory()
+        try:
+            row = db.get(PendingNintendoAuth, state)
+            if row is None or not row.session_token:
+                return None
+            token = row.session_token
+            # Conditional DELETE: only one concurrent poll gets the token
+            result = db.execute(
+                delete(PendingNintendoAuth).where(
+                    PendingNintendoAuth.state == state,
+                    PendingNintendoAuth.session_token == token,
+                )
+            )
+            db.commit()
+            return decrypt_token(token) if result.rowcount == 1 else None
+        finally:
+            db.close()
+
+    def discard(self, state: str):
+        db = self._session_factory()
+        try:
+            db.execute(
+                delete(PendingNintendoAuth).where(PendingNintendoAuth.state == state)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def sweep(self, now: float | None = None) -> int:
+        now = time.time() if now is None else now
+        db = self._session_factory()
+        try:
+            result = db.execute(
+                delete(PendingNintendoAuth).where(
+                    PendingNintendoAuth.expires_at <= _to_datetime(now)
+                )
+            )
+            db.commit()
+            return result.rowcount
+        finally:
+            db.close()
+
+
+def create_store(kind: str = SWITCH_PENDING_AUTH_STORE) -> PendingAuthStore:
+    if kind == "memory":
+        return MemoryPendingAuthStore()
+    if kind != "db":
+        logger.warning(f"Unknown SWITCH_PENDING_AUTH_STORE {kind!r}, using db")
+    return DbPendingAuthStore()
+
+
+class PendingAuthSweeper:
+    """Periodically drops expired pending logins, off the request path."""
+
+    def __init__(
+        self, store_getter, interval: float = SWITCH_PENDING_AUTH_SWEEP_INTERVAL
+    ):
+        self._store_getter = store_getter
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                removed = await asyncio.to_thread(self._store_getter().sweep)
+                if removed:
+                    logger.debug(f"Swept {removed} expired Nintendo login(s)")
+            except Exception:
+                logger.exception("Pending Nintendo login sweep failed")
+
+
+class PendingAuthWaiters:
+    """Lets requests sleep until a login ``state`` may have changed."""
+
+    def __init__(self):
+        self._waiters: dict[str, set[asyncio.Event]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # Set while PendingAuthListener relays completions from other workers
+        self.cross_worker = False
+
+    @contextmanager
+    def watch(self, state: str):
+        """Register an event set by :meth:`notify` for ``state``.
+
+        Register before checking the store so a completion in between is not
+        missed; clear the event before each re-check.
+        """
+        self._loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        self._waiters.setdefault(state, set()).add(event)
+        try:
+            yield event
+        finally:
+            events = self._waiters.get(state)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self._waiters[state]
+
+    def waiting(self, state: str) -> int:
+        return len(self._waiters.get(state, ()))
+
+    def notify(self, state: str):
+        """Wake everything watching ``state``; safe to call from any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._wake(state)
+        else:
+            loop.call_soon_threadsafe(self._wake, state)
+
+    def _wake(self, state: str):
+        for event in self._waiters.get(state, ()):
+            event.set()
+
+
+class PendingAuthListener:
+    """Relays ``NOTIFY pending_nintendo_auth`` to local waiters (PostgreSQL).
+
+    Runs ``LISTEN`` on a dedicated connection in a thread and reconnects after
+    errors; does nothing on other databases.
+    """
+
+    def __init__(self, waiters: PendingAuthWaiters, bind=engine):
+        self.waiters = waiters
+        self._bind = bind
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._bind.dialect.name != "postgresql":
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="pending-auth-listener", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self):
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        await asyncio.to_thread(thread.join, 5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = self._bind.raw_connection()
+                connection = raw.driver_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {PENDING_AUTH_CHANNEL}")
+                self.waiters.cross_worker = True
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], 1.0)[0]:
+                        connection.poll()
+                        while connection.notifies:
+                            notify = connection.notifies.pop(0)
+                            self.waiters.notify(notify.payload)
+            except Exception:
+                logger.exception("Pending Nintendo login listener failed")
+                self._stop.wait(5)
+            finally:
+                self.waiters.cross_worker = False
+                if raw is not None:
+                    # Never hand a LISTENing connection back to the pool
+                    raw.invalidate()
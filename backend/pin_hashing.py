@@ -0,0 +1,155 @@
+"""Bounded worker pool for bcrypt PIN hashing and verification.
+
+bcrypt is deliberately slow (~0.1–0.3 s per call). Running it in the request
+threadpool lets a burst of logins starve every other sync endpoint, so the
+auth routes are ``async``: they await a dedicated pool of ``PIN_HASH_WORKERS``
+threads (holding no request thread meanwhile) and run their DB work in the
+threadpool around it.
+
+At most ``PIN_HASH_QUEUE_LIMIT`` calls may wait for a worker; beyond that
+:class:`PinHasherBusy` is raised straight away (the auth router answers 429
+with ``Retry-After: PIN_HASH_RETRY_AFTER``). Queue wait and hash time are
+exported via ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from sqlalchemy import update
+from starlette.concurrency import run_in_threadpool
+
+from backend import metrics, security
+from backend.database import SessionLocal
+from backend.models import User
+
+logger = logging.getLogger(__name__)
+
+PIN_HASH_WORKERS = int(os.getenv("PIN_HASH_WORKERS", "2"))
+PIN_HASH_QUEUE_LIMIT = int(os.getenv("PIN_HASH_QUEUE_LIMIT", "32"))
+PIN_HASH_RETRY_AFTER = int(os.getenv("PIN_HASH_RETRY_AFTER", "2"))
+
+
+class PinHasherBusy(Exception):
+    """Every worker is busy and the wait queue is full."""
+
+    def __init__(self, retry_after: int = PIN_HASH_RETRY_AFTER):
+        super().__init__("PIN hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PinHasher:
+    def __init__(
+        self, workers: int = PIN_HASH_WORKERS, queue_limit: int = PIN_HASH_QUEUE_LIMIT
+    ):
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending = 0  # running + queued
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, operation: str, func, *args):
+        """Run ``func(*args)`` on the pool; raises :class:`PinHasherBusy` if full."""
+        return await asyncio.wrap_future(self._submit(operation, func, *args))
+
+    def _submit(self, operation: str, func, *args) -> Future:
+        """Queue ``func(*args)`` on the pool; raises :class:`PinHasherBusy` if full."""
+        with self._lock:
+            if self._pending >= self.workers + self.queue_limit:
+                metrics.PIN_HASH_REJECTIONS.inc(operation=operation)
+                raise PinHasherBusy()
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="pin-hash"
+                )
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            metrics.PIN_HASH_QUEUE_WAIT.observe(
+                started - submitted, operation=operation
+            )
+            try:
+                return func(*args)
+            finally:
+                metrics.PIN_HASH_DURATION.observe(
+                    time.perf_counter() - started, operation=operation
+                )
+
+        future = self._executor.submit(job)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def hash_pin(self, pin: Optional[str]) -> Optional[str]:
+        if not pin:
+            return None
+        return await self.run("hash", security.hash_pin, pin)
+
+    async def verify_pin(
+        self, plain_pin: Optional[str], hashed_pin: Optional[str]
+    ) -> bool:
+        """Same result as :func:`security.verify_pin`, computed on the pool.
+
+        Legacy plain-text PINs are compared inline (no bcrypt involved).
+        """
+        if not hashed_pin:
+            return True
+        if not plain_pin:
+            return False
+        if security.is_legacy_pin(hashed_pin):
+            return security.verify_pin(plain_pin, hashed_pin)
+        return await self.run("verify", security.verify_pin, plain_pin, hashed_pin)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def rehash_legacy_pin(user_id: int, legacy_pin: str):
+    """Replace a plain-text PIN with its bcrypt hash (background task)."""
+    try:
+        hashed = await pin_hasher.hash_pin(legacy_pin)
+    except PinHasherBusy:
+        logger.info(f"PIN pool busy; legacy PIN of user {user_id} rehashed later")
+        return
+    await run_in_threadpool(_store_rehashed_pin, user_id, legacy_pin, hashed)
+
+
+def _store_rehashed_pin(user_id: int, legacy_pin: str, hashed: str):
+    # Own session: the request's is closed by now. Conditional UPDATE: a PIN
+    # changed meanwhile is left alone.
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            update(User)
+            .where(User.id == user_id, User.pin == legacy_pin)
+            .values(pin=hashed)
+        )
+        db.commit()
+        if result.rowcount:
+            logger.info(f"Rehashed legacy plain-text PIN of user {user_id}")
+    except Exception:
+        db.rollback()
+        logger.exception(f"Failed to rehash legacy PIN of user {user_id}")
+    finally:
+        db.close()
+
+
+pin_hasher = PinHasher()
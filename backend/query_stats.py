@@ -0,0 +1,133 @@
+"""Per-request SQL statement counting.
+
+:class:`QueryStatsMiddleware` opens a :class:`RequestQueryStats` for every
+HTTP request. SQLAlchemy cursor listeners (registered on the ``Engine`` class,
+so every engine — including the test engine — is covered) add each statement
+and its duration to the stats of the request that issued it. Sync endpoints run
+in the threadpool with a copy of the request context, so they report into the
+same object.
+
+The totals are returned as a ``Server-Timing`` header
+(``db;dur=<ms>;desc="<n> statements"``) and logged at DEBUG level. Set
+``SQL_STATEMENT_WARN`` to log a warning for requests above that many statements.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+SQL_STATEMENT_WARN = int(os.getenv("SQL_STATEMENT_WARN", "0"))
+
+_SERVER_TIMING_RE = re.compile(r'(?:^|,)\s*db;[^,]*desc="(\d+) statements"')
+
+
+@dataclass
+class RequestQueryStats:
+    method: str
+    path: str
+    statements: int = 0
+    db_seconds: float = 0.0
+    scope: dict | None = field(default=None, repr=False)
+
+    @property
+    def route(self) -> str | None:
+        """Route template, once the router has matched the request."""
+        route = (self.scope or {}).get("route")
+        return getattr(route, "path", None)
+
+    @property
+    def label(self) -> str:
+        return self.route or self.path
+
+
+_current: ContextVar[RequestQueryStats | None] = ContextVar(
+    "s2a_query_stats", default=None
+)
+
+
+def current_stats() -> RequestQueryStats | None:
+    """Stats of the request running in this context, if any."""
+    return _current.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("s2a_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("s2a_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+
+def server_timing_value(stats: RequestQueryStats) -> str:
+    return f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.statements} statements"'
+
+
+def statements_from_header(server_timing: str) -> int:
+    """Parse the statement count out of a ``Server-Timing`` header value."""
+    match = _SERVER_TIMING_RE.search(server_timing or "")
+    if not match:
+        raise ValueError(f"No db metric in Server-Timing header: {server_timing!r}")
+    return int(match.group(1))
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware exposing per-request statement counts and DB time."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats(
+            method=scope["method"], path=scope["path"], scope=scope
+        )
+        token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing_value(stats))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            logger.debug(
+                "%s %s: %d SQL statements, %.1f ms in DB",
+                stats.method,
+                stats.label,
+                stats.statements,
+                stats.db_seconds * 1000,
+            )
+            if SQL_STATEMENT_WARN and stats.statements > SQL_STATEMENT_WARN:
+                logger.warning(
+                    "%s %s ran %d SQL statements (warn threshold %d)",
+                    stats.method,
+                    stats.label,
+                    stats.statements,
+                    SQL_STATEMENT_WARN,
+                )
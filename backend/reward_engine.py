@@ -4,6 +4,7 @@ from datetime import date, datetime, timezone
 
 from sqlalchemy.orm import Session
 
+from backend import metrics
 from backend.models import (
     ActivityWallet,
     RewardLog,
@@ -21,6 +22,15 @@ def evaluate_and_grant(db: Session, child_id: int) -> list[dict]:
     Evaluate all active reward rules for a child and grant any earned rewards.
     Returns a list of newly granted rewards.
     """
+    with metrics.REWARD_EVALUATION_DURATION.time():
+        granted = _evaluate_and_grant(db, child_id)
+    if granted:
+        metrics.REWARD_GRANTS.inc(len(granted))
+        metrics.REWARD_GRANTED_MINUTES.inc(sum(g["granted_minutes"] for g in granted))
+    return granted
+
+
+def _evaluate_and_grant(db: Session, child_id: int) -> list[dict]:
     today = date.today()
     active_rules = db.query(RewardRule).filter(RewardRule.is_active).all()
     granted = []
@@ -1,30 +1,81 @@
 """Authentication router - simple PIN-based auth for family use."""
 
+from datetime import datetime
 from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    UploadFile,
+)
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from backend import bulk_import, metrics
 from backend.database import get_db
 from backend.models import ActivityWallet, User, UserRole
+from backend.pin_hashing import PinHasherBusy, pin_hasher, rehash_legacy_pin
 from backend.schemas import (
+    BulkImportResult,
     ChildCreate,
     ChildUpdate,
     LoginRequest,
     LoginResponse,
+    SessionOut,
     UserCreate,
     UserOut,
     UserUpdate,
 )
-from backend.security import hash_pin, verify_pin
+from backend.security import (
+    SessionClaims,
+    is_legacy_pin,
+    issue_session_token,
+    require_api_key,
+    require_session,
+)
 
 router = APIRouter()
 
 
+def _pin_busy(err: PinHasherBusy) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="ただいま混み合っています。しばらくしてから再度お試しください。",
+        headers={"Retry-After": str(err.retry_after)},
+    )
+
+
+# Handlers that hash or verify a PIN are async: they await the PIN pool without
+# holding a request thread and run their DB work via run_in_threadpool.
+
+
+async def _hash_pin(pin: Optional[str]) -> Optional[str]:
+    """bcrypt on the dedicated PIN pool (backend/pin_hashing.py); 429 when full."""
+    try:
+        return await pin_hasher.hash_pin(pin)
+    except PinHasherBusy as err:
+        raise _pin_busy(err) from err
+
+
+async def _verify_pin(plain_pin: Optional[str], hashed_pin: Optional[str]) -> bool:
+    try:
+        return await pin_hasher.verify_pin(plain_pin, hashed_pin)
+    except PinHasherBusy as err:
+        raise _pin_busy(err) from err
+
+
 @router.post("/register", response_model=UserOut)
-def register_user(data: UserCreate, db: Annotated[Session, Depends(get_db)]):
+async def register_user(data: UserCreate, db: Annotated[Session, Depends(get_db)]):
     """Register a new parent or child user."""
+    pin = await _hash_pin(data.pin)
+    return await run_in_threadpool(_create_user, db, data, pin)
+
+
+def _create_user(db: Session, data: UserCreate, pin: Optional[str]) -> User:
     # Normalize empty / whitespace-only email to None to avoid unique constraint issues
     email = data.email.strip() if data.email else None
     email = email or None
@@ -32,7 +83,7 @@ def register_user(data: UserCreate, db: Annotated[Session, Depends(get_db)]):
     user = User(
         name=data.name,
         role=UserRole(data.role),
-        pin=hash_pin(data.pin),
+        pin=pin,
         email=email,
         parent_id=data.parent_id,
         age=data.age,
@@ -63,17 +114,76 @@ def register_user(data: UserCreate, db: Annotated[Session, Depends(get_db)]):
     return user
 
 
+@router.post(
+    "/import",
+    response_model=BulkImportResult,
+    dependencies=[Depends(require_api_key)],
+)
+def import_users(
+    file: UploadFile,
+    db: Annotated[Session, Depends(get_db)],
+    dry_run: bool = False,
+):
+    """Bulk-create parents and children from a CSV or JSON file.
+
+    Bad rows are reported per row number; the rest are imported
+    (see backend/bulk_import.py for the columns).
+    """
+    try:
+        rows = bulk_import.parse_rows(
+            file.file.read(),
+            bulk_import.detect_format(file.filename, file.content_type),
+        )
+    except (bulk_import.BulkImportError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return bulk_import.import_users(db, rows, dry_run=dry_run)
+
+
 @router.post("/login", response_model=LoginResponse)
-def login(data: LoginRequest, db: Annotated[Session, Depends(get_db)]):
-    """Login with user ID and optional PIN."""
-    user = db.query(User).filter(User.id == data.user_id).first()
+async def login(
+    data: LoginRequest,
+    background_tasks: BackgroundTasks,
+    db: Annotated[Session, Depends(get_db)],
+):
+    """Login with user ID and optional PIN.
+
+    A legacy plain-text PIN is replaced by its bcrypt hash after the response.
+    """
+    user = await run_in_threadpool(
+        lambda: db.query(User).filter(User.id == data.user_id).first()
+    )
     if not user:
         raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
 
-    if user.pin and not verify_pin(data.pin, user.pin):
+    if user.pin and not await _verify_pin(data.pin, user.pin):
         raise HTTPException(status_code=401, detail="PINが正しくありません")
+    if is_legacy_pin(user.pin):
+        metrics.add_background_task(
+            background_tasks, rehash_legacy_pin, user.id, user.pin
+        )
+
+    token, expires_at = issue_session_token(
+        user.id,
+        user.role.value,
+        user.parent_id if user.role == UserRole.CHILD else user.id,
+    )
+    return LoginResponse(
+        user=UserOut.model_validate(user),
+        message="ログイン成功",
+        session_token=token,
+        expires_at=datetime.utcfromtimestamp(expires_at),
+    )
 
-    return LoginResponse(user=UserOut.model_validate(user), message="ログイン成功")
+
+@router.get("/session", response_model=SessionOut)
+def get_session(claims: Annotated[SessionClaims, Depends(require_session)]):
+    """Who the session token belongs to (verified without a DB lookup)."""
+    return SessionOut(
+        user_id=claims.user_id,
+        role=claims.role,
+        family_id=claims.family_id,
+        expires_at=datetime.utcfromtimestamp(claims.expires_at),
+    )
 
 
 @router.get("/users", response_model=list[UserOut])
@@ -107,12 +217,17 @@ def list_children(
 
 
 @router.post("/users/children", response_model=UserOut)
-def create_child(data: ChildCreate, db: Annotated[Session, Depends(get_db)]):
+async def create_child(data: ChildCreate, db: Annotated[Session, Depends(get_db)]):
     """Add a new child user with auto-created wallet."""
+    pin = await _hash_pin(data.pin)
+    return await run_in_threadpool(_create_child, db, data, pin)
+
+
+def _create_child(db: Session, data: ChildCreate, pin: Optional[str]) -> User:
     child = User(
         name=data.name,
         role=UserRole.CHILD,
-        pin=hash_pin(data.pin),
+        pin=pin,
     )
     db.add(child)
     db.flush()
@@ -125,12 +240,19 @@ def create_child(data: ChildCreate, db: Annotated[Session, Depends(get_db)]):
 
 
 @router.patch("/children/{child_id}", response_model=UserOut)
-def update_child(
+async def update_child(
     child_id: int,
     data: ChildUpdate,
     db: Annotated[Session, Depends(get_db)],
 ):
     """Update a child user's profile."""
+    pin = await _hash_pin(data.pin) if data.pin is not None else None
+    return await run_in_threadpool(_update_child, db, child_id, data, pin)
+
+
+def _update_child(
+    db: Session, child_id: int, data: ChildUpdate, pin: Optional[str]
+) -> User:
     child = (
         db.query(User).filter(User.id == child_id, User.role == UserRole.CHILD).first()
     )
@@ -150,7 +272,7 @@ def update_child(
         if wallet:
             wallet.daily_limit_minutes = data.daily_game_limit_minutes
     if data.pin is not None:
-        child.pin = hash_pin(data.pin)
+        child.pin = pin
 
     db.commit()
     db.refresh(child)
@@ -183,13 +305,19 @@ def delete_child(child_id: int, db: Annotated[Session, Depends(get_db)]):
 
 
 @router.put("/users/profile", response_model=UserOut)
-def update_profile(
+async def update_profile(
     data: UserUpdate, db: Annotated[Session, Depends(get_db)], user_id: int = 0
 ):
     """Edit the current parent user's profile (name, PIN, email)."""
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id パラメータが必要です")
+    pin = await _hash_pin(data.pin) if data.pin is not None else None
+    return await run_in_threadpool(_update_profile, db, user_id, data, pin)
+
 
+def _update_profile(
+    db: Session, user_id: int, data: UserUpdate, pin: Optional[str]
+) -> User:
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
@@ -197,7 +325,7 @@ def update_profile(
     if data.name is not None:
         user.name = data.name
     if data.pin is not None:
-        user.pin = hash_pin(data.pin)
+        user.pin = pin
     if data.email is not None:
         email = data.email.strip() or None
         user.email = email
@@ -0,0 +1,35 @@
+"""Debug router - operational introspection (slow queries)."""
+
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from backend import slow_query
+from backend.security import BACKEND_API_KEY, require_api_key
+
+router = APIRouter()
+
+
+def require_debug_access(api_key: str = Depends(require_api_key)) -> str:
+    """Debug endpoints need an API key in production (no open fallback)."""
+    if os.getenv("ENV") == "production" and not BACKEND_API_KEY:
+        raise HTTPException(
+            status_code=403, detail="BACKEND_API_KEY を設定してください"
+        )
+    return api_key
+
+
+@router.get("/slow-queries", dependencies=[Depends(require_debug_access)])
+def list_slow_queries(limit: int = Query(50, ge=1, le=500)):  # noqa: B008
+    """Most recent slow statements with parameter shapes, route and plan."""
+    return {
+        "threshold_ms": slow_query.SLOW_QUERY_MS,
+        "queries": slow_query.recent_slow_queries()[:limit],
+    }
+
+
+@router.delete("/slow-queries", dependencies=[Depends(require_debug_access)])
+def clear_slow_queries():
+    """Empty the slow query buffer."""
+    slow_query.clear()
+    return {"message": "cleared"}
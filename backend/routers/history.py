@@ -4,8 +4,10 @@ from datetime import date
 from typing import Annotated, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
+from backend.compression import compressible
 from backend.database import get_db
 from backend.models import RewardLog, StudyPlan, StudyTask, TaskStatus, User, UserRole
 from backend.schemas import StudyHistoryEntry, StudyHistoryResponse, UserOut
@@ -13,7 +15,44 @@ from backend.schemas import StudyHistoryEntry, StudyHistoryResponse, UserOut
 router = APIRouter()
 
 
+def _history_query(
+    db: Session, child_id: int, date_from: Optional[date], date_to: Optional[date]
+):
+    q = (
+        db.query(StudyTask, StudyPlan)
+        .join(StudyPlan, StudyTask.plan_id == StudyPlan.id)
+        .filter(StudyPlan.child_id == child_id)
+        .filter(StudyTask.status.in_([TaskStatus.COMPLETED, TaskStatus.APPROVED]))
+    )
+
+    if date_from:
+        q = q.filter(StudyPlan.plan_date >= date_from)
+    if date_to:
+        q = q.filter(StudyPlan.plan_date <= date_to)
+
+    return q.order_by(StudyPlan.plan_date.desc(), StudyTask.completed_at.desc())
+
+
+def _history_entry(task: StudyTask, plan: StudyPlan, reward_mins: int):
+    return StudyHistoryEntry(
+        task_id=task.id,
+        subject=task.subject,
+        description=task.description,
+        estimated_minutes=task.estimated_minutes,
+        actual_minutes=task.actual_minutes,
+        is_homework=task.is_homework,
+        status=task.status.value,
+        started_at=task.started_at,
+        completed_at=task.completed_at,
+        approved_at=task.approved_at,
+        plan_date=plan.plan_date,
+        plan_title=plan.title,
+        reward_minutes=reward_mins,
+    )
+
+
 @router.get("/{child_id}", response_model=StudyHistoryResponse)
+@compressible
 def get_study_history(  # noqa: C901
     child_id: int,
     db: Annotated[Session, Depends(get_db)],
@@ -28,20 +67,7 @@ def get_study_history(  # noqa: C901
     if not child:
         raise HTTPException(status_code=404, detail="子供ユーザーが見つかりません")
 
-    q = (
-        db.query(StudyTask, StudyPlan)
-        .join(StudyPlan, StudyTask.plan_id == StudyPlan.id)
-        .filter(StudyPlan.child_id == child_id)
-        .filter(StudyTask.status.in_([TaskStatus.COMPLETED, TaskStatus.APPROVED]))
-    )
-
-    if date_from:
-        q = q.filter(StudyPlan.plan_date >= date_from)
-    if date_to:
-        q = q.filter(StudyPlan.plan_date <= date_to)
-
-    q = q.order_by(StudyPlan.plan_date.desc(), StudyTask.completed_at.desc())
-    results = q.limit(limit).all()
+    results = _history_query(db, child_id, date_from, date_to).limit(limit).all()
 
     # Get reward info for approved tasks
     reward_map = {}
@@ -76,23 +102,7 @@ def get_study_history(  # noqa: C901
         if task.status == TaskStatus.APPROVED and task.approved_at:
             reward_mins = reward_map.get(task.approved_at.date(), 0)
 
-        entries.append(
-            StudyHistoryEntry(
-                task_id=task.id,
-                subject=task.subject,
-                description=task.description,
-                estimated_minutes=task.estimated_minutes,
-                actual_minutes=task.actual_minutes,
-                is_homework=task.is_homework,
-                status=task.status.value,
-                started_at=task.started_at,
-                completed_at=task.completed_at,
-                approved_at=task.approved_at,
-                plan_date=plan.plan_date,
-                plan_title=plan.title,
-                reward_minutes=reward_mins,
-            )
-        )
+        entries.append(_history_entry(task, plan, reward_mins))
         total_reward += reward_mins
 
     return StudyHistoryResponse(
@@ -101,3 +111,39 @@ def get_study_history(  # noqa: C901
         total_study_minutes=total_study,
         total_reward_minutes=total_reward,
     )
+
+
+@router.get("/{child_id}/export")
+@compressible
+def export_study_history(
+    child_id: int,
+    db: Annotated[Session, Depends(get_db)],
+    date_from: Optional[date] = Query(None, description="Start date filter"),  # noqa: B008
+    date_to: Optional[date] = Query(None, description="End date filter"),  # noqa: B008
+):
+    """Export the full study history as NDJSON (one entry per line).
+
+    Rows are loaded up front (the DB session is released before the body is
+    streamed); serialization and compression happen per line while streaming.
+    """
+    child = (
+        db.query(User).filter(User.id == child_id, User.role == UserRole.CHILD).first()
+    )
+    if not child:
+        raise HTTPException(status_code=404, detail="子供ユーザーが見つかりません")
+
+    results = _history_query(db, child_id, date_from, date_to).all()
+    reward_map = {}
+    for rl in db.query(RewardLog).filter(RewardLog.child_id == child_id).all():
+        reward_map[rl.granted_date] = (
+            reward_map.get(rl.granted_date, 0) + rl.granted_minutes
+        )
+
+    def iter_lines():
+        for task, plan in results:
+            reward_mins = 0
+            if task.status == TaskStatus.APPROVED and task.approved_at:
+                reward_mins = reward_map.get(task.approved_at.date(), 0)
+            yield _history_entry(task, plan, reward_mins).model_dump_json() + "\n"
+
+    return StreamingResponse(iter_lines(), media_type="application/x-ndjson")
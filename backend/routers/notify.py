@@ -2,7 +2,7 @@
 
 from typing import Annotated
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from backend.database import get_db
@@ -14,7 +14,6 @@ router = APIRouter()
 @router.post("/game-timeout/{child_id}")
 def notify_game_timeout(
     child_id: int,
-    background_tasks: BackgroundTasks,
     db: Annotated[Session, Depends(get_db)],
 ):
     """Send LINE notification to parent(s) when child's game time expires."""
@@ -35,8 +34,9 @@ def notify_game_timeout(
     notified = []
     for parent in parents:
         if parent.line_notify_token:
-            background_tasks.add_task(_notify, parent.line_notify_token, child.name)
-            notified.append(parent.name)
+            # Queued for the LINE notifier; delivery happens off the request
+            if _notify(parent.line_notify_token, child.name):
+                notified.append(parent.name)
 
     return {
         "message": "ゲーム時間終了通知を送信しました",
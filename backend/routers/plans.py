@@ -6,8 +6,9 @@ from datetime import date, timedelta
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
+from backend.compression import compressible
 from backend.database import get_db
 from backend.models import StudyPlan, StudyTask, User, UserRole
 from backend.schemas import StudyPlanCreate, StudyPlanOut, WeeklySchedule
@@ -52,6 +53,7 @@ def create_plan(data: StudyPlanCreate, db: Annotated[Session, Depends(get_db)]):
 
 
 @router.get("/weekly", response_model=WeeklySchedule)
+@compressible
 def get_weekly_schedule(
     db: Annotated[Session, Depends(get_db)],
     child_id: Annotated[int | None, Query()] = None,
@@ -67,9 +69,13 @@ def get_weekly_schedule(
         week_start = today - timedelta(days=today.weekday())
     week_end = week_start + timedelta(days=6)
 
-    query = db.query(StudyPlan).filter(
-        StudyPlan.plan_date >= week_start,
-        StudyPlan.plan_date <= week_end,
+    query = (
+        db.query(StudyPlan)
+        .options(selectinload(StudyPlan.tasks))
+        .filter(
+            StudyPlan.plan_date >= week_start,
+            StudyPlan.plan_date <= week_end,
+        )
     )
     if child_id is not None:
         query = query.filter(StudyPlan.child_id == child_id)
@@ -91,13 +97,14 @@ def get_weekly_schedule(
 
 
 @router.get("/", response_model=list[StudyPlanOut])
+@compressible
 def list_plans(
     db: Annotated[Session, Depends(get_db)],
     child_id: Annotated[int | None, Query()] = None,
     plan_date: Annotated[date | None, Query()] = None,
 ):
     """List study plans, optionally filtered by child and/or date."""
-    query = db.query(StudyPlan)
+    query = db.query(StudyPlan).options(selectinload(StudyPlan.tasks))
     if child_id is not None:
         query = query.filter(StudyPlan.child_id == child_id)
     if plan_date is not None:
@@ -1,16 +1,22 @@
+import json
 import logging
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pynintendoauth.exceptions import InvalidSessionTokenException
 from sqlalchemy.orm import Session
 
+from backend.circuit_breaker import CircuitOpenError
 from backend.database import get_db
-from backend.models import User, UserRole
+from backend.models import SwitchDeviceLink, SwitchDeviceState, User, UserRole
+from backend.pending_auth import SWITCH_AUTH_WAIT_MAX
 from backend.schemas import (
     SwitchAuthUrl,
     SwitchCallbackRequest,
     SwitchConnectRequest,
+    SwitchDeviceLinkOut,
+    SwitchDeviceLinkUpdate,
     SwitchDeviceOut,
     SwitchSyncResponse,
 )
@@ -21,6 +27,33 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+async def _link_token(db: Session, user: User, session_token: str):
+    """Store a new session token, dropping state tied to the previous one.
+
+    The new token may belong to another Nintendo account, so the applied-limit
+    records are dropped and console links are kept only for consoles the new
+    account has (none when its device list cannot be fetched). Changes are
+    committed by the caller.
+    """
+    if user.nintendo_session_token:
+        await switch_service.forget_token(user.get_nintendo_token())
+    db.query(SwitchDeviceState).filter(SwitchDeviceState.parent_id == user.id).delete(
+        synchronize_session=False
+    )
+    links = db.query(SwitchDeviceLink).filter(SwitchDeviceLink.parent_id == user.id)
+    if links.first() is not None:
+        try:
+            devices = await switch_service.get_devices(session_token)
+            device_ids = {dev["device_id"] for dev in devices}
+        except Exception as e:
+            logger.warning(f"Dropping Switch device links of user {user.id}: {e}")
+            device_ids = set()
+        links.filter(SwitchDeviceLink.device_id.notin_(device_ids)).delete(
+            synchronize_session=False
+        )
+    user.set_nintendo_token(session_token)
+
+
 @router.get(
     "/auth-url", response_model=SwitchAuthUrl, dependencies=[Depends(require_api_key)]
 )
@@ -42,7 +75,7 @@ async def connect_switch(
         session_token = await switch_service.complete_login(
             data.response_url, data.verifier, data.state
         )
-        user.set_nintendo_token(session_token)
+        await _link_token(db, user, session_token)
         db.commit()
         return {"message": "Nintendo Account と連携しました"}
     except ValueError as e:
@@ -76,7 +109,7 @@ async def switch_callback(
         session_token = await switch_service.complete_login_with_code(
             data.session_token_code, data.verifier, data.state
         )
-        user.set_nintendo_token(session_token)
+        await _link_token(db, user, session_token)
         db.commit()
         return {"message": "Nintendo Account と連携しました"}
     except ValueError as e:
@@ -93,26 +126,77 @@ async def switch_callback(
         ) from e
 
 
+async def _link_completed_auth(result: dict, user_id: int, db: Session):
+    """Persist the session token of a completed login to the user record."""
+    if result["status"] == "complete" and result.get("session_token"):
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            await _link_token(db, user, result["session_token"])
+            db.commit()
+
+
 @router.get("/auth-status/{state}", dependencies=[Depends(require_api_key)])
 async def get_auth_status(
-    state: str, user_id: int, db: Annotated[Session, Depends(get_db)]
+    state: str, user_id: int, db: Annotated[Session, Depends(get_db)], wait: float = 0
 ):
     """Poll whether Nintendo authentication for a given state is complete.
 
     Returns {"status": "pending" | "complete" | "expired" | "unknown"}.
     When complete, the session token is automatically persisted to the user record.
+    With ``wait`` (seconds, capped at SWITCH_AUTH_WAIT_MAX) the request is held
+    open until the login completes or expires (long-poll).
     """
-    result = switch_service.get_auth_status(state)
-
-    if result["status"] == "complete" and result.get("session_token"):
-        user = db.query(User).filter(User.id == user_id).first()
-        if user:
-            user.set_nintendo_token(result["session_token"])
-            db.commit()
+    wait = min(max(wait, 0), SWITCH_AUTH_WAIT_MAX)
+    if wait:
+        result = await switch_service.wait_auth_status(state, wait)
+    else:
+        result = switch_service.get_auth_status(state)
+    await _link_completed_auth(result, user_id, db)
 
     return {"status": result["status"]}
 
 
+@router.get("/auth-status/{state}/stream", dependencies=[Depends(require_api_key)])
+async def stream_auth_status(
+    state: str, user_id: int, db: Annotated[Session, Depends(get_db)]
+):
+    """Server-Sent Events: one ``status`` event per change, ending once the
+    login is complete, expired or unknown. A comment line is sent every
+    SWITCH_AUTH_WAIT_MAX seconds while pending to keep proxies from timing out.
+    """
+
+    async def events():
+        result = switch_service.get_auth_status(state)
+        if result["status"] == "pending":
+            yield _sse_status(result)
+        while result["status"] == "pending":
+            result = await switch_service.wait_auth_status(state, SWITCH_AUTH_WAIT_MAX)
+            if result["status"] == "pending":
+                yield ": keep-alive\n\n"
+        # get_db has closed the session by now; a closed Session simply checks
+        # out a new connection when used again
+        await _link_completed_auth(result, user_id, db)
+        yield _sse_status(result)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _upstream_unavailable(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Nintendo のサーバーが応答していません。しばらくしてから再度お試しください。",
+        headers={"Retry-After": str(max(1, round(retry_after)))},
+    )
+
+
+def _sse_status(result: dict) -> str:
+    return f"event: status\ndata: {json.dumps({'status': result['status']})}\n\n"
+
+
 @router.get(
     "/devices/{user_id}",
     response_model=list[SwitchDeviceOut],
@@ -137,6 +221,8 @@ async def list_switch_devices(user_id: int, db: Annotated[Session, Depends(get_d
         return devices
     except HTTPException:
         raise
+    except CircuitOpenError as err:
+        raise _upstream_unavailable(err.retry_after) from err
     except InvalidSessionTokenException as err:
         logger.warning(f"Invalid session token for user {user_id}")
         raise HTTPException(
@@ -156,8 +242,17 @@ async def list_switch_devices(user_id: int, db: Annotated[Session, Depends(get_d
     dependencies=[Depends(require_api_key)],
 )
 async def sync_balance_to_switch(user_id: int, db: Annotated[Session, Depends(get_db)]):
-    """Sync the child's wallet balance to all linked Switch devices."""
-    from backend.sync_utils import _calculate_switch_limit
+    """Sync each child's wallet balance to that child's Switch devices.
+
+    Children without linked consoles are skipped; accounts with no links at
+    all push their first child's limit to every device (the first child
+    without a parent when the parent has none of its own).
+    """
+    from backend.sync_utils import (
+        _calculate_switch_limit,
+        apply_switch_limit,
+        household_targets,
+    )
 
     parent = (
         db.query(User).filter(User.id == user_id, User.role == UserRole.PARENT).first()
@@ -167,12 +262,22 @@ async def sync_balance_to_switch(user_id: int, db: Annotated[Session, Depends(ge
             status_code=400, detail="親ユーザーが特定できないか、連携されていません"
         )
 
-    # Get the child (assuming one child for simplicity in this Phase)
-    child = db.query(User).filter(User.role == UserRole.CHILD).first()
-    if not child or not child.wallet:
-        raise HTTPException(status_code=404, detail="子供のウォレットが見つかりません")
-
-    limit = _calculate_switch_limit(db, child.id, child.wallet)
+    targets = household_targets(db, parent.id)
+    if not targets:
+        # Children registered without parent_id: the first child (single family).
+        # Never another family's child.
+        child = (
+            db.query(User)
+            .filter(User.role == UserRole.CHILD, User.parent_id.is_(None))
+            .first()
+        )
+        if not child or not child.wallet:
+            raise HTTPException(
+                status_code=404, detail="子供のウォレットが見つかりません"
+            )
+        targets = [
+            (child.id, _calculate_switch_limit(db, child.id, child.wallet), None)
+        ]
 
     try:
         token = parent.get_nintendo_token()
@@ -181,27 +286,29 @@ async def sync_balance_to_switch(user_id: int, db: Annotated[Session, Depends(ge
                 status_code=400,
                 detail="連携情報が無効です。再度 Nintendo Account の連携を行ってください。",
             )
-        devices = await switch_service.get_devices(token)
-        synced_names = []
-        failed_names = []
-        for dev in devices:
-            success = await switch_service.update_device_limit(
-                token, dev["device_id"], limit
+        synced_names, failed_names = [], []
+        for _child_id, limit, devices in targets:
+            names, errors = await apply_switch_limit(
+                db, parent.id, token, limit, devices
             )
-            if success:
-                synced_names.append(dev["name"])
-            else:
-                failed_names.append(dev["name"])
+            synced_names += names
+            failed_names += errors
 
-        if not synced_names and devices:
+        if failed_names and not synced_names:
+            retry_after = switch_service.breaker.retry_after()
+            if retry_after:
+                raise _upstream_unavailable(retry_after)
             raise HTTPException(
                 status_code=500,
                 detail=f"デバイスの更新に失敗しました: {', '.join(failed_names)}",
             )
 
-        return {"message": f"{limit}分 を同期しました", "synced_devices": synced_names}
+        limits = "、".join(dict.fromkeys(f"{limit}分" for _, limit, _ in targets))
+        return {"message": f"{limits} を同期しました", "synced_devices": synced_names}
     except HTTPException:
         raise
+    except CircuitOpenError as err:
+        raise _upstream_unavailable(err.retry_after) from err
     except InvalidSessionTokenException as err:
         logger.warning(f"Invalid session token for user {user_id}")
         raise HTTPException(
@@ -213,3 +320,80 @@ async def sync_balance_to_switch(user_id: int, db: Annotated[Session, Depends(ge
         raise HTTPException(
             status_code=500, detail="Switch への同期に失敗しました"
         ) from e
+
+
+@router.get(
+    "/device-links/{parent_id}",
+    response_model=list[SwitchDeviceLinkOut],
+    dependencies=[Depends(require_api_key)],
+)
+def list_device_links(parent_id: int, db: Annotated[Session, Depends(get_db)]):
+    """Which child each Switch console of the parent's account belongs to."""
+    return (
+        db.query(SwitchDeviceLink)
+        .filter(SwitchDeviceLink.parent_id == parent_id)
+        .order_by(SwitchDeviceLink.child_id, SwitchDeviceLink.device_id)
+        .all()
+    )
+
+
+@router.put(
+    "/device-links/{child_id}",
+    response_model=list[SwitchDeviceLinkOut],
+    dependencies=[Depends(require_api_key)],
+)
+def set_device_links(
+    child_id: int,
+    data: SwitchDeviceLinkUpdate,
+    db: Annotated[Session, Depends(get_db)],
+):
+    """Set the child's consoles (device IDs from GET /devices/{parent_id}).
+
+    Consoles previously linked to another child move to this one.
+    """
+    from backend.sync_utils import _find_sync_parent
+
+    child = (
+        db.query(User).filter(User.id == child_id, User.role == UserRole.CHILD).first()
+    )
+    if not child:
+        raise HTTPException(status_code=404, detail="子供ユーザーが見つかりません")
+    parent = _find_sync_parent(db, child_id)
+    if not parent:
+        raise HTTPException(
+            status_code=400, detail="親ユーザーが特定できないか、連携されていません"
+        )
+
+    device_ids = list(dict.fromkeys(data.device_ids))
+    names = dict(
+        db.query(SwitchDeviceState.device_id, SwitchDeviceState.device_name).filter(
+            SwitchDeviceState.parent_id == parent.id
+        )
+    )
+    db.query(SwitchDeviceLink).filter(
+        SwitchDeviceLink.parent_id == parent.id,
+        (SwitchDeviceLink.child_id == child_id)
+        | SwitchDeviceLink.device_id.in_(device_ids),
+    ).delete(synchronize_session=False)
+    links = [
+        SwitchDeviceLink(
+            parent_id=parent.id,
+            child_id=child_id,
+            device_id=device_id,
+            device_name=names.get(device_id),
+        )
+        for device_id in device_ids
+    ]
+    db.add_all(links)
+    db.commit()
+    return links
+
+
+@router.get(
+    "/fleet-runs", response_model=list[dict], dependencies=[Depends(require_api_key)]
+)
+def list_fleet_runs(db: Annotated[Session, Depends(get_db)], limit: int = 10):
+    """Progress of recent fleet-wide limit pushes (newest first)."""
+    from backend.fleet_sync import recent_runs
+
+    return recent_runs(db, min(max(limit, 1), 100))
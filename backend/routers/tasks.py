@@ -2,12 +2,13 @@
 
 from __future__ import annotations
 
-from datetime import datetime, timezone
-from typing import Annotated
+from datetime import date, datetime, timezone
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from sqlalchemy.orm import Session
 
+from backend.compression import compressible, precompressed_response
 from backend.database import get_db
 from backend.models import (
     StudyTask,
@@ -26,8 +27,9 @@ from backend.schemas import (
     StudyTaskUpdate,
     UserOut,
 )
+from backend.security import SessionClaims, optional_session, require_api_key
 from backend.services import dashboard_service
-from backend.sync_utils import trigger_switch_sync
+from backend.sync_queue import enqueue_switch_sync
 
 UTC = timezone.utc
 
@@ -80,7 +82,6 @@ def start_task(task_id: int, db: Annotated[Session, Depends(get_db)]):
 @router.post("/{task_id}/complete", response_model=StudyTaskOut)
 def complete_task(
     task_id: int,
-    background_tasks: BackgroundTasks,
     db: Annotated[Session, Depends(get_db)],
     actual_minutes: int | None = None,
 ):
@@ -112,13 +113,12 @@ def complete_task(
 
     # Send LINE Notify to parent(s)
     child = task.plan.child
-    _send_approval_notification(background_tasks, db, child, task)
+    _send_approval_notification(db, child, task)
 
     return task
 
 
 def _send_approval_notification(
-    background_tasks: BackgroundTasks,
     db: Session,
     child: User,
     task: StudyTask,
@@ -134,8 +134,8 @@ def _send_approval_notification(
 
     for parent in parents:
         if parent.line_notify_token:
-            background_tasks.add_task(
-                notify_approval_request,
+            # Only queued here; the LINE notifier delivers it
+            notify_approval_request(
                 parent.line_notify_token,
                 child.name,
                 task.subject,
@@ -146,26 +146,52 @@ def _send_approval_notification(
 @router.post("/{task_id}/approve", response_model=dict)
 def approve_task(
     task_id: int,
-    parent_id: int,
-    background_tasks: BackgroundTasks,
     db: Annotated[Session, Depends(get_db)],
+    session: Annotated[Optional[SessionClaims], Depends(optional_session)],
+    parent_id: Optional[int] = None,
+    x_api_key: Annotated[Optional[str], Header()] = None,
 ):
-    """Approve a completed task (parent action). Triggers reward evaluation."""
+    """Approve a completed task (parent action). Triggers reward evaluation.
+
+    The parent and family come from the session token (no user lookup). A bare
+    ``parent_id`` without a token is accepted only with the backend API key
+    (internal tools, load tests).
+    """
+    if session is not None:
+        if session.role != UserRole.PARENT.value or parent_id not in (
+            None,
+            session.user_id,
+        ):
+            raise HTTPException(status_code=403, detail="親ユーザーのみ承認できます")
+        parent_id = session.user_id
+        family_id = session.family_id
+    elif parent_id is None:
+        raise HTTPException(status_code=401, detail="ログインが必要です")
+    else:
+        require_api_key(x_api_key)
+        family_id = parent_id
+
     task = db.query(StudyTask).filter(StudyTask.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="タスクが見つかりません")
 
+    # Children without a parent_id predate families (single-family setup)
+    child = task.plan.child
+    if child.parent_id is not None and child.parent_id != family_id:
+        raise HTTPException(status_code=403, detail="他の家族のタスクは承認できません")
+
     if task.status != TaskStatus.COMPLETED:
         raise HTTPException(status_code=400, detail="完了済みのタスクのみ承認できます")
 
     # Verify parent
-    parent = (
-        db.query(User)
-        .filter(User.id == parent_id, User.role == UserRole.PARENT)
-        .first()
-    )
-    if not parent:
-        raise HTTPException(status_code=403, detail="親ユーザーのみ承認できます")
+    if session is None:
+        parent = (
+            db.query(User)
+            .filter(User.id == parent_id, User.role == UserRole.PARENT)
+            .first()
+        )
+        if not parent:
+            raise HTTPException(status_code=403, detail="親ユーザーのみ承認できます")
 
     task.status = TaskStatus.APPROVED
     task.approved_at = datetime.utcnow()
@@ -176,9 +202,9 @@ def approve_task(
     child_id = task.plan.child_id
     granted = evaluate_and_grant(db, child_id)
 
-    # If rewards were granted, trigger Switch sync in background
+    # If rewards were granted, queue a Switch sync (durable outbox, see sync_queue)
     if granted:
-        background_tasks.add_task(trigger_switch_sync, db, child_id)
+        enqueue_switch_sync(db, child_id)
 
     return {
         "task": StudyTaskOut.model_validate(task),
@@ -208,48 +234,70 @@ def reject_task(task_id: int, db: Annotated[Session, Depends(get_db)]):
 
 
 @router.get("/dashboard/child/{child_id}", response_model=ChildDashboard)
-def child_dashboard(child_id: int, db: Annotated[Session, Depends(get_db)]):
+@compressible
+def child_dashboard(
+    child_id: int, request: Request, db: Annotated[Session, Depends(get_db)]
+):
     """Get child's dashboard data for today."""
-    data = dashboard_service.get_child_dashboard_data(db, child_id)
-    if not data:
-        raise HTTPException(status_code=404, detail="子供ユーザーが見つかりません")
-
-    return ChildDashboard(
-        user=UserOut.model_validate(data["user"]),
-        today_plan=(
-            StudyPlanOut.model_validate(data["today_plan"])
-            if data["today_plan"]
-            else None
-        ),
-        wallet_balance=data["wallet_balance"],
-        daily_limit=data["daily_limit"],
-        today_earned=data["today_earned"],
-        today_consumed=data["today_consumed"],
-        pending_tasks=data["pending_tasks"],
-        completed_tasks=data["completed_tasks"],
-        approved_tasks=data["approved_tasks"],
-    )
+    cache_key = ("child", child_id, date.today())
+    entry = dashboard_service.payload_cache.get(cache_key)
+    if entry is None:
+        generation = dashboard_service.payload_cache.generation
+        data = dashboard_service.get_child_dashboard_data(db, child_id)
+        if not data:
+            raise HTTPException(status_code=404, detail="子供ユーザーが見つかりません")
+
+        dashboard = ChildDashboard(
+            user=UserOut.model_validate(data["user"]),
+            today_plan=(
+                StudyPlanOut.model_validate(data["today_plan"])
+                if data["today_plan"]
+                else None
+            ),
+            wallet_balance=data["wallet_balance"],
+            daily_limit=data["daily_limit"],
+            today_earned=data["today_earned"],
+            today_consumed=data["today_consumed"],
+            pending_tasks=data["pending_tasks"],
+            completed_tasks=data["completed_tasks"],
+            approved_tasks=data["approved_tasks"],
+        )
+        entry = dashboard_service.payload_cache.put(
+            cache_key, dashboard.model_dump_json().encode(), generation
+        )
+    return precompressed_response(request, entry)
 
 
 @router.get("/dashboard/parent", response_model=ParentDashboard)
-def parent_dashboard(db: Annotated[Session, Depends(get_db)]):
+@compressible
+def parent_dashboard(request: Request, db: Annotated[Session, Depends(get_db)]):
     """Get parent's dashboard data."""
-    data = dashboard_service.get_parent_dashboard_data(db)
-    return ParentDashboard(
-        children=[UserOut.model_validate(c) for c in data["children"]],
-        pending_approvals=[
-            StudyTaskOut.model_validate(t) for t in data["pending_approvals"]
-        ],
-        today_plans=[StudyPlanOut.model_validate(p) for p in data["today_plans"]],
-        active_rules=[RewardRuleOut.model_validate(r) for r in data["active_rules"]],
-        game_time_summaries=[
-            ChildGameTimeSummary(
-                child=UserOut.model_validate(s["child"]),
-                daily_game_limit=s["daily_game_limit"],
-                today_earned=s["today_earned"],
-                today_consumed=s["today_consumed"],
-                wallet_balance=s["wallet_balance"],
-            )
-            for s in data["game_time_summaries"]
-        ],
-    )
+    cache_key = ("parent", date.today())
+    entry = dashboard_service.payload_cache.get(cache_key)
+    if entry is None:
+        generation = dashboard_service.payload_cache.generation
+        data = dashboard_service.get_parent_dashboard_data(db)
+        dashboard = ParentDashboard(
+            children=[UserOut.model_validate(c) for c in data["children"]],
+            pending_approvals=[
+                StudyTaskOut.model_validate(t) for t in data["pending_approvals"]
+            ],
+            today_plans=[StudyPlanOut.model_validate(p) for p in data["today_plans"]],
+            active_rules=[
+                RewardRuleOut.model_validate(r) for r in data["active_rules"]
+            ],
+            game_time_summaries=[
+                ChildGameTimeSummary(
+                    child=UserOut.model_validate(s["child"]),
+                    daily_game_limit=s["daily_game_limit"],
+                    today_earned=s["today_earned"],
+                    today_consumed=s["today_consumed"],
+                    wallet_balance=s["wallet_balance"],
+                )
+                for s in data["game_time_summaries"]
+            ],
+        )
+        entry = dashboard_service.payload_cache.put(
+            cache_key, dashboard.model_dump_json().encode(), generation
+        )
+    return precompressed_response(request, entry)
@@ -1,7 +1,7 @@
 """Pydantic schemas for request/response serialization."""
 
 from datetime import date, datetime
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic import BaseModel
 
@@ -50,6 +50,43 @@ class ChildUpdate(BaseModel):
     pin: Optional[str] = None
 
 
+class BulkUserRow(BaseModel):
+    """One row of a bulk import (backend/bulk_import.py)."""
+
+    name: str
+    role: Literal["parent", "child"]
+    pin: Optional[str] = None
+    email: Optional[str] = None
+    age: Optional[int] = None
+    daily_game_limit_minutes: Optional[int] = 60
+    ref: Optional[str] = None  # key for parent_ref within the same file
+    parent_ref: Optional[str] = None
+    parent_id: Optional[int] = None
+
+    model_config = {"coerce_numbers_to_str": True, "str_strip_whitespace": True}
+
+
+class BulkImportUser(BaseModel):
+    row: int
+    id: Optional[int] = None  # None on a dry run
+    name: str
+    role: str
+    ref: Optional[str] = None
+
+
+class BulkImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    created: int
+    failed: int
+    dry_run: bool
+    users: list[BulkImportUser]
+    errors: list[BulkImportRowError]
+
+
 class LoginRequest(BaseModel):
     user_id: int
     pin: Optional[str] = None
@@ -58,6 +95,16 @@ class LoginRequest(BaseModel):
 class LoginResponse(BaseModel):
     user: UserOut
     message: str
+    # HMAC-signed session token; send as "Authorization: Bearer <token>"
+    session_token: Optional[str] = None
+    expires_at: Optional[datetime] = None
+
+
+class SessionOut(BaseModel):
+    user_id: int
+    role: str
+    family_id: Optional[int] = None
+    expires_at: datetime
 
 
 # --- Study Plan ---
@@ -302,6 +349,20 @@ class SwitchDeviceOut(BaseModel):
     current_limit: int
 
 
+class SwitchDeviceLinkOut(BaseModel):
+    child_id: int
+    device_id: str
+    device_name: Optional[str] = None
+
+    model_config = {"from_attributes": True}
+
+
+class SwitchDeviceLinkUpdate(BaseModel):
+    """Consoles that belong to the child (replaces the current set)."""
+
+    device_ids: list[str]
+
+
 class SwitchSyncResponse(BaseModel):
     message: str
     synced_devices: list[str]
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import base64
+import hashlib
+import hmac
+import json
 import os
 import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from typing import Optional
 
-from cryptography.fernet import Fernet
-from fastapi import HTTPException, Security
-from fastapi.security import APIKeyHeader
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from fastapi import Depends, HTTPException, Security
+from fastapi.security import APIKeyHeader, HTTPAuthorizationCredentials, HTTPBearer
 from passlib.context import CryptContext
 
 # --- PIN Hashing (bcrypt) ---
@@ -19,6 +27,11 @@ def hash_pin(pin: Optional[str]) -> Optional[str]:
     return pwd_context.hash(pin)
 
 
+def is_legacy_pin(stored_pin: Optional[str]) -> bool:
+    """True for a plain-text PIN stored before bcrypt was introduced."""
+    return bool(stored_pin) and pwd_context.identify(stored_pin, required=False) is None
+
+
 def verify_pin(plain_pin: Optional[str], hashed_pin: Optional[str]) -> bool:
     """Verify a PIN against its stored hash.
 
@@ -44,7 +57,17 @@ if not ENCRYPTION_KEY:
         "以下のコマンドで生成してください:\n"
         '  python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"'
     )
-fernet = Fernet(ENCRYPTION_KEY.encode())
+# Previous keys (comma-separated), still accepted for decryption while
+# `python -m backend.key_rotation` re-encrypts stored tokens with ENCRYPTION_KEY
+ENCRYPTION_OLD_KEYS = [
+    key.strip()
+    for key in os.getenv("ENCRYPTION_OLD_KEYS", "").split(",")
+    if key.strip()
+]
+primary_fernet = Fernet(ENCRYPTION_KEY.encode())
+fernet = MultiFernet(
+    [primary_fernet] + [Fernet(key.encode()) for key in ENCRYPTION_OLD_KEYS]
+)
 
 
 def encrypt_token(token: str) -> str:
@@ -59,6 +82,88 @@ def decrypt_token(encrypted_token: str) -> str:
     return fernet.decrypt(encrypted_token.encode()).decode()
 
 
+def needs_rotation(encrypted_token: str) -> bool:
+    """True if the token is not encrypted with the current ENCRYPTION_KEY."""
+    try:
+        primary_fernet.decrypt(encrypted_token.encode())
+        return False
+    except InvalidToken:
+        return True
+
+
+def rotate_token(encrypted_token: str) -> str:
+    """Re-encrypt with ENCRYPTION_KEY (raises InvalidToken for unknown keys)."""
+    return fernet.rotate(encrypted_token.encode()).decode()
+
+
+# Decrypted Nintendo session tokens, keyed by a hash of the ciphertext
+DECRYPTED_TOKEN_CACHE_SIZE = int(os.getenv("DECRYPTED_TOKEN_CACHE_SIZE", "1024"))
+DECRYPTED_TOKEN_CACHE_TTL = float(os.getenv("DECRYPTED_TOKEN_CACHE_TTL", "300"))
+
+
+class DecryptedTokenCache:
+    """Bounded LRU/TTL cache of decrypted tokens.
+
+    Plaintexts are held in ``bytearray`` buffers that are overwritten with
+    zeros when evicted or expired (the ``str`` copies handed to callers are
+    ordinary Python strings and cannot be wiped).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DECRYPTED_TOKEN_CACHE_SIZE,
+        ttl: float = DECRYPTED_TOKEN_CACHE_TTL,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, bytearray]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def decrypt(self, encrypted_token: str) -> str:
+        if not encrypted_token:
+            return None
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return decrypt_token(encrypted_token)
+        key = hashlib.sha256(encrypted_token.encode()).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1].decode()
+                self._evict(key)
+        token = decrypt_token(encrypted_token)
+        with self._lock:
+            self._evict(key)
+            self._entries[key] = (now + self.ttl, bytearray(token.encode()))
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+        return token
+
+    def forget(self, encrypted_token: str | None):
+        if encrypted_token:
+            with self._lock:
+                self._evict(hashlib.sha256(encrypted_token.encode()).hexdigest())
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+
+    def _evict(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            buffer = entry[1]
+            buffer[:] = bytes(len(buffer))
+
+
+token_cache = DecryptedTokenCache()
+
+
 # --- API Key Authentication ---
 BACKEND_API_KEY = os.getenv("BACKEND_API_KEY")
 _api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
@@ -70,3 +175,98 @@ def require_api_key(api_key: str = Security(_api_key_header)) -> str:
     if not api_key or not secrets.compare_digest(api_key, BACKEND_API_KEY):
         raise HTTPException(status_code=401, detail="Invalid or missing API key")
     return api_key
+
+
+# --- Session Tokens (HMAC-signed) ---
+# Issued at login; "<base64url payload>.<base64url HMAC-SHA256>" carrying the
+# user ID, role and family (parent) ID. Verified without touching the DB.
+SESSION_TOKEN_TTL = int(os.getenv("SESSION_TOKEN_TTL", "43200"))
+# Defaults to a key derived from ENCRYPTION_KEY so no extra secret is required
+SESSION_TOKEN_SECRET = (
+    os.getenv("SESSION_TOKEN_SECRET", "").encode()
+    or hmac.new(ENCRYPTION_KEY.encode(), b"s2a-session-token", hashlib.sha256).digest()
+)
+
+
+@dataclass(frozen=True)
+class SessionClaims:
+    user_id: int
+    role: str
+    family_id: Optional[int]
+    expires_at: int
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SESSION_TOKEN_SECRET, payload.encode(), hashlib.sha256)
+    return _b64encode(digest.digest())
+
+
+def issue_session_token(
+    user_id: int,
+    role: str,
+    family_id: Optional[int],
+    ttl: int = SESSION_TOKEN_TTL,
+) -> tuple[str, int]:
+    """Returns ``(token, expires_at)`` (expiry as a Unix timestamp)."""
+    expires_at = int(time.time()) + ttl
+    payload = _b64encode(
+        json.dumps(
+            {"uid": user_id, "role": role, "fam": family_id, "exp": expires_at},
+            separators=(",", ":"),
+        ).encode()
+    )
+    return f"{payload}.{_sign(payload)}", expires_at
+
+
+def verify_session_token(token: str) -> Optional[SessionClaims]:
+    """Claims of a valid, unexpired token; None otherwise (constant-time check)."""
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        data = json.loads(_b64decode(payload))
+        claims = SessionClaims(
+            user_id=int(data["uid"]),
+            role=str(data["role"]),
+            family_id=None if data.get("fam") is None else int(data["fam"]),
+            expires_at=int(data["exp"]),
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+    if claims.expires_at <= time.time():
+        return None
+    return claims
+
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+def optional_session(
+    credentials: Optional[HTTPAuthorizationCredentials] = Security(_bearer),
+) -> Optional[SessionClaims]:
+    """Claims from ``Authorization: Bearer <session token>``; None without one."""
+    if credentials is None:
+        return None
+    claims = verify_session_token(credentials.credentials)
+    if claims is None:
+        raise HTTPException(
+            status_code=401,
+            detail="セッションが無効か期限切れです。再度ログインしてください。",
+        )
+    return claims
+
+
+def require_session(
+    claims: Optional[SessionClaims] = Depends(optional_session),
+) -> SessionClaims:
+    if claims is None:
+        raise HTTPException(status_code=401, detail="ログインが必要です")
+    return claims
@@ -1,7 +1,41 @@
+"""Seed data for local development, CI and benchmarks.
+
+``python backend/seed.py`` (or :func:`seed`) creates one parent, one child and
+the default reward rules when the database is empty.
+
+``python -m backend.seed --families 10000 --days 365`` generates a large
+synthetic dataset on top of whatever is already there: parents (a share of
+them Switch-linked), children, wallets, daily plans and tasks in every status,
+approvals, reward grants and activity logs. Rows are built in memory per chunk
+of families and written with bulk ``INSERT … VALUES`` executemany, so a
+million-row dataset loads in minutes. Output is deterministic for a given
+``--seed`` and ``--anchor-date`` (the last day of history, default today;
+apart from bcrypt salts and Fernet IVs).
+"""
+
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, insert, select, text
+
 from backend.database import Base, SessionLocal, engine
-from backend.models import ActivityWallet, User, UserRole
+from backend.models import (
+    ActivityLog,
+    ActivityType,
+    ActivityWallet,
+    RewardLog,
+    RewardRule,
+    StudyPlan,
+    StudyTask,
+    TaskStatus,
+    TriggerType,
+    User,
+    UserRole,
+)
 from backend.routers.rules import seed_default_rules
-from backend.security import hash_pin
+from backend.security import encrypt_token, hash_pin
 
 
 def seed():
@@ -50,5 +84,344 @@ def seed():
         db.close()
 
 
+# --- Synthetic data generator ---
+
+SUBJECTS = ["算数", "国語", "理科", "社会", "英語", "漢字ドリル", "計算ドリル", "音読"]
+TASK_MINUTES = [10, 15, 20, 30, 45, 60]
+# bcrypt is deliberately slow; hash a small pool once and reuse it.
+PIN_POOL_SIZE = 16
+FAMILY_CHUNK = 500
+INSERT_BATCH = 5000
+
+_INSERT_ORDER = (User, ActivityWallet, StudyPlan, StudyTask, RewardLog, ActivityLog)
+
+
+class _IdAllocator:
+    """Hands out primary keys after the current max id of each table."""
+
+    def __init__(self, conn):
+        self._next = {
+            model: (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+            for model in _INSERT_ORDER
+        }
+
+    def __call__(self, model) -> int:
+        value = self._next[model]
+        self._next[model] = value + 1
+        return value
+
+
+def _ensure_rules(conn) -> dict:
+    """Return active default rules by trigger type, creating them if needed."""
+    rows = conn.execute(
+        select(RewardRule.id, RewardRule.trigger_type, RewardRule.reward_minutes).where(
+            RewardRule.is_active.is_(True)
+        )
+    ).all()
+    if not rows:
+        db = SessionLocal(bind=conn)
+        seed_default_rules(db)
+        db.flush()
+        return _ensure_rules(conn)
+    rules = {}
+    for rule_id, trigger_type, reward_minutes in rows:
+        rules.setdefault(TriggerType(trigger_type), (rule_id, reward_minutes))
+    return rules
+
+
+def _task_status(rng: random.Random, days_ago: int) -> TaskStatus:
+    roll = rng.random()
+    if days_ago == 0:
+        if roll < 0.35:
+            return TaskStatus.PENDING
+        if roll < 0.5:
+            return TaskStatus.IN_PROGRESS
+        if roll < 0.75:
+            return TaskStatus.COMPLETED
+        return TaskStatus.APPROVED
+    if roll < 0.78:
+        return TaskStatus.APPROVED
+    if roll < 0.82:
+        return TaskStatus.REJECTED
+    if roll < 0.88:
+        return TaskStatus.COMPLETED
+    return TaskStatus.PENDING
+
+
+def _generate_child_history(rng, rows, new_id, child_id, parent_id, today, days, rules):
+    """Plans, tasks, grants and consumption for one child. Returns the balance."""
+    balance = 0
+    streak = 0
+    for days_ago in range(days - 1, -1, -1):
+        day = today - timedelta(days=days_ago)
+        weekend = day.weekday() >= 5
+        if rng.random() > (0.5 if weekend else 0.85):
+            streak = 0
+            continue
+
+        plan_id = new_id(StudyPlan)
+        day_start = datetime.combine(day, datetime.min.time())
+        created = day_start + timedelta(hours=7, minutes=rng.randint(0, 59))
+        rows[StudyPlan].append(
+            {
+                "id": plan_id,
+                "child_id": child_id,
+                "plan_date": day,
+                "title": f"{day.month}/{day.day}の学習",
+                "created_at": created,
+            }
+        )
+
+        approved_minutes = 0
+        approved_tasks = 0
+        homework_total = 0
+        homework_approved = 0
+        clock = day_start + timedelta(hours=16, minutes=rng.randint(0, 90))
+        for _ in range(rng.randint(1, 4)):
+            estimated = rng.choice(TASK_MINUTES)
+            is_homework = rng.random() < 0.6
+            status = _task_status(rng, days_ago)
+            task = {
+                "id": new_id(StudyTask),
+                "plan_id": plan_id,
+                "subject": rng.choice(SUBJECTS),
+                "description": None,
+                "estimated_minutes": estimated,
+                "actual_minutes": None,
+                "is_homework": is_homework,
+                "status": status,
+                "started_at": None,
+                "completed_at": None,
+                "approved_at": None,
+                "approved_by": None,
+                "created_at": created,
+            }
+            homework_total += is_homework
+            if status != TaskStatus.PENDING:
+                task["started_at"] = clock
+            if status in (
+                TaskStatus.COMPLETED,
+                TaskStatus.APPROVED,
+                TaskStatus.REJECTED,
+            ):
+                actual = max(5, round(estimated * rng.gauss(1.0, 0.25)))
+                task["actual_minutes"] = actual
+                clock += timedelta(minutes=actual)
+                task["completed_at"] = clock
+            if status == TaskStatus.APPROVED:
+                task["approved_at"] = clock + timedelta(minutes=rng.randint(5, 180))
+                task["approved_by"] = parent_id
+                approved_tasks += 1
+                approved_minutes += task["actual_minutes"]
+                homework_approved += is_homework
+            clock += timedelta(minutes=rng.randint(0, 20))
+            rows[StudyTask].append(task)
+
+        streak = streak + 1 if approved_tasks else 0
+        granted = []
+        if approved_tasks and TriggerType.TASK_COMPLETED in rules:
+            granted.append(rules[TriggerType.TASK_COMPLETED])
+        if approved_minutes >= 60 and TriggerType.STUDY_TIME_REACHED in rules:
+            granted.append(rules[TriggerType.STUDY_TIME_REACHED])
+        if (
+            homework_total
+            and homework_total == homework_approved
+            and TriggerType.ALL_HOMEWORK_DONE in rules
+        ):
+            granted.append(rules[TriggerType.ALL_HOMEWORK_DONE])
+        if streak and streak % 7 == 0 and TriggerType.STREAK in rules:
+            granted.append(rules[TriggerType.STREAK])
+        for rule_id, minutes in granted:
+            rows[RewardLog].append(
+                {
+                    "id": new_id(RewardLog),
+                    "child_id": child_id,
+                    "rule_id": rule_id,
+                    "granted_minutes": minutes,
+                    "granted_date": day,
+                    "created_at": clock,
+                }
+            )
+            balance = min(balance + minutes, 120)
+
+        if balance and rng.random() < 0.6:
+            consumed = min(balance, rng.choice([15, 20, 30, 45, 60]))
+            balance -= consumed
+            rows[ActivityLog].append(
+                {
+                    "id": new_id(ActivityLog),
+                    "child_id": child_id,
+                    "activity_type": rng.choice(
+                        [ActivityType.SWITCH] * 3 + [ActivityType.TABLET]
+                    ),
+                    "description": None,
+                    "consumed_minutes": consumed,
+                    "source": "consumption",
+                    "created_at": day_start
+                    + timedelta(hours=19, minutes=rng.randint(0, 120)),
+                }
+            )
+    return balance
+
+
+def _flush_rows(conn, rows: dict) -> int:
+    written = 0
+    for model in _INSERT_ORDER:
+        batch = rows[model]
+        for start in range(0, len(batch), INSERT_BATCH):
+            conn.execute(insert(model), batch[start : start + INSERT_BATCH])
+        written += len(batch)
+        batch.clear()
+    return written
+
+
+def _sync_sequences(conn):
+    """Move PostgreSQL serial sequences past the explicitly inserted ids."""
+    if conn.dialect.name != "postgresql":
+        return
+    for model in _INSERT_ORDER:
+        table = model.__tablename__
+        conn.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+            )
+        )
+
+
+def generate_synthetic(
+    families: int,
+    days: int = 30,
+    seed_value: int = 0,
+    linked_ratio: float = 0.3,
+    bind=None,
+    verbose: bool = True,
+    anchor_date: date | None = None,
+) -> int:
+    """Bulk-generate ``families`` families with ``days`` days of history.
+
+    Every date is derived from ``anchor_date`` (default today). Returns the
+    number of rows written.
+    """
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    rng = random.Random(seed_value)
+    today = anchor_date or date.today()
+    pins = [hash_pin(f"{rng.randrange(10000):04d}") for _ in range(PIN_POOL_SIZE)]
+    linked_token = encrypt_token("dummy_session_token_for_confirmation")
+
+    started = time.perf_counter()
+    total = 0
+    with bind.begin() as conn:
+        rules = _ensure_rules(conn)
+        new_id = _IdAllocator(conn)
+
+    for chunk_start in range(0, families, FAMILY_CHUNK):
+        rows = {model: [] for model in _INSERT_ORDER}
+        with bind.begin() as conn:
+            for family in range(chunk_start, min(families, chunk_start + FAMILY_CHUNK)):
+                parent_id = new_id(User)
+                rows[User].append(
+                    {
+                        "id": parent_id,
+                        "name": f"保護者{family + 1}",
+                        "email": None,
+                        "role": UserRole.PARENT,
+                        "pin": rng.choice(pins),
+                        "nintendo_session_token": (
+                            linked_token if rng.random() < linked_ratio else None
+                        ),
+                        "parent_id": None,
+                        "age": None,
+                        "daily_game_limit_minutes": None,
+                        "line_notify_token": None,
+                        "created_at": datetime.combine(
+                            today - timedelta(days=days), datetime.min.time()
+                        ),
+                    }
+                )
+                n_children = rng.choices([1, 2, 3], weights=[55, 35, 10])[0]
+                for c in range(n_children):
+                    child_id = new_id(User)
+                    rows[User].append(
+                        {
+                            "id": child_id,
+                            "name": f"子ども{family + 1}-{c + 1}",
+                            "email": None,
+                            "role": UserRole.CHILD,
+                            "pin": rng.choice(pins),
+                            "nintendo_session_token": None,
+                            "parent_id": parent_id,
+                            "age": rng.randint(6, 12),
+                            "daily_game_limit_minutes": rng.choice([30, 60, 90, 120]),
+                            "line_notify_token": None,
+                            "created_at": datetime.combine(
+                                today - timedelta(days=days), datetime.min.time()
+                            ),
+                        }
+                    )
+                    balance = _generate_child_history(
+                        rng, rows, new_id, child_id, parent_id, today, days, rules
+                    )
+                    rows[ActivityWallet].append(
+                        {
+                            "id": new_id(ActivityWallet),
+                            "child_id": child_id,
+                            "balance_minutes": balance,
+                            "daily_limit_minutes": 120,
+                            "carry_over": rng.random() < 0.2,
+                            "updated_at": datetime.combine(today, datetime.min.time()),
+                        }
+                    )
+            total += _flush_rows(conn, rows)
+        if verbose:
+            done = min(families, chunk_start + FAMILY_CHUNK)
+            print(
+                f"{done}/{families} families, {total} rows "
+                f"({time.perf_counter() - started:.1f}s)"
+            )
+
+    with bind.begin() as conn:
+        _sync_sequences(conn)
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="S2A seed / synthetic data")
+    parser.add_argument(
+        "--families",
+        type=int,
+        default=0,
+        help="generate this many synthetic families (0: minimal dev seed)",
+    )
+    parser.add_argument("--days", type=int, default=30, help="days of history")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument(
+        "--linked-ratio",
+        type=float,
+        default=0.3,
+        help="share of parents linked to the mock Switch account",
+    )
+    parser.add_argument(
+        "--anchor-date",
+        type=date.fromisoformat,
+        default=None,
+        help="last day of generated history, YYYY-MM-DD (default: today)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.families <= 0:
+        seed()
+        return
+    total = generate_synthetic(
+        args.families,
+        args.days,
+        args.seed,
+        linked_ratio=args.linked_ratio,
+        anchor_date=args.anchor_date,
+    )
+    print(f"Synthetic data created: {total} rows")
+
+
 if __name__ == "__main__":
-    seed()
+    main()
@@ -2,10 +2,13 @@
 Service layer for dashboard-related logic.
 """
 
-from datetime import date
+import os
+from datetime import date, datetime, time, timedelta
 
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
 
+from backend.compression import PrecompressedCache
 from backend.models import (
     ActivityLog,
     ActivityWallet,
@@ -18,21 +21,52 @@ from backend.models import (
     UserRole,
 )
 
+# Serialized dashboard payloads (and their gzip/brotli variants). Entries are
+# dropped on any commit in this process that writes to a table the dashboards
+# read; DASHBOARD_CACHE_TTL bounds staleness across workers. Set it to 0 to
+# disable caching.
+payload_cache = PrecompressedCache(
+    ttl=float(os.getenv("DASHBOARD_CACHE_TTL", "5")),
+    tables=[
+        model.__tablename__
+        for model in (
+            ActivityLog,
+            ActivityWallet,
+            RewardLog,
+            RewardRule,
+            StudyPlan,
+            StudyTask,
+            User,
+        )
+    ],
+)
+
+
+def _day_bounds(day: date) -> tuple[datetime, datetime]:
+    """Naive [start, end) datetimes for a calendar day (matches created_at)."""
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
 
 def get_child_dashboard_data(db: Session, child_id: int):
     """
     Get all data required for the child's dashboard.
     """
     user = (
-        db.query(User).filter(User.id == child_id, User.role == UserRole.CHILD).first()
+        db.query(User)
+        .options(joinedload(User.wallet))
+        .filter(User.id == child_id, User.role == UserRole.CHILD)
+        .first()
     )
     if not user:
         return None
 
     today = date.today()
+    day_start, day_end = _day_bounds(today)
 
     today_plan = (
         db.query(StudyPlan)
+        .options(selectinload(StudyPlan.tasks))
         .filter(
             StudyPlan.child_id == child_id,
             StudyPlan.plan_date == today,
@@ -40,33 +74,28 @@ def get_child_dashboard_data(db: Session, child_id: int):
         .first()
     )
 
-    wallet = (
-        db.query(ActivityWallet).filter(ActivityWallet.child_id == child_id).first()
-    )
+    wallet = user.wallet
     balance = wallet.balance_minutes if wallet else 0
     daily_limit = wallet.daily_limit_minutes if wallet else 120
 
-    reward_logs = (
-        db.query(RewardLog)
+    today_earned = (
+        db.query(func.coalesce(func.sum(RewardLog.granted_minutes), 0))
         .filter(
             RewardLog.child_id == child_id,
             RewardLog.granted_date == today,
         )
-        .all()
+        .scalar()
     )
-    today_earned = sum(r.granted_minutes for r in reward_logs)
 
-    activity_logs = (
-        db.query(ActivityLog)
+    today_consumed = (
+        db.query(func.coalesce(func.sum(ActivityLog.consumed_minutes), 0))
         .filter(
             ActivityLog.child_id == child_id,
+            ActivityLog.created_at >= day_start,
+            ActivityLog.created_at < day_end,
         )
-        .all()
+        .scalar()
     )
-    today_consumed = 0
-    for log in activity_logs:
-        if log.created_at and log.created_at.date() == today:
-            today_consumed += log.consumed_minutes
 
     tasks_today = []
     if today_plan:
@@ -93,37 +122,56 @@ def get_child_dashboard_data(db: Session, child_id: int):
     }
 
 
-def get_child_game_time_summary(db: Session, child: User) -> dict:
-    """Get game time summary for a single child."""
+def get_game_time_summaries(db: Session, children: list[User]) -> list[dict]:
+    """Get game time summaries for several children in a constant number of queries."""
+    if not children:
+        return []
+
     today = date.today()
+    day_start, day_end = _day_bounds(today)
+    child_ids = [child.id for child in children]
 
-    wallet = (
-        db.query(ActivityWallet).filter(ActivityWallet.child_id == child.id).first()
+    wallets = {
+        w.child_id: w
+        for w in db.query(ActivityWallet)
+        .filter(ActivityWallet.child_id.in_(child_ids))
+        .all()
+    }
+    earned = dict(
+        db.query(RewardLog.child_id, func.sum(RewardLog.granted_minutes))
+        .filter(RewardLog.child_id.in_(child_ids), RewardLog.granted_date == today)
+        .group_by(RewardLog.child_id)
+        .all()
     )
-    balance = wallet.balance_minutes if wallet else 0
-    daily_limit = wallet.daily_limit_minutes if wallet else 120
-
-    reward_logs = (
-        db.query(RewardLog)
-        .filter(RewardLog.child_id == child.id, RewardLog.granted_date == today)
+    consumed = dict(
+        db.query(ActivityLog.child_id, func.sum(ActivityLog.consumed_minutes))
+        .filter(
+            ActivityLog.child_id.in_(child_ids),
+            ActivityLog.created_at >= day_start,
+            ActivityLog.created_at < day_end,
+        )
+        .group_by(ActivityLog.child_id)
         .all()
     )
-    today_earned = sum(r.granted_minutes for r in reward_logs)
 
-    activity_logs = db.query(ActivityLog).filter(ActivityLog.child_id == child.id).all()
-    today_consumed = sum(
-        log.consumed_minutes
-        for log in activity_logs
-        if log.created_at and log.created_at.date() == today
-    )
+    summaries = []
+    for child in children:
+        wallet = wallets.get(child.id)
+        summaries.append(
+            {
+                "child": child,
+                "daily_game_limit": wallet.daily_limit_minutes if wallet else 120,
+                "today_earned": earned.get(child.id) or 0,
+                "today_consumed": consumed.get(child.id) or 0,
+                "wallet_balance": wallet.balance_minutes if wallet else 0,
+            }
+        )
+    return summaries
 
-    return {
-        "child": child,
-        "daily_game_limit": daily_limit,
-        "today_earned": today_earned,
-        "today_consumed": today_consumed,
-        "wallet_balance": balance,
-    }
+
+def get_child_game_time_summary(db: Session, child: User) -> dict:
+    """Get game time summary for a single child."""
+    return get_game_time_summaries(db, [child])[0]
 
 
 def get_parent_dashboard_data(db: Session):
@@ -144,6 +192,7 @@ def get_parent_dashboard_data(db: Session):
 
     today_plans = (
         db.query(StudyPlan)
+        .options(selectinload(StudyPlan.tasks))
         .filter(
             StudyPlan.plan_date == today,
         )
@@ -152,7 +201,7 @@ def get_parent_dashboard_data(db: Session):
 
     active_rules = db.query(RewardRule).filter(RewardRule.is_active).all()
 
-    game_time_summaries = [get_child_game_time_summary(db, child) for child in children]
+    game_time_summaries = get_game_time_summaries(db, children)
 
     return {
         "children": children,
@@ -1,15 +1,46 @@
-"""LINE Notify integration for sending notifications to parents."""
+"""LINE Notify integration for sending notifications to parents.
 
+Request handlers only enqueue messages (:meth:`LineNotifier.enqueue`, safe
+from the threadpool); ``LINE_NOTIFY_CONCURRENCY`` worker coroutines deliver
+them over the shared ``httpx.AsyncClient`` (see backend/http_clients.py), at
+most ``LINE_NOTIFY_PER_TOKEN`` at a time per LINE token. A slow LINE endpoint
+therefore holds neither request threads nor more than a fixed number of
+connections. The queue is bounded (``LINE_NOTIFY_QUEUE_LIMIT``); messages
+beyond it are dropped and counted.
+
+Approval requests and game-timeout notices are digested per LINE token (i.e.
+per parent): the first one opens a ``LINE_NOTIFY_DIGEST_WINDOW``-second
+window, everything of the same kind arriving within it is merged into one
+message, and a digest reaching ``LINE_NOTIFY_DIGEST_MAX`` items is sent
+right away. A window of 0 sends every notification on its own.
+"""
+
+import asyncio
 import logging
+import os
+from dataclasses import dataclass, field
 
-import httpx
+from backend import http_clients, metrics
 
 logger = logging.getLogger(__name__)
 
 LINE_NOTIFY_API = "https://notify-api.line.me/api/notify"
 
+LINE_NOTIFY_CONCURRENCY = int(os.getenv("LINE_NOTIFY_CONCURRENCY", "8"))
+LINE_NOTIFY_PER_TOKEN = int(os.getenv("LINE_NOTIFY_PER_TOKEN", "1"))
+LINE_NOTIFY_QUEUE_LIMIT = int(os.getenv("LINE_NOTIFY_QUEUE_LIMIT", "1000"))
+# Seconds to keep delivering queued messages on shutdown
+LINE_NOTIFY_DRAIN_TIMEOUT = float(os.getenv("LINE_NOTIFY_DRAIN_TIMEOUT", "5"))
+# Seconds a notification may wait to be merged with others of its kind
+LINE_NOTIFY_DIGEST_WINDOW = float(os.getenv("LINE_NOTIFY_DIGEST_WINDOW", "30"))
+LINE_NOTIFY_DIGEST_MAX = int(os.getenv("LINE_NOTIFY_DIGEST_MAX", "10"))
+
+APPROVAL_REQUEST = "approval_request"
+GAME_TIMEOUT = "game_timeout"
 
-def send_line_notify(token: str, message: str) -> bool:
+
+@metrics.instrument_outbound("line")
+async def send_line_notify(token: str, message: str) -> bool:
     """Send a LINE Notify message.
 
     Args:
@@ -24,11 +55,10 @@ def send_line_notify(token: str, message: str) -> bool:
         return False
 
     try:
-        response = httpx.post(
+        response = await http_clients.line_client().post(
             LINE_NOTIFY_API,
             headers={"Authorization": f"Bearer {token}"},
             data={"message": message},
-            timeout=10,
         )
         if response.status_code == 200:
             logger.info("LINE Notify sent successfully")
@@ -43,22 +73,207 @@ def send_line_notify(token: str, message: str) -> bool:
         return False
 
 
+def _approval_message(items: list[dict]) -> str:
+    if len(items) == 1:
+        item = items[0]
+        return (
+            f"\n📚 承認依頼が届きました！\n"
+            f"👦 {item['child_name']}\n"
+            f"📖 科目: {item['subject']}\n"
+            f"⏱ 学習時間: {item['minutes']}分\n"
+            f"S2Aアプリで承認してください。"
+        )
+    lines = [
+        f"👦 {item['child_name']} 📖 {item['subject']} ⏱ {item['minutes']}分"
+        for item in items
+    ]
+    return (
+        f"\n📚 承認依頼が{len(items)}件届きました！\n"
+        + "\n".join(lines)
+        + "\nS2Aアプリで承認してください。"
+    )
+
+
+def _game_timeout_message(items: list[dict]) -> str:
+    names = "、".join(dict.fromkeys(item["child_name"] for item in items))
+    return f"\n⏰ ゲーム時間終了のお知らせ\n👦 {names}のゲーム時間が終了しました。"
+
+
+DIGEST_RENDERERS = {
+    APPROVAL_REQUEST: _approval_message,
+    GAME_TIMEOUT: _game_timeout_message,
+}
+
+
+@dataclass
+class _Digest:
+    timer: asyncio.TimerHandle
+    items: list[dict] = field(default_factory=list)
+
+
+class LineNotifier:
+    """Bounded queue of LINE messages drained by a fixed pool of workers."""
+
+    def __init__(
+        self,
+        concurrency: int = LINE_NOTIFY_CONCURRENCY,
+        per_token: int = LINE_NOTIFY_PER_TOKEN,
+        queue_limit: int = LINE_NOTIFY_QUEUE_LIMIT,
+        digest_window: float = LINE_NOTIFY_DIGEST_WINDOW,
+        digest_max: int = LINE_NOTIFY_DIGEST_MAX,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.per_token = max(1, per_token)
+        self.queue_limit = max(1, queue_limit)
+        self.digest_window = digest_window
+        self.digest_max = max(1, digest_max)
+        self._queue: asyncio.Queue | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._workers: list[asyncio.Task] = []
+        # token -> [semaphore, users]; dropped once no message uses it
+        self._token_slots: dict[str, list] = {}
+        # (token, kind) -> notifications waiting for their digest window
+        self._digests: dict[tuple[str, str], _Digest] = {}
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._workers)
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_limit)
+        self._workers = [
+            self._loop.create_task(self._run()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self, drain_timeout: float = LINE_NOTIFY_DRAIN_TIMEOUT):
+        workers, self._workers = self._workers, []
+        if not workers:
+            return
+        for key in list(self._digests):
+            self._flush_digest(key)
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.pending} undelivered LINE message(s)")
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def enqueue(self, token: str, message: str) -> bool:
+        """Queue a message for delivery; safe to call from any thread.
+
+        Returns False (and counts a drop) when the notifier is not running or
+        the queue is full.
+        """
+        if not self._accepting():
+            return False
+        if self._queue.full():
+            metrics.LINE_NOTIFY_DROPPED.inc(reason="queue_full")
+            return False
+        return self._call_in_loop(self._put, token, message)
+
+    def enqueue_digest(self, token: str, kind: str, item: dict) -> bool:
+        """Add ``item`` to ``token``'s pending ``kind`` digest; thread-safe.
+
+        ``kind`` is a key of :data:`DIGEST_RENDERERS`, which turns the merged
+        items into the message text.
+        """
+        if self.digest_window <= 0:
+            return self.enqueue(token, DIGEST_RENDERERS[kind]([item]))
+        if not self._accepting():
+            return False
+        return self._call_in_loop(self._add_to_digest, token, kind, item)
+
+    def _accepting(self) -> bool:
+        loop = self._loop
+        if not self.running or loop is None or loop.is_closed():
+            logger.warning("LINE notifier is not running; message dropped")
+            metrics.LINE_NOTIFY_DROPPED.inc(reason="not_running")
+            return False
+        return True
+
+    def _call_in_loop(self, func, *args) -> bool:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            return func(*args)
+        self._loop.call_soon_threadsafe(func, *args)
+        return True
+
+    def _add_to_digest(self, token: str, kind: str, item: dict) -> bool:
+        key = (token, kind)
+        digest = self._digests.get(key)
+        if digest is None:
+            timer = self._loop.call_later(self.digest_window, self._flush_digest, key)
+            digest = self._digests[key] = _Digest(timer)
+        digest.items.append(item)
+        if len(digest.items) >= self.digest_max:
+            self._flush_digest(key)
+        return True
+
+    def _flush_digest(self, key: tuple[str, str]):
+        digest = self._digests.pop(key, None)
+        if digest is None:
+            return
+        digest.timer.cancel()
+        token, kind = key
+        if len(digest.items) > 1:
+            metrics.LINE_NOTIFY_COALESCED.inc(len(digest.items) - 1, kind=kind)
+        self._put(token, DIGEST_RENDERERS[kind](digest.items))
+
+    def _put(self, token: str, message: str) -> bool:
+        try:
+            self._queue.put_nowait((token, message))
+        except asyncio.QueueFull:
+            metrics.LINE_NOTIFY_DROPPED.inc(reason="queue_full")
+            return False
+        return True
+
+    async def _run(self):
+        while True:
+            token, message = await self._queue.get()
+            try:
+                await self._deliver(token, message)
+            except Exception:
+                logger.exception("LINE notification delivery failed")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, token: str, message: str):
+        slot = self._token_slots.get(token)
+        if slot is None:
+            slot = self._token_slots[token] = [asyncio.Semaphore(self.per_token), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                await send_line_notify(token, message)
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._token_slots[token]
+
+
+line_notifier = LineNotifier()
+
+
 def notify_approval_request(token: str, child_name: str, subject: str, minutes: int):
     """Notify parent that a child has submitted a task for approval."""
-    message = (
-        f"\n📚 承認依頼が届きました！\n"
-        f"👦 {child_name}\n"
-        f"📖 科目: {subject}\n"
-        f"⏱ 学習時間: {minutes}分\n"
-        f"S2Aアプリで承認してください。"
+    return line_notifier.enqueue_digest(
+        token,
+        APPROVAL_REQUEST,
+        {"child_name": child_name, "subject": subject, "minutes": minutes},
     )
-    return send_line_notify(token, message)
 
 
 def notify_game_timeout(token: str, child_name: str):
     """Notify parent that a child's game time has expired."""
-    message = (
-        f"\n⏰ ゲーム時間終了のお知らせ\n"
-        f"👦 {child_name}のゲーム時間が終了しました。"
-    )
-    return send_line_notify(token, message)
+    return line_notifier.enqueue_digest(token, GAME_TIMEOUT, {"child_name": child_name})
@@ -0,0 +1,178 @@
+"""Slow query log with automatic plan capture.
+
+Statements slower than ``SLOW_QUERY_MS`` (default 200 ms, 0 disables) are
+logged with the shape of their bound parameters (types only, never values)
+and the request that issued them. The query plan — ``EXPLAIN`` on PostgreSQL,
+``EXPLAIN QUERY PLAN`` on SQLite — is captured on a separate connection by a
+single background thread, so the request that hit the slow statement never
+waits for it.
+
+The most recent ``SLOW_QUERY_BUFFER`` records are kept in memory and served by
+``GET /api/debug/slow-queries``.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from backend.query_stats import current_stats
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "100"))
+
+_EXPLAINABLE = ("select", "insert", "update", "delete", "with")
+_STATEMENT_MAX_CHARS = 2000
+
+UTC = timezone.utc
+
+
+@dataclass
+class SlowQuery:
+    statement: str
+    duration_ms: float
+    parameter_shape: object
+    route: str | None
+    captured_at: str
+    executemany: bool = False
+    plan: list[str] | None = None
+    plan_error: str | None = None
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            f.name: getattr(self, f.name) for f in fields(self) if f.name != "_done"
+        }
+
+    def wait_for_plan(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+
+_records: deque[SlowQuery] = deque(maxlen=SLOW_QUERY_BUFFER)
+_records_lock = threading.Lock()
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="s2a-explain")
+# Set on the explain thread so its own EXPLAIN statements are never recorded.
+_explain_local = threading.local()
+
+
+def parameter_shape(parameters, executemany: bool = False):
+    """Describe bound parameters by type only (values may be personal data)."""
+    if executemany:
+        rows = list(parameters or [])
+        return {"rows": len(rows), "row": parameter_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def recent_slow_queries() -> list[dict]:
+    """Newest first."""
+    with _records_lock:
+        records = list(_records)
+    return [r.to_dict() for r in reversed(records)]
+
+
+def clear():
+    with _records_lock:
+        _records.clear()
+
+
+def _explain_prefix(dialect_name: str) -> str | None:
+    if dialect_name == "sqlite":
+        return "EXPLAIN QUERY PLAN "
+    if dialect_name == "postgresql":
+        return "EXPLAIN "
+    return None
+
+
+def _capture_plan(engine: Engine, record: SlowQuery, statement: str, parameters):
+    try:
+        prefix = _explain_prefix(engine.dialect.name)
+        if prefix is None:
+            record.plan_error = f"EXPLAIN not supported for {engine.dialect.name}"
+            return
+        _explain_local.active = True
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+        record.plan = [
+            " | ".join(str(col) for col in row) if len(row) > 1 else str(row[0])
+            for row in rows
+        ]
+        logger.info(
+            "Plan for slow query (%.1f ms, %s):\n%s",
+            record.duration_ms,
+            record.route,
+            "\n".join(record.plan),
+        )
+    except Exception as exc:
+        record.plan_error = str(exc)
+        logger.debug("Failed to capture plan for slow query: %s", exc)
+    finally:
+        _explain_local.active = False
+        record._done.set()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("s2a_slow_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("s2a_slow_start")
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    if SLOW_QUERY_MS <= 0 or elapsed_ms < SLOW_QUERY_MS:
+        return
+    if getattr(_explain_local, "active", False):
+        return
+    record_slow_query(conn.engine, statement, parameters, elapsed_ms, executemany)
+
+
+def record_slow_query(
+    engine: Engine,
+    statement: str,
+    parameters,
+    duration_ms: float,
+    executemany: bool = False,
+) -> SlowQuery:
+    stats = current_stats()
+    route = f"{stats.method} {stats.label}" if stats else None
+    record = SlowQuery(
+        statement=statement[:_STATEMENT_MAX_CHARS],
+        duration_ms=round(duration_ms, 2),
+        parameter_shape=parameter_shape(parameters, executemany),
+        route=route,
+        captured_at=datetime.now(UTC).isoformat(),
+        executemany=executemany,
+    )
+    with _records_lock:
+        _records.append(record)
+
+    logger.warning(
+        "Slow query (%.1f ms) from %s: %s params=%s",
+        duration_ms,
+        route or "<no request>",
+        " ".join(statement.split())[:500],
+        record.parameter_shape,
+    )
+
+    if not executemany and statement.lstrip().lower().startswith(_EXPLAINABLE):
+        _explain_executor.submit(_capture_plan, engine, record, statement, parameters)
+    else:
+        record._done.set()
+    return record
@@ -1,17 +1,65 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import logging
 import os
 import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from urllib.parse import parse_qs, urlparse
 
-import aiohttp
+from pynintendoauth.exceptions import InvalidSessionTokenException
 from pynintendoparental import Authenticator, NintendoParental
 
+from backend import http_clients, metrics
+from backend.circuit_breaker import CircuitBreaker
+from backend.pending_auth import (
+    SWITCH_AUTH_WAIT_RECHECK,
+    PendingAuthListener,
+    PendingAuthSweeper,
+    PendingAuthWaiters,
+    create_store,
+)
+
 logger = logging.getLogger(__name__)
 
-# Pending auth sessions TTL (seconds)
-_PENDING_TTL = 600  # 10 minutes
+# Authenticated NintendoParental clients are reused per session token.
+NINTENDO_CLIENT_CACHE_SIZE = int(os.getenv("NINTENDO_CLIENT_CACHE_SIZE", "128"))
+NINTENDO_CLIENT_TTL = float(os.getenv("NINTENDO_CLIENT_TTL", "3600"))
+# Refresh the access token this many seconds before it expires.
+NINTENDO_TOKEN_REFRESH_MARGIN = float(os.getenv("NINTENDO_TOKEN_REFRESH_MARGIN", "120"))
+
+# Device lists are fresh for SWITCH_DEVICE_CACHE_TTL seconds; after that a stale
+# list is still served (while refreshing in the background) for up to
+# SWITCH_DEVICE_CACHE_STALE seconds.
+SWITCH_DEVICE_CACHE_TTL = float(os.getenv("SWITCH_DEVICE_CACHE_TTL", "300"))
+SWITCH_DEVICE_CACHE_STALE = float(os.getenv("SWITCH_DEVICE_CACHE_STALE", "86400"))
+
+# Circuit breaker around Nintendo calls (see backend/circuit_breaker.py):
+# consecutive failures before opening, seconds before a half-open probe, and
+# concurrent probes. Each operation also gets a latency budget in seconds
+# (covering login, token refresh and retries of the underlying client).
+NINTENDO_BREAKER_FAILURES = int(os.getenv("NINTENDO_BREAKER_FAILURES", "5"))
+NINTENDO_BREAKER_RESET = float(os.getenv("NINTENDO_BREAKER_RESET", "30"))
+NINTENDO_BREAKER_PROBES = int(os.getenv("NINTENDO_BREAKER_PROBES", "1"))
+NINTENDO_LATENCY_BUDGETS = {
+    "get_devices": float(os.getenv("NINTENDO_BUDGET_GET_DEVICES", "10")),
+    "update_device_limit": float(os.getenv("NINTENDO_BUDGET_UPDATE_LIMIT", "10")),
+}
+
+# Rate budget (anything with ``async acquire()``, e.g. fleet_sync.TokenBucket)
+# charged for each outbound Nintendo call made in the current context. Set by
+# the fleet-wide push; interactive requests run without one.
+nintendo_call_budget: ContextVar = ContextVar("nintendo_call_budget", default=None)
+
+
+async def _spend_call_budget():
+    budget = nintendo_call_budget.get()
+    if budget is not None:
+        await budget.acquire()
 
 
 def _parse_kv_pairs(fragment: str) -> dict:
@@ -55,37 +103,251 @@ def _extract_session_token_code(input_str: str) -> str:
     return s
 
 
-class SwitchService:
-    def __init__(self):
-        # state -> {verifier, created_at, session_token (once complete)}
-        self._pending: dict[str, dict] = {}
-
-    def _cleanup_pending(self):
-        """Remove expired pending sessions."""
-        now = time.time()
-        self._pending = {
-            k: v
-            for k, v in self._pending.items()
-            if now - v["created_at"] < _PENDING_TTL
-        }
+def clamp_limit(limit_minutes: int) -> int:
+    """Clamp to Nintendo's allowed daily play-time range (0-360 minutes)."""
+    return max(0, min(limit_minutes, 360))
+
+
+def _token_key(session_token: str) -> str:
+    return hashlib.sha256(session_token.encode()).hexdigest()
+
+
+@dataclass
+class _CachedClient:
+    auth: Authenticator
+    api: NintendoParental
+    loop: asyncio.AbstractEventLoop
+    created_at: float = field(default_factory=time.monotonic)
+
+    def expired(self, now: float) -> bool:
+        return now - self.created_at > NINTENDO_CLIENT_TTL
+
+    def needs_refresh(self) -> bool:
+        expiry = self.auth._at_expiry
+        margin = timedelta(seconds=NINTENDO_TOKEN_REFRESH_MARGIN)
+        return expiry is None or expiry - datetime.now() < margin
+
+
+class NintendoClientCache:
+    """LRU/TTL cache of logged-in ``NintendoParental`` clients.
+
+    Keyed by the SHA-256 of the session token so raw tokens are never held as
+    dict keys. A hit skips the session-token → access-token handshake and the
+    initial device fetch; the access token is refreshed ahead of expiry.
+    Entries are evicted on TTL, LRU overflow or ``InvalidSessionTokenException``.
+    Clients use the shared HTTP session of the event loop that created them; a
+    different loop counts as a miss.
+    """
+
+    def __init__(self, max_entries: int = NINTENDO_CLIENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, _CachedClient] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, session_token: str) -> tuple[NintendoParental, bool]:
+        """Return ``(client, logged_in)``; ``logged_in`` is True on a cache miss."""
+        key = _token_key(session_token)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            loop = asyncio.get_running_loop()
+            if entry is not None and (
+                entry.loop is not loop or entry.expired(time.monotonic())
+            ):
+                await self._discard(key)
+                entry = None
+
+            logged_in = entry is None
+            if logged_in:
+                entry = await self._login(session_token, loop)
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    oldest = next(iter(self._entries))
+                    await self._discard(oldest)
+            elif entry.needs_refresh():
+                try:
+                    await _spend_call_budget()
+                    await entry.auth.async_complete_login(use_session_token=True)
+                except InvalidSessionTokenException:
+                    await self._discard(key)
+                    raise
+            self._entries.move_to_end(key)
+            return entry.api, logged_in
+
+    async def invalidate(self, session_token: str):
+        await self._discard(_token_key(session_token))
+
+    async def clear(self):
+        for key in list(self._entries):
+            await self._discard(key)
+
+    async def _login(self, session_token: str, loop) -> _CachedClient:
+        await _spend_call_budget()
+        auth = Authenticator(
+            session_token=session_token,
+            client_session=http_clients.nintendo_session(),
+        )
+        await auth.async_complete_login(use_session_token=True)
+        api = await NintendoParental.create(
+            auth,
+            timezone=os.getenv("SWITCH_TIMEZONE", "Asia/Tokyo"),
+            lang=os.getenv("SWITCH_LANG", "ja-JP"),
+        )
+        return _CachedClient(auth=auth, api=api, loop=loop)
+
+    async def _discard(self, key: str):
+        self._entries.pop(key, None)
+        lock = self._locks.get(key)
+        if lock is not None and not lock.locked():
+            del self._locks[key]
+
+
+@dataclass
+class _DeviceList:
+    devices: list[dict]
+    fetched_at: float = field(default_factory=time.monotonic)
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class DeviceListCache:
+    """Per-account device lists with TTL and stale-while-revalidate.
+
+    - fresh (younger than ``SWITCH_DEVICE_CACHE_TTL``): served from memory
+    - stale (younger than TTL + ``SWITCH_DEVICE_CACHE_STALE``): served from
+      memory while one background task refreshes it
+    - missing / too old: fetched inline; if that fetch fails, the last known
+      list is served instead so syncs keep working through an API slowdown
+    """
+
+    def __init__(self, fetch):
+        self._fetch = fetch
+        self._entries: dict[str, _DeviceList] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    async def get(self, session_token: str) -> list[dict]:
+        key = _token_key(session_token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = entry.age()
+            if age < SWITCH_DEVICE_CACHE_TTL:
+                return _copy_devices(entry.devices)
+            if age < SWITCH_DEVICE_CACHE_TTL + SWITCH_DEVICE_CACHE_STALE:
+                self._revalidate(key, session_token)
+                return _copy_devices(entry.devices)
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            current = self._entries.get(key)
+            if current is not None and current is not entry:
+                # Refreshed by a concurrent caller while we waited
+                return _copy_devices(current.devices)
+            try:
+                return _copy_devices(await self._refresh(key, session_token))
+            except InvalidSessionTokenException:
+                raise
+            except Exception as e:
+                if entry is None:
+                    raise
+                logger.warning(f"Serving last known Switch device list: {e!r}")
+                return _copy_devices(entry.devices)
+
+    def set_limit(self, session_token: str, device_id: str, limit: int):
+        """Reflect a successful limit update in the cached list."""
+        entry = self._entries.get(_token_key(session_token))
+        for device in entry.devices if entry else ():
+            if device["device_id"] == device_id:
+                device["current_limit"] = limit
+
+    def invalidate(self, session_token: str):
+        key = _token_key(session_token)
+        self._entries.pop(key, None)
+        task = self._refreshing.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def clear(self):
+        for task in self._refreshing.values():
+            task.cancel()
+        self._entries.clear()
+        self._refreshing.clear()
+
+    async def _refresh(self, key: str, session_token: str) -> list[dict]:
+        try:
+            devices = await self._fetch(session_token)
+        except InvalidSessionTokenException:
+            self._entries.pop(key, None)
+            raise
+        self._entries[key] = _DeviceList(devices=devices)
+        return devices
+
+    def _revalidate(self, key: str, session_token: str):
+        if key in self._refreshing:
+            return
+
+        async def run():
+            try:
+                await self._refresh(key, session_token)
+            except Exception as e:
+                logger.warning(f"Background Switch device refresh failed: {e!r}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.get_running_loop().create_task(run())
 
+
+def _copy_devices(devices: list[dict]) -> list[dict]:
+    return [dict(device) for device in devices]
+
+
+def _nintendo_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        "nintendo",
+        failure_threshold=NINTENDO_BREAKER_FAILURES,
+        reset_timeout=NINTENDO_BREAKER_RESET,
+        half_open_probes=NINTENDO_BREAKER_PROBES,
+        budgets=dict(NINTENDO_LATENCY_BUDGETS),
+        # A rejected session token is the user's problem, not an outage
+        ignore=(InvalidSessionTokenException,),
+    )
+
+
+class SwitchService:
+    def __init__(self, pending_auth=None, breaker: CircuitBreaker | None = None):
+        # Login state -> PKCE verifier (+ session token once complete); shared
+        # by all workers with the db store (see backend/pending_auth.py)
+        self.pending_auth = pending_auth if pending_auth is not None else create_store()
+        self.auth_waiters = PendingAuthWaiters()
+        self.breaker = breaker if breaker is not None else _nintendo_breaker()
+        self.clients = NintendoClientCache()
+        # While the circuit is open, fetches fail fast and the cache serves
+        # the last known list
+        self.device_lists = DeviceListCache(
+            lambda token: self.breaker.call("get_devices", self._fetch_devices(token))
+        )
+
+    def _pending_verifier(self, state: str | None) -> str | None:
+        pending = self.pending_auth.get(state) if state else None
+        if pending is None or pending.expired():
+            return None
+        return pending.verifier
+
+    @metrics.instrument_outbound("nintendo")
     async def get_auth_url(self):
         """Generate the URL for Nintendo Account login."""
-        self._cleanup_pending()
-
-        async with aiohttp.ClientSession() as session:
-            auth = Authenticator(client_session=session)
+        auth = Authenticator(client_session=http_clients.nintendo_session())
 
         # Extract state from the generated login URL for session tracking
         parsed = urlparse(auth.login_url)
         state = parse_qs(parsed.query).get("state", [None])[0]
 
         if state:
-            self._pending[state] = {
-                "verifier": auth._auth_code_verifier,
-                "created_at": time.time(),
-                "session_token": None,
-            }
+            self.pending_auth.put(state, auth._auth_code_verifier)
 
         return {
             "url": auth.login_url,
@@ -93,30 +355,29 @@ class SwitchService:
             "state": state,
         }
 
+    @metrics.instrument_outbound("nintendo")
     async def complete_login(
         self, response_url: str, verifier: str | None = None, state: str | None = None
     ):
         """Complete the login using the full redirect URL."""
-        verifier_to_use = verifier
-        if state and state in self._pending and not verifier_to_use:
-            verifier_to_use = self._pending[state]["verifier"]
+        verifier_to_use = verifier or self._pending_verifier(state)
 
         if not verifier_to_use:
             raise RuntimeError(
                 "認証セッションが見つかりません。認証開始からやり直してください。"
             )
 
-        async with aiohttp.ClientSession() as session:
-            auth = Authenticator(client_session=session)
-            auth._auth_code_verifier = verifier_to_use
-            await auth.async_complete_login(response_url)
-            session_token = auth.session_token
+        auth = Authenticator(client_session=http_clients.nintendo_session())
+        auth._auth_code_verifier = verifier_to_use
+        await auth.async_complete_login(response_url)
+        session_token = auth.session_token
 
-        if state and state in self._pending:
-            self._pending[state]["session_token"] = session_token
+        if state and self.pending_auth.complete(state, session_token):
+            self.auth_waiters.notify(state)
 
         return session_token
 
+    @metrics.instrument_outbound("nintendo")
     async def complete_login_with_code(
         self,
         session_token_code: str,
@@ -126,45 +387,95 @@ class SwitchService:
         """Complete the login using a session_token_code (accepts full URL, fragment, or raw code)."""
         code = _extract_session_token_code(session_token_code)
 
-        verifier_to_use = verifier
-        if state and state in self._pending and not verifier_to_use:
-            verifier_to_use = self._pending[state]["verifier"]
+        verifier_to_use = verifier or self._pending_verifier(state)
 
         if not verifier_to_use:
             raise RuntimeError(
                 "認証セッションが見つかりません。認証開始からやり直してください。"
             )
 
-        async with aiohttp.ClientSession() as session:
-            auth = Authenticator(client_session=session)
-            auth._auth_code_verifier = verifier_to_use
-            # Build the full redirect URL that async_complete_login expects
-            redirect_url = f"npf54789befb391a838://auth#session_token_code={code}&state={state or ''}"
-            await auth.async_complete_login(redirect_url)
-            session_token = auth.session_token
+        auth = Authenticator(client_session=http_clients.nintendo_session())
+        auth._auth_code_verifier = verifier_to_use
+        # Build the full redirect URL that async_complete_login expects
+        redirect_url = (
+            f"npf54789befb391a838://auth#session_token_code={code}&state={state or ''}"
+        )
+        await auth.async_complete_login(redirect_url)
+        session_token = auth.session_token
 
-        if state and state in self._pending:
-            self._pending[state]["session_token"] = session_token
+        if state and self.pending_auth.complete(state, session_token):
+            self.auth_waiters.notify(state)
 
         return session_token
 
     def get_auth_status(self, state: str) -> dict:
-        """Poll whether authentication for a given state is complete."""
-        if state not in self._pending:
-            return {"status": "unknown"}
-        pending = self._pending[state]
-        if pending.get("session_token"):
-            token = pending["session_token"]
-            del self._pending[state]
+        """Poll whether authentication for a given state is complete.
+
+        The session token is handed out once, whichever worker is polled.
+        """
+        token = self.pending_auth.take_token(state)
+        if token:
             return {"status": "complete", "session_token": token}
-        age = time.time() - pending["created_at"]
-        if age > _PENDING_TTL:
-            del self._pending[state]
+        pending = self.pending_auth.get(state)
+        if pending is None:
+            return {"status": "unknown"}
+        if pending.expired():
+            self.pending_auth.discard(state)
             return {"status": "expired"}
         return {"status": "pending"}
 
+    async def wait_auth_status(self, state: str, timeout: float) -> dict:
+        """Like :meth:`get_auth_status`, but wait up to ``timeout`` seconds
+        for the login to complete or expire instead of answering "pending".
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        pending = self.pending_auth.get(state)
+        if pending is not None:
+            # Wake up (just past) the TTL to report "expired"
+            expires_in = pending.expires_at - time.time() + 0.05
+            deadline = min(deadline, loop.time() + expires_in)
+        recheck = None
+        if self.pending_auth.shared and not self.auth_waiters.cross_worker:
+            recheck = SWITCH_AUTH_WAIT_RECHECK
+
+        with self.auth_waiters.watch(state) as changed:
+            while True:
+                changed.clear()
+                result = self.get_auth_status(state)
+                remaining = deadline - loop.time()
+                if result["status"] != "pending" or remaining <= 0:
+                    return result
+                try:
+                    await asyncio.wait_for(
+                        changed.wait(),
+                        remaining if recheck is None else min(remaining, recheck),
+                    )
+                except TimeoutError:
+                    pass
+
+    async def _call(self, session_token: str, awaitable):
+        """Await a call on a cached client, evicting it if the token is rejected."""
+        await _spend_call_budget()
+        try:
+            return await awaitable
+        except InvalidSessionTokenException:
+            await self.clients.invalidate(session_token)
+            raise
+
+    async def forget_token(self, session_token: str | None):
+        """Drop cached clients and device lists for a token being replaced."""
+        if not session_token:
+            return
+        self.device_lists.invalidate(session_token)
+        await self.clients.invalidate(session_token)
+
     async def get_devices(self, session_token: str):
-        """Get a list of devices associated with the account."""
+        """Get a list of devices associated with the account.
+
+        Served from the per-account device cache (see ``DeviceListCache``);
+        raises ``CircuitOpenError`` if the circuit is open and nothing is cached.
+        """
         if session_token == "dummy_session_token_for_confirmation":
             return [
                 {
@@ -173,57 +484,67 @@ class SwitchService:
                     "current_limit": 60,
                 }
             ]
-
-        async with aiohttp.ClientSession() as session:
-            auth = Authenticator(session_token=session_token, client_session=session)
-            await auth.async_complete_login(use_session_token=True)
-            api = await NintendoParental.create(
-                auth,
-                timezone=os.getenv("SWITCH_TIMEZONE", "Asia/Tokyo"),
-                lang=os.getenv("SWITCH_LANG", "ja-JP"),
+        return await self.device_lists.get(session_token)
+
+    @metrics.instrument_outbound("nintendo", "get_devices")
+    async def _fetch_devices(self, session_token: str):
+        api, logged_in = await self.clients.get(session_token)
+        if not logged_in:
+            # Cached client: re-fetch devices and their settings
+            await self._call(session_token, api.update())
+
+        devices = []
+        for device in api.devices.values():
+            devices.append(
+                {
+                    "device_id": device.device_id,
+                    "name": device.name,
+                    "current_limit": (
+                        device.limit_time if device.limit_time not in (-1, None) else 0
+                    ),
+                }
             )
-
-            devices = []
-            for device in api.devices.values():
-                devices.append(
-                    {
-                        "device_id": device.device_id,
-                        "name": device.name,
-                        "current_limit": device.limit_time
-                        if device.limit_time not in (-1, None)
-                        else 0,
-                    }
-                )
         return devices
 
     async def update_device_limit(
         self, session_token: str, device_id: str, limit_minutes: int
     ):
-        """Update the daily play time limit for a specific device."""
+        """Update the daily play time limit for a specific device.
+
+        Raises ``CircuitOpenError`` without calling Nintendo while the circuit
+        is open.
+        """
         if session_token == "dummy_session_token_for_confirmation":
             logger.info(
                 f"MOCK: Updated device {device_id} limit to {limit_minutes} min"
             )
             return True
 
-        # Clamp to Nintendo's allowed range (0-360 minutes)
-        clamped = max(0, min(limit_minutes, 360))
+        return await self.breaker.call(
+            "update_device_limit",
+            self._push_device_limit(session_token, device_id, limit_minutes),
+        )
 
-        async with aiohttp.ClientSession() as session:
-            auth = Authenticator(session_token=session_token, client_session=session)
-            await auth.async_complete_login(use_session_token=True)
-            api = await NintendoParental.create(
-                auth,
-                timezone=os.getenv("SWITCH_TIMEZONE", "Asia/Tokyo"),
-                lang=os.getenv("SWITCH_LANG", "ja-JP"),
-            )
+    @metrics.instrument_outbound("nintendo", "update_device_limit")
+    async def _push_device_limit(
+        self, session_token: str, device_id: str, limit_minutes: int
+    ):
+        clamped = clamp_limit(limit_minutes)
 
+        api, _ = await self.clients.get(session_token)
+        device = api.devices.get(device_id)
+        if device is None:
+            # Device may have been added since the client was cached
+            await self._call(session_token, api.update())
             device = api.devices.get(device_id)
-            if device is None:
-                return False
-            await device.update_max_daily_playtime(clamped)
+        if device is None:
+            return False
+        await self._call(session_token, device.update_max_daily_playtime(clamped))
+        self.device_lists.set_limit(session_token, device_id, clamped)
         return True
 
 
 # Global instance
 switch_service = SwitchService()
+pending_auth_sweeper = PendingAuthSweeper(lambda: switch_service.pending_auth)
+pending_auth_listener = PendingAuthListener(switch_service.auth_waiters)
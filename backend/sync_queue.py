@@ -0,0 +1,290 @@
+"""Durable Switch sync queue (outbox) and its in-process worker.
+
+Approvals call :func:`enqueue_switch_sync` inside the request. It upserts the
+child's single ``SwitchSyncJob`` row (one atomic ``INSERT … ON CONFLICT``, so
+concurrent approvals neither collide nor lose a version bump) and schedules
+it ``SWITCH_SYNC_DEBOUNCE`` seconds out, so bursts of approvals collapse into
+one push. The worker computes the limit when it pushes; ``desired_limit``
+only records what it was at enqueue time, for diagnostics.
+
+:class:`SwitchSyncWorker` runs on the application's event loop (started by the
+lifespan when ``SWITCH_SYNC_WORKER`` is on). It leases due jobs with a
+conditional UPDATE, pushes them with its own DB sessions and records the
+outcome:
+
+- success → ``done`` (unless a newer limit was enqueued meanwhile)
+- failure → retried with exponential backoff and jitter; while the Nintendo
+  circuit breaker is open the job is deferred until the next probe instead,
+  without counting an attempt
+- ``SWITCH_SYNC_MAX_ATTEMPTS`` failures or a rejected session token → ``dead``
+
+Jobs survive restarts; a lease left behind by a crashed worker expires after
+``SWITCH_SYNC_LEASE`` seconds. Queue depth and lag are exported via
+``/metrics``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from pynintendoauth.exceptions import InvalidSessionTokenException
+from sqlalchemy import case, func, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.database import SessionLocal
+from backend.models import SwitchSyncJob, SyncJobStatus
+from backend.switch_service import switch_service
+from backend.sync_utils import desired_switch_limit, sync_child
+
+logger = logging.getLogger(__name__)
+
+SWITCH_SYNC_WORKER = os.getenv("SWITCH_SYNC_WORKER", "1") == "1"
+# Sync requests for the same child within this window collapse into one push.
+SWITCH_SYNC_DEBOUNCE = float(os.getenv("SWITCH_SYNC_DEBOUNCE", "2"))
+SWITCH_SYNC_POLL_INTERVAL = float(os.getenv("SWITCH_SYNC_POLL_INTERVAL", "1"))
+SWITCH_SYNC_BATCH = int(os.getenv("SWITCH_SYNC_BATCH", "20"))
+SWITCH_SYNC_LEASE = float(os.getenv("SWITCH_SYNC_LEASE", "120"))
+SWITCH_SYNC_MAX_ATTEMPTS = int(os.getenv("SWITCH_SYNC_MAX_ATTEMPTS", "8"))
+SWITCH_SYNC_BACKOFF_BASE = float(os.getenv("SWITCH_SYNC_BACKOFF_BASE", "5"))
+SWITCH_SYNC_BACKOFF_MAX = float(os.getenv("SWITCH_SYNC_BACKOFF_MAX", "3600"))
+
+
+def enqueue_switch_sync(db: Session, child_id: int) -> SwitchSyncJob | None:
+    """Record that the child's Switch should get its current limit.
+
+    Commits. Returns None when the child has no wallet (nothing to sync).
+    """
+    limit = desired_switch_limit(db, child_id)
+    if limit is None:
+        return None
+    now = datetime.utcnow()
+    insert = (
+        postgresql.insert
+        if db.get_bind().dialect.name == "postgresql"
+        else sqlite.insert
+    )
+    stmt = insert(SwitchSyncJob).values(
+        child_id=child_id,
+        desired_limit=limit,
+        version=1,
+        status=SyncJobStatus.PENDING,
+        attempts=0,
+        next_attempt_at=now + timedelta(seconds=SWITCH_SYNC_DEBOUNCE),
+        enqueued_at=now,
+        updated_at=now,
+    )
+    # SET expressions see the existing row: a finished job starts over
+    finished = SwitchSyncJob.status != SyncJobStatus.PENDING
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SwitchSyncJob.child_id],
+        set_={
+            "desired_limit": stmt.excluded.desired_limit,
+            "version": SwitchSyncJob.version + 1,
+            "status": SyncJobStatus.PENDING,
+            "next_attempt_at": stmt.excluded.next_attempt_at,
+            "attempts": case((finished, 0), else_=SwitchSyncJob.attempts),
+            "last_error": case((finished, None), else_=SwitchSyncJob.last_error),
+            "enqueued_at": case(
+                (finished, stmt.excluded.enqueued_at), else_=SwitchSyncJob.enqueued_at
+            ),
+            "updated_at": now,
+        },
+    )
+    job = db.scalars(
+        stmt.returning(SwitchSyncJob),
+        execution_options={"populate_existing": True},
+    ).one()
+    db.commit()
+    return job
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with ±50% jitter for the given failed-attempt count."""
+    delay = min(SWITCH_SYNC_BACKOFF_MAX, SWITCH_SYNC_BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.5)
+
+
+def queue_stats(db: Session) -> dict:
+    """Jobs per status and the age of the oldest pending job (seconds)."""
+    counts = {status.value: 0 for status in SyncJobStatus}
+    for status, count in (
+        db.query(SwitchSyncJob.status, func.count())
+        .group_by(SwitchSyncJob.status)
+        .all()
+    ):
+        counts[SyncJobStatus(status).value] = count
+    oldest = (
+        db.query(func.min(SwitchSyncJob.enqueued_at))
+        .filter(SwitchSyncJob.status == SyncJobStatus.PENDING)
+        .scalar()
+    )
+    lag = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+    return {"depth": counts, "lag_seconds": max(0.0, lag)}
+
+
+@dataclass
+class _ClaimedJob:
+    id: int
+    child_id: int
+    version: int
+    attempts: int
+
+
+class SwitchSyncWorker:
+    """Polls the outbox and pushes due jobs, off the request path."""
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def run_once(self) -> int:
+        """Claim and process one batch of due jobs. Returns the number claimed."""
+        jobs = await asyncio.to_thread(self._claim)
+        if jobs:
+            await asyncio.gather(*(self._process(job) for job in jobs))
+        return len(jobs)
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Switch sync worker iteration failed")
+                claimed = 0
+            if claimed < SWITCH_SYNC_BATCH:
+                await asyncio.sleep(SWITCH_SYNC_POLL_INTERVAL)
+
+    def _claim(self) -> list[_ClaimedJob]:
+        now = datetime.utcnow()
+        lease = now + timedelta(seconds=SWITCH_SYNC_LEASE)
+        claimable = (
+            SwitchSyncJob.status == SyncJobStatus.PENDING,
+            SwitchSyncJob.next_attempt_at <= now,
+            or_(SwitchSyncJob.locked_until.is_(None), SwitchSyncJob.locked_until < now),
+        )
+        db = self._session_factory()
+        try:
+            candidates = (
+                db.query(SwitchSyncJob)
+                .filter(*claimable)
+                .order_by(SwitchSyncJob.next_attempt_at)
+                .limit(SWITCH_SYNC_BATCH)
+                .all()
+            )
+            claimed = []
+            for job in candidates:
+                # Conditional UPDATE so two workers never hold the same job
+                result = db.execute(
+                    update(SwitchSyncJob)
+                    .where(SwitchSyncJob.id == job.id, *claimable)
+                    .values(locked_until=lease)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount == 1:
+                    claimed.append(
+                        _ClaimedJob(
+                            job.id,
+                            job.child_id,
+                            job.version,
+                            job.attempts,
+                        )
+                    )
+            if claimed:
+                db.commit()
+            # else: nothing written; close() rolls back without firing commit hooks
+            return claimed
+        finally:
+            db.close()
+
+    async def _process(self, job: _ClaimedJob):
+        error, fatal = None, False
+        db = self._session_factory()
+        try:
+            # Limit computed now: a retry after midnight or after reward
+            # changes that did not re-enqueue must not push a stale value
+            await sync_child(db, job.child_id)
+        except InvalidSessionTokenException as e:
+            error, fatal = f"Nintendo session token rejected: {e}", True
+        except Exception as e:
+            error = repr(e)
+        finally:
+            db.close()
+        # Upstream considered down: wait for the breaker, keep the attempt
+        defer = switch_service.breaker.retry_after() if error and not fatal else 0
+        await asyncio.to_thread(self._finish, job, error, fatal, defer)
+
+    def _finish(
+        self, job: _ClaimedJob, error: str | None, fatal: bool, defer: float = 0
+    ):
+        db = self._session_factory()
+        try:
+            row = db.get(SwitchSyncJob, job.id)
+            if row is None:
+                return
+            row.locked_until = None
+            if error is None:
+                if row.version == job.version:
+                    row.status = SyncJobStatus.DONE
+                    row.attempts = 0
+                    row.last_error = None
+                # else: a newer limit was enqueued while we pushed; stays pending
+            elif defer:
+                row.last_error = error[:2000]
+                row.next_attempt_at = max(
+                    row.next_attempt_at, datetime.utcnow() + timedelta(seconds=defer)
+                )
+                logger.info(
+                    f"Switch sync for child {job.child_id} deferred {defer:.0f}s "
+                    f"(Nintendo circuit open): {error}"
+                )
+            else:
+                row.attempts = job.attempts + 1
+                row.last_error = error[:2000]
+                if fatal or row.attempts >= SWITCH_SYNC_MAX_ATTEMPTS:
+                    row.status = SyncJobStatus.DEAD
+                    logger.error(
+                        f"Switch sync for child {job.child_id} dead-lettered "
+                        f"after {row.attempts} attempt(s): {error}"
+                    )
+                else:
+                    delay = backoff_seconds(row.attempts)
+                    row.next_attempt_at = max(
+                        row.next_attempt_at,
+                        datetime.utcnow() + timedelta(seconds=delay),
+                    )
+                    logger.warning(
+                        f"Switch sync for child {job.child_id} failed "
+                        f"(attempt {row.attempts}), retrying in {delay:.0f}s: {error}"
+                    )
+            db.commit()
+        finally:
+            db.close()
+
+
+sync_worker = SwitchSyncWorker()
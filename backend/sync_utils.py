@@ -1,13 +1,30 @@
+import asyncio
 import logging
+import os
 from datetime import date
 
+from pynintendoauth.exceptions import InvalidSessionTokenException
 from sqlalchemy.orm import Session
 
-from backend.models import RewardLog, User, UserRole
-from backend.switch_service import switch_service
+from backend.circuit_breaker import CircuitOpenError
+from backend.models import (
+    ActivityWallet,
+    RewardLog,
+    SwitchDeviceLink,
+    SwitchDeviceState,
+    User,
+    UserRole,
+)
+from backend.switch_service import clamp_limit, switch_service
 
 logger = logging.getLogger(__name__)
 
+# Device updates run concurrently, at most SWITCH_SYNC_CONCURRENCY at a time.
+SWITCH_SYNC_CONCURRENCY = int(os.getenv("SWITCH_SYNC_CONCURRENCY", "4"))
+SWITCH_DEVICE_TIMEOUT = float(os.getenv("SWITCH_DEVICE_TIMEOUT", "15"))
+SWITCH_DEVICE_RETRIES = int(os.getenv("SWITCH_DEVICE_RETRIES", "1"))
+SWITCH_DEVICE_RETRY_DELAY = float(os.getenv("SWITCH_DEVICE_RETRY_DELAY", "0.5"))
+
 
 def _calculate_switch_limit(db: Session, child_id: int, wallet) -> int:
     """Calculate the effective Switch daily limit: base limit + today's earned bonus.
@@ -31,65 +48,313 @@ def _calculate_switch_limit(db: Session, child_id: int, wallet) -> int:
     return min(effective_limit, wallet.balance_minutes + base_limit)
 
 
-async def trigger_switch_sync(db: Session, child_id: int):
+async def _update_device(
+    token: str, device: dict, limit: int, semaphore: asyncio.Semaphore
+) -> bool:
+    """Push the limit to one device with a timeout and retries.
+
+    ``False`` from the service (device not found) and an open circuit are not
+    retried; an invalid session token is raised so the caller can ask the user
+    to re-link.
     """
-    子供の現在のウォレット残高を、連携済みの Nintendo Switch デバイスに同期する。
-    承認フローのバックグラウンドタスクとして呼び出されることを想定。
+    for attempt in range(SWITCH_DEVICE_RETRIES + 1):
+        try:
+            async with semaphore:
+                return await asyncio.wait_for(
+                    switch_service.update_device_limit(
+                        token, device["device_id"], limit
+                    ),
+                    timeout=SWITCH_DEVICE_TIMEOUT,
+                )
+        except InvalidSessionTokenException:
+            raise
+        except CircuitOpenError as e:
+            logger.warning(f"Switch device {device['name']} not updated: {e}")
+            return False
+        except Exception as e:
+            if attempt == SWITCH_DEVICE_RETRIES:
+                logger.error(
+                    f"Switch device {device['name']} failed after "
+                    f"{attempt + 1} attempts: {e!r}"
+                )
+                return False
+            logger.warning(f"Retrying Switch device {device['name']}: {e!r}")
+            await asyncio.sleep(SWITCH_DEVICE_RETRY_DELAY * 2**attempt)
+    return False
+
+
+async def _push_to_devices(token: str, devices: list[dict], limit: int) -> list[bool]:
+    semaphore = asyncio.Semaphore(max(1, SWITCH_SYNC_CONCURRENCY))
+    return await asyncio.gather(
+        *(_update_device(token, dev, limit, semaphore) for dev in devices)
+    )
+
+
+async def push_limit_to_devices(
+    token: str, devices: list[dict], limit: int
+) -> tuple[list[str], list[str]]:
+    """Update all devices concurrently. Returns ``(synced_names, failed_names)``."""
+    results = await _push_to_devices(token, devices, limit)
+    synced, failed = [], []
+    for dev, success in zip(devices, results, strict=True):
+        (synced if success else failed).append(dev["name"])
+    return synced, failed
+
+
+def _record_applied(
+    db: Session,
+    states: dict[str, SwitchDeviceState],
+    parent_id: int,
+    devices: list[dict],
+    target: int,
+):
+    today = date.today()
+    for dev in devices:
+        state = states.pop(dev["device_id"], None)
+        if state is None:
+            state = SwitchDeviceState(parent_id=parent_id, device_id=dev["device_id"])
+            db.add(state)
+        state.device_name = dev["name"]
+        state.applied_limit = target
+        state.applied_on = today
+
+
+async def apply_switch_limit(
+    db: Session,
+    parent_id: int,
+    token: str,
+    limit: int,
+    devices: list[dict] | None = None,
+) -> tuple[list[str], list[str]]:
+    """Bring the parent's Switch devices to ``limit`` (delta only).
+
+    ``devices`` (``device_id`` / ``name`` dicts, see :func:`child_devices`)
+    restricts the push to those consoles without fetching the device list:
+    exactly one Nintendo call per console not already at ``limit`` today.
+
+    Without it, every device of the account is covered:
+
+    - If every device recorded in ``SwitchDeviceState`` already had ``limit``
+      applied today, nothing is fetched or pushed.
+    - Otherwise the device list is fetched and only devices whose
+      ``current_limit`` differs are updated.
+
+    Returns ``(synced_names, failed_names)``; devices already at the target
+    count as synced. Successful devices are recorded as applied today.
     """
-    try:
-        # 子供のウォレット情報を取得
-        child = (
-            db.query(User)
-            .filter(User.id == child_id, User.role == UserRole.CHILD)
-            .first()
+    target = clamp_limit(limit)
+    today = date.today()
+    states = {
+        s.device_id: s
+        for s in db.query(SwitchDeviceState)
+        .filter(SwitchDeviceState.parent_id == parent_id)
+        .all()
+    }
+
+    if devices is not None:
+        unchanged, changed = [], []
+        for dev in devices:
+            state = states.get(dev["device_id"])
+            done = state and state.applied_limit == target and state.applied_on == today
+            (unchanged if done else changed).append(dev)
+        results = await _push_to_devices(token, changed, limit)
+        synced = [d for d, ok in zip(changed, results, strict=True) if ok]
+        failed = [d["name"] for d, ok in zip(changed, results, strict=True) if not ok]
+        _record_applied(db, states, parent_id, synced, target)
+        db.commit()
+        return [d["name"] for d in unchanged + synced], failed
+
+    if states and all(
+        s.applied_limit == target and s.applied_on == today for s in states.values()
+    ):
+        logger.debug(
+            f"Switch sync skipped for parent {parent_id}: {target}m already applied"
         )
-        if not child or not child.wallet:
-            logger.warning(f"Sync skipped: Child {child_id} or wallet not found.")
-            return
-
-        # 同期用の親ユーザー（トークン保持者）を検索
-        # BUG FIX: Use SQLAlchemy .isnot(None) instead of Python `is not None`
-        parent = (
-            db.query(User)
-            .filter(
-                User.role == UserRole.PARENT,
-                User.nintendo_session_token.isnot(None),
-            )
-            .first()
+        return [s.device_name or s.device_id for s in states.values()], []
+
+    devices = await switch_service.get_devices(token)
+    unchanged = [d for d in devices if d.get("current_limit") == target]
+    changed = [d for d in devices if d.get("current_limit") != target]
+    results = await _push_to_devices(token, changed, limit)
+    synced = [d for d, ok in zip(changed, results, strict=True) if ok]
+    failed = [d["name"] for d, ok in zip(changed, results, strict=True) if not ok]
+
+    applied = unchanged + synced
+    _record_applied(db, states, parent_id, applied, target)
+    seen = {d["device_id"] for d in devices}
+    for device_id, state in states.items():
+        if device_id not in seen:
+            db.delete(state)
+    db.commit()
+
+    if unchanged:
+        logger.debug(
+            f"{len(unchanged)} Switch device(s) of parent {parent_id} already at {target}m"
         )
+    return [d["name"] for d in applied], failed
 
-        if not parent:
-            logger.debug(
-                f"Sync skipped: No parent with Nintendo session token found for child {child_id}."
-            )
-            return
 
-        limit = _calculate_switch_limit(db, child_id, child.wallet)
+def child_devices(db: Session, parent_id: int, child_id: int) -> list[dict] | None:
+    """Consoles of the parent's account linked to the child (``SwitchDeviceLink``).
 
-        logger.info(
-            f"Starting background sync for child {child_id} "
-            f"(balance: {child.wallet.balance_minutes}, effective_limit: {limit}m)"
+    None means every console: nothing on the account is linked yet, as before
+    links existed. An empty list means the consoles belong to other children.
+    """
+    links = (
+        db.query(SwitchDeviceLink)
+        .filter(
+            SwitchDeviceLink.child_id == child_id,
+            SwitchDeviceLink.parent_id == parent_id,
         )
+        .all()
+    )
+    if links:
+        return [
+            {"device_id": link.device_id, "name": link.device_name or link.device_id}
+            for link in links
+        ]
+    any_link = (
+        db.query(SwitchDeviceLink.id)
+        .filter(SwitchDeviceLink.parent_id == parent_id)
+        .first()
+    )
+    return [] if any_link else None
 
-        token = parent.get_nintendo_token()
-        devices = await switch_service.get_devices(token)
-        synced = 0
-        for dev in devices:
-            success = await switch_service.update_device_limit(
-                token, dev["device_id"], limit
-            )
-            if success:
-                synced += 1
-                logger.info(
-                    f"Successfully synced {limit}m to Switch device: {dev['name']}"
-                )
-            else:
-                logger.error(f"Failed to sync to Switch device: {dev['name']}")
 
-        if synced == 0 and devices:
-            logger.error(
-                f"Sync failed: 0/{len(devices)} devices updated for child {child_id}"
-            )
+def household_targets(
+    db: Session, parent_id: int
+) -> list[tuple[int, int, list[dict] | None]]:
+    """``(child_id, limit, devices)`` to push for the parent's account.
 
+    With console links, each linked child with a wallet gets its own limit on
+    its own consoles. Without any, the parent's first child (by id) with a
+    wallet covers every console (``devices`` None).
+    """
+    links = (
+        db.query(SwitchDeviceLink)
+        .filter(SwitchDeviceLink.parent_id == parent_id)
+        .order_by(SwitchDeviceLink.child_id, SwitchDeviceLink.device_id)
+        .all()
+    )
+    if not links:
+        child_id = (
+            db.query(User.id)
+            .join(ActivityWallet, ActivityWallet.child_id == User.id)
+            .filter(User.parent_id == parent_id, User.role == UserRole.CHILD)
+            .order_by(User.id)
+            .limit(1)
+            .scalar()
+        )
+        if child_id is None:
+            return []
+        return [(child_id, desired_switch_limit(db, child_id), None)]
+
+    by_child: dict[int, list[dict]] = {}
+    for link in links:
+        by_child.setdefault(link.child_id, []).append(
+            {"device_id": link.device_id, "name": link.device_name or link.device_id}
+        )
+    targets = []
+    for child_id, devices in by_child.items():
+        limit = desired_switch_limit(db, child_id)
+        if limit is not None:
+            targets.append((child_id, limit, devices))
+    return targets
+
+
+class SwitchSyncError(Exception):
+    """A sync attempt failed on every device it tried (retryable)."""
+
+
+def _find_sync_parent(db: Session, child_id: int) -> User | None:
+    """The linked parent whose Nintendo account a child's sync goes to.
+
+    The owner of the child's linked consoles, else the child's own parent.
+    Only children without a parent (single-family setups predating
+    ``parent_id``) fall back to the first parent with a token.
+    """
+    child = db.get(User, child_id)
+    parent_id = (
+        db.query(SwitchDeviceLink.parent_id)
+        .filter(SwitchDeviceLink.child_id == child_id)
+        .limit(1)
+        .scalar()
+    ) or (child.parent_id if child else None)
+    if parent_id is not None:
+        parent = db.get(User, parent_id)
+        return parent if parent and parent.nintendo_session_token else None
+
+    # 同期用の親ユーザー（トークン保持者）を検索
+    # BUG FIX: Use SQLAlchemy .isnot(None) instead of Python `is not None`
+    return (
+        db.query(User)
+        .filter(
+            User.role == UserRole.PARENT,
+            User.nintendo_session_token.isnot(None),
+        )
+        .first()
+    )
+
+
+def desired_switch_limit(db: Session, child_id: int) -> int | None:
+    """Limit the child's Switch should have now, or None if there is no wallet."""
+    child = (
+        db.query(User).filter(User.id == child_id, User.role == UserRole.CHILD).first()
+    )
+    if not child or not child.wallet:
+        return None
+    return _calculate_switch_limit(db, child_id, child.wallet)
+
+
+async def sync_child(db: Session, child_id: int, limit: int | None = None) -> bool:
+    """Push the child's limit (computed now unless given) to the linked Switch.
+
+    Only the child's own consoles are updated (see :func:`child_devices`).
+    Returns False when there is nothing to sync (no wallet / no linked parent /
+    no console of the child).
+    Raises ``SwitchSyncError`` when every device update failed and
+    ``InvalidSessionTokenException`` when Nintendo rejects the session token.
+    """
+    if limit is None:
+        limit = desired_switch_limit(db, child_id)
+        if limit is None:
+            logger.warning(f"Sync skipped: Child {child_id} or wallet not found.")
+            return False
+
+    parent = _find_sync_parent(db, child_id)
+    if not parent:
+        logger.debug(
+            f"Sync skipped: No parent with Nintendo session token found for child {child_id}."
+        )
+        return False
+    devices = child_devices(db, parent.id, child_id)
+    if devices == []:
+        logger.debug(f"Sync skipped: No Switch linked to child {child_id}.")
+        return False
+
+    logger.info(f"Starting sync for child {child_id} (effective_limit: {limit}m)")
+
+    token = parent.get_nintendo_token()
+    synced, failed = await apply_switch_limit(db, parent.id, token, limit, devices)
+    for name in synced:
+        logger.info(f"Switch device {name} is at {limit}m")
+    for name in failed:
+        logger.error(f"Failed to sync to Switch device: {name}")
+
+    if failed and not synced:
+        raise SwitchSyncError(
+            f"0/{len(failed)} devices updated for child {child_id}: "
+            + ", ".join(failed)
+        )
+    return True
+
+
+async def trigger_switch_sync(db: Session, child_id: int):
+    """
+    子供の現在のウォレット残高を、連携済みの Nintendo Switch デバイスに同期する。
+    即時同期用。承認フローからは永続キュー (backend.sync_queue) を経由する。
+    """
+    try:
+        await sync_child(db, child_id)
     except Exception as e:
         logger.error(f"Error in trigger_switch_sync: {e}")
@@ -8,11 +8,17 @@ if not os.getenv("ENCRYPTION_KEY"):
 
     os.environ["ENCRYPTION_KEY"] = Fernet.generate_key().decode()
 
+# Switch 同期キューのワーカーはテストでは起動しない（run_once で直接実行する）
+os.environ.setdefault("SWITCH_SYNC_WORKER", "0")
+os.environ.setdefault("SWITCH_SYNC_DEBOUNCE", "0")
+# 認証待ちセッションはプロセス内ストアを使う（DB ストアは個別テストで検証）
+os.environ.setdefault("SWITCH_PENDING_AUTH_STORE", "memory")
+
 # 修正されたインポートパス
 from backend.database import Base, get_db
 from backend.main import app
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
@@ -25,6 +31,22 @@ engine = create_engine(
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
+
+
+# pysqlite が BEGIN を遅延させると SAVEPOINT が外側のトランザクションの外で
+# 実行されてしまうため、BEGIN を SQLAlchemy 側から発行させる
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def _emit_begin(conn):
+    # StaticPool では全セッションが同じ接続を共有する
+    if not conn.connection.dbapi_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
+
+
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -64,3 +86,25 @@ def client(db_session):
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def assert_statement_budget():
+    """レスポンスの Server-Timing ヘッダーから SQL 文の数を検証するヘルパー。
+
+    使用例::
+
+        resp = client.get(f"/api/tasks/dashboard/child/{child_id}")
+        assert_statement_budget(resp, 5)
+    """
+    from backend.query_stats import statements_from_header
+
+    def check(response, budget: int):
+        count = statements_from_header(response.headers.get("server-timing", ""))
+        assert count <= budget, (
+            f"{response.request.method} {response.request.url.path} ran "
+            f"{count} SQL statements (budget: {budget})"
+        )
+        return count
+
+    return check
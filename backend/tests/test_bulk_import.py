@@ -0,0 +1,107 @@
+"""Tests for bulk user import (backend/bulk_import.py)."""
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from backend import bulk_import
+from backend.models import ActivityWallet, User, UserRole
+from backend.security import verify_pin
+
+CSV = """name,role,pin,email,age,ref,parent_ref
+Tanaka Parent,parent,1111,tanaka@example.com,,tanaka,
+Tanaka Child,child,2222,,9,,tanaka
+Sato Child,child,,,8,,sato
+,child,3333,,,,tanaka
+Sato Parent,parent,4444,tanaka@example.com,,sato,
+Suzuki Parent,parent,,,,suzuki,
+Orphan,teacher,,,,,
+"""
+
+
+def _import(client, content, filename="users.csv", dry_run=False):
+    return client.post(
+        f"/api/auth/import?dry_run={str(dry_run).lower()}",
+        files={"file": (filename, content)},
+        headers={"X-API-Key": "test"},
+    )
+
+
+def test_csv_import_reports_bad_rows_and_imports_the_rest(client, db_session):
+    resp = _import(client, CSV)
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["created"] == 3
+    assert [e["row"] for e in body["errors"]] == [3, 4, 5, 7]
+    created = {u["name"]: u["id"] for u in body["users"]}
+
+    parent = db_session.get(User, created["Tanaka Parent"])
+    child = db_session.get(User, created["Tanaka Child"])
+    assert child.role == UserRole.CHILD
+    assert child.parent_id == parent.id
+    assert child.age == 9
+    assert verify_pin("2222", child.pin)
+    wallet = db_session.query(ActivityWallet).filter_by(child_id=child.id).one()
+    assert wallet.balance_minutes == 0
+    assert wallet.daily_limit_minutes == 60
+    assert db_session.get(User, created["Suzuki Parent"]).pin is None
+
+
+def test_json_dry_run_validates_without_writing(client, db_session):
+    parent = User(name="Existing", role=UserRole.PARENT)
+    db_session.add(parent)
+    db_session.commit()
+    users = [
+        {"name": "Kid", "role": "child", "pin": 1234, "parent_id": parent.id},
+        {"name": "Lost", "role": "child", "parent_id": parent.id + 999},
+    ]
+
+    resp = _import(
+        client, json.dumps({"users": users}), filename="u.json", dry_run=True
+    )
+
+    body = resp.json()
+    assert body["dry_run"] is True
+    assert body["users"] == [
+        {"row": 1, "id": None, "name": "Kid", "role": "child", "ref": None}
+    ]
+    assert body["errors"][0]["row"] == 2
+    assert db_session.query(User).filter_by(name="Kid").count() == 0
+
+
+def test_unreadable_file_is_rejected(client, monkeypatch):
+    assert _import(client, "{", filename="u.json").status_code == 400
+    monkeypatch.setattr(bulk_import, "BULK_IMPORT_MAX_ROWS", 1)
+    assert _import(client, CSV).status_code == 400
+
+
+def test_constraint_violation_fails_only_that_row(db_session, monkeypatch):
+    # An e-mail registered between validation and insert
+    db_session.add(User(name="Taken", role=UserRole.PARENT, email="race@example.com"))
+    db_session.commit()
+    monkeypatch.setattr(bulk_import, "_existing_emails", lambda db, emails: set())
+    rows = [
+        {"name": "A", "role": "parent", "email": "race@example.com"},
+        {"name": "B", "role": "parent", "email": "b@example.com"},
+    ]
+
+    result = bulk_import.import_users(db_session, rows, workers=1)
+
+    assert [u["name"] for u in result["users"]] == ["B"]
+    assert result["errors"][0]["row"] == 1
+
+
+def test_hash_pins_on_process_pool(monkeypatch):
+    pins = [f"{i:04d}" for i in range(8)] + [None]
+    contexts = []
+
+    def pool(**kwargs):
+        contexts.append(kwargs["mp_context"].get_start_method())
+        return ProcessPoolExecutor(**kwargs)
+
+    monkeypatch.setattr(bulk_import, "ProcessPoolExecutor", pool)
+    hashed = bulk_import.hash_pins(pins, workers=2)
+
+    assert contexts == ["spawn"]  # never fork the server process
+    assert hashed[-1] is None
+    assert all(verify_pin(pin, h) for pin, h in zip(pins[:-1], hashed, strict=False))
@@ -0,0 +1,130 @@
+"""Tests for the Nintendo circuit breaker (backend/circuit_breaker.py)."""
+
+import asyncio
+
+import pytest
+from backend import metrics
+from backend import switch_service as switch_service_module
+from backend.circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+from backend.models import User, UserRole
+from backend.switch_service import SwitchService
+from pynintendoauth.exceptions import InvalidSessionTokenException
+
+
+class Upstream:
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+        self.delay = 0
+
+    async def __call__(self, *args):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [{"device_id": "d1", "name": "Switch", "current_limit": 60}]
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_fails_fast_then_probes():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+    upstream = Upstream()
+    upstream.error = ConnectionError("down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await breaker.call("op", upstream())
+    assert breaker.state is CircuitState.OPEN
+
+    with pytest.raises(CircuitOpenError) as err:
+        await breaker.call("op", upstream())
+    assert upstream.calls == 2  # not called while open
+    assert 0 < err.value.retry_after <= 0.05
+
+    await asyncio.sleep(0.06)
+    assert breaker.state is CircuitState.HALF_OPEN
+    with pytest.raises(ConnectionError):
+        await breaker.call("op", upstream())  # failed probe re-opens
+    assert breaker.state is CircuitState.OPEN
+
+    await asyncio.sleep(0.06)
+    upstream.error = None
+    assert await breaker.call("op", upstream())
+    assert breaker.state is CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    breaker._record_failure("op", ConnectionError())
+    upstream = Upstream()
+    upstream.delay = 0.05
+
+    probe = asyncio.create_task(breaker.call("op", upstream()))
+    await asyncio.sleep(0)
+    with pytest.raises(CircuitOpenError):
+        await breaker.call("op", upstream())
+    await probe
+    assert upstream.calls == 1
+    assert breaker.state is CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_latency_budget_counts_as_failure():
+    breaker = CircuitBreaker("test", failure_threshold=1, budgets={"slow": 0.02})
+    upstream = Upstream()
+    upstream.delay = 1
+
+    with pytest.raises(TimeoutError):
+        await breaker.call("slow", upstream())
+    assert breaker.state is CircuitState.OPEN
+    assert metrics.CIRCUIT_BREAKER_TRANSITIONS.value(breaker="test", state="open") >= 1
+
+
+@pytest.mark.asyncio
+async def test_ignored_errors_do_not_trip_breaker():
+    breaker = CircuitBreaker(
+        "test", failure_threshold=1, ignore=(InvalidSessionTokenException,)
+    )
+    upstream = Upstream()
+    upstream.error = InvalidSessionTokenException(400, "invalid_grant")
+
+    with pytest.raises(InvalidSessionTokenException):
+        await breaker.call("op", upstream())
+    assert breaker.state is CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_serves_last_known_devices(monkeypatch):
+    monkeypatch.setattr(switch_service_module, "SWITCH_DEVICE_CACHE_TTL", 0)
+    monkeypatch.setattr(switch_service_module, "SWITCH_DEVICE_CACHE_STALE", 0)
+    service = SwitchService(breaker=CircuitBreaker("test", failure_threshold=2))
+    upstream = Upstream()
+    service._fetch_devices = upstream
+
+    devices = await service.get_devices("token")
+    upstream.error = ConnectionError("down")
+    for _ in range(4):
+        assert await service.get_devices("token") == devices
+    assert service.breaker.state is CircuitState.OPEN
+    assert upstream.calls == 3  # 1 ok + 2 failures, then fail fast
+
+    with pytest.raises(CircuitOpenError):
+        await service.get_devices("other-token")  # nothing cached
+
+
+def test_devices_endpoint_returns_503_while_open(client, db_session, monkeypatch):
+    parent = User(name="BreakerParent", role=UserRole.PARENT, pin="x")
+    parent.set_nintendo_token("token")
+    db_session.add(parent)
+    db_session.commit()
+
+    async def fail_fast(token):
+        raise CircuitOpenError("nintendo", 12.3)
+
+    monkeypatch.setattr(switch_service_module.switch_service, "get_devices", fail_fast)
+    resp = client.get(f"/api/switch/devices/{parent.id}", headers={"X-API-Key": "test"})
+
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "12"
@@ -0,0 +1,119 @@
+import json
+from datetime import date
+
+from backend.compression import PrecompressedCache, choose_encoding
+from backend.models import SwitchFleetRun, User, UserRole
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+
+def _create_child_with_plans(client, n_plans=5):
+    child_id = client.post(
+        "/api/auth/register", json={"name": "圧縮テスト", "role": "child"}
+    ).json()["id"]
+    for i in range(n_plans):
+        client.post(
+            "/api/plans/",
+            json={
+                "child_id": child_id,
+                "plan_date": str(date.today()),
+                "title": f"計画 {i}",
+                "tasks": [
+                    {"subject": "算数", "estimated_minutes": 30, "is_homework": True},
+                    {"subject": "国語", "estimated_minutes": 20},
+                ],
+            },
+        )
+    return child_id
+
+
+def test_choose_encoding_respects_q_values():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+
+
+def test_plan_list_is_gzipped_above_threshold(client):
+    child_id = _create_child_with_plans(client)
+
+    resp = client.get(
+        f"/api/plans/?child_id={child_id}", headers={"Accept-Encoding": "gzip"}
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["vary"]
+    assert len(resp.json()) == 5
+
+
+def test_uncompressible_route_is_untouched(client):
+    resp = client.get("/api/auth/users", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert "content-encoding" not in resp.headers
+
+
+def test_parent_dashboard_served_precompressed(client):
+    _create_child_with_plans(client)
+
+    first = client.get(
+        "/api/tasks/dashboard/parent", headers={"Accept-Encoding": "gzip"}
+    )
+    second = client.get(
+        "/api/tasks/dashboard/parent", headers={"Accept-Encoding": "gzip"}
+    )
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.json() == second.json()
+    assert len(first.json()["today_plans"]) >= 5
+
+
+def test_dashboard_cache_invalidated_by_commit(client):
+    child_id = _create_child_with_plans(client, n_plans=1)
+
+    before = client.get(f"/api/tasks/dashboard/child/{child_id}").json()
+    client.post(
+        f"/api/wallet/{child_id}/adjust", json={"minutes": 15, "reason": "テスト"}
+    )
+    after = client.get(f"/api/tasks/dashboard/child/{child_id}").json()
+    assert after["wallet_balance"] == before["wallet_balance"] + 15
+
+
+def test_dashboard_cache_survives_commits_that_write_nothing_it_reads(db_session):
+    cache = PrecompressedCache(ttl=60, tables=["users"])
+    cache.put("key", b"{}", cache.generation)
+
+    db_session.commit()  # read-only
+    db_session.add(SwitchFleetRun())
+    db_session.commit()
+    assert cache.get("key") is not None
+
+    nested = db_session.begin_nested()
+    db_session.add(User(name="キャッシュ", role=UserRole.CHILD))
+    nested.commit()  # savepoint released; the outer commit invalidates
+    assert cache.get("key") is not None
+    db_session.commit()
+    assert cache.get("key") is None
+
+    cache.put("key", b"{}", cache.generation)
+    other = Session(
+        bind=db_session.connection(), join_transaction_mode="create_savepoint"
+    )
+    other.execute(update(User).values(age=10))
+    other.rollback()
+    other.commit()
+    other.close()
+    assert cache.get("key") is not None
+
+
+def test_history_export_streams_ndjson(client):
+    child_id = _create_child_with_plans(client, n_plans=1)
+    plan = client.get(f"/api/plans/?child_id={child_id}").json()[0]
+    for task in plan["tasks"]:
+        client.post(f"/api/tasks/{task['id']}/complete")
+
+    resp = client.get(
+        f"/api/history/{child_id}/export", headers={"Accept-Encoding": "gzip"}
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "content-length" not in resp.headers
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert {entry["subject"] for entry in lines} == {"算数", "国語"}
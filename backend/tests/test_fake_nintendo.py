@@ -0,0 +1,101 @@
+"""SwitchService against the local fake Nintendo server (backend/fake_nintendo.py)."""
+
+import json
+
+import pytest
+import pytest_asyncio
+from backend import http_clients
+from backend.fake_nintendo import PARENTAL_HOST, FakeNintendoConfig, FakeNintendoServer
+from backend.switch_service import SwitchService
+from pynintendoauth.exceptions import HttpException, InvalidSessionTokenException
+
+
+@pytest_asyncio.fixture
+async def fake_nintendo(monkeypatch):
+    servers = []
+
+    async def start(**config):
+        server = FakeNintendoServer(
+            FakeNintendoConfig(latency_ms=0, latency_jitter_ms=0, **config)
+        )
+        monkeypatch.setattr(http_clients, "NINTENDO_API_BASE_URL", await server.start())
+        servers.append(server)
+        return server
+
+    await http_clients.aclose()
+    yield start
+    await http_clients.aclose()
+    for server in servers:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_sync_round_trip_through_fake_server(fake_nintendo):
+    server = await fake_nintendo(devices_per_account=3)
+    service = SwitchService()
+
+    devices = await service.get_devices("session-a")
+    assert [d["name"] for d in devices] == ["Switch 1", "Switch 2", "Switch 3"]
+    assert {d["current_limit"] for d in devices} == {120}
+
+    assert await service.update_device_limit("session-a", devices[0]["device_id"], 45)
+
+    # A fresh client (new login) sees the limit stored by the fake
+    fresh = await SwitchService().get_devices("session-a")
+    assert fresh[0]["current_limit"] == 45
+    assert fresh[1]["current_limit"] == 120
+    assert server.stats["POST /v3/actions/parentalControlSetting/updatePlayTimer"] == 1
+    assert server.stats["POST /connect/1.0.0/api/token"] == 2
+
+
+@pytest.mark.asyncio
+async def test_fake_server_rejects_expired_session_tokens(fake_nintendo):
+    await fake_nintendo(expired_token_rate=1.0)
+
+    with pytest.raises(InvalidSessionTokenException):
+        await SwitchService().get_devices("session-expired")
+
+
+@pytest.mark.asyncio
+async def test_fake_server_injects_errors(fake_nintendo):
+    server = await fake_nintendo(error_rate=1.0)
+
+    with pytest.raises(HttpException):
+        await SwitchService().get_devices("session-b")
+    assert server.stats["injected_503"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fake_server_replays_recorded_devices(fake_nintendo, tmp_path):
+    cassette = tmp_path / "nintendo.jsonl"
+    recorded = {
+        "deviceId": "REALDEVICE01",
+        "label": "リビングの Switch",
+        "parentalControlSettingState": {"updatedAt": 1700000000},
+        "alarmSetting": {"visibility": "VISIBLE"},
+    }
+    cassette.write_text(
+        json.dumps(
+            {
+                "method": "GET",
+                "host": PARENTAL_HOST,
+                "path": "/v2/actions/user/fetchOwnedDevices",
+                "query": {},
+                "status": 200,
+                "body": {"ownedDevices": [recorded]},
+            },
+            ensure_ascii=False,
+        )
+        + "\n",
+        encoding="utf-8",
+    )
+    await fake_nintendo(replay_from=str(cassette))
+    service = SwitchService()
+
+    devices = await service.get_devices("session-c")
+    assert [(d["device_id"], d["name"]) for d in devices] == [
+        ("REALDEVICE01", "リビングの Switch")
+    ]
+    assert await service.update_device_limit("session-c", "REALDEVICE01", 30)
+    fresh = await SwitchService().get_devices("session-c")
+    assert fresh[0]["current_limit"] == 30
@@ -0,0 +1,186 @@
+"""Tests for the fleet-wide Switch limit push (backend/fleet_sync.py)."""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from backend import fleet_sync
+from backend.models import (
+    ActivityWallet,
+    FleetRunStatus,
+    SwitchFleetRun,
+    User,
+    UserRole,
+)
+from backend.switch_service import nintendo_call_budget
+from pynintendoauth.exceptions import InvalidSessionTokenException
+from sqlalchemy.orm import sessionmaker
+
+
+def _household(db, name, limit=60, linked=True, with_child=True):
+    parent = User(name=name, role=UserRole.PARENT, pin="x")
+    if linked:
+        parent.set_nintendo_token(f"token-{name}")
+    db.add(parent)
+    db.flush()
+    if with_child:
+        child = User(name=f"{name}Child", role=UserRole.CHILD, parent_id=parent.id)
+        db.add(child)
+        db.flush()
+        db.add(
+            ActivityWallet(
+                child_id=child.id, balance_minutes=100, daily_limit_minutes=limit
+            )
+        )
+    db.commit()
+    return parent
+
+
+class FakeApply:
+    def __init__(self):
+        self.calls = []
+        self.errors = {}
+        self.budgets = []
+
+    async def __call__(self, db, parent_id, token, limit, devices=None):
+        self.calls.append((parent_id, token, limit))
+        self.budgets.append(nintendo_call_budget.get())
+        error = self.errors.get(parent_id)
+        if isinstance(error, Exception):
+            raise error
+        if error == "devices":
+            return [], ["Living"]
+        return ["Living"], []
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    fake = FakeApply()
+    monkeypatch.setattr(fleet_sync, "apply_switch_limit", fake)
+    return fake
+
+
+@pytest.fixture
+def fleet(db_session):
+    return fleet_sync.FleetPush(
+        session_factory=sessionmaker(bind=db_session.get_bind()),
+        rate=0,
+        concurrency=3,
+    )
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_allows_burst_then_paces():
+    bucket = fleet_sync.TokenBucket(rate=50, burst=2)
+    start = time.monotonic()
+    for _ in range(2):
+        await bucket.acquire()
+    assert time.monotonic() - start < 0.02
+    for _ in range(3):
+        await bucket.acquire()
+    # 3 tokens beyond the burst at 50/s take ~60 ms
+    assert time.monotonic() - start >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_fleet_push_covers_every_linked_household(db_session, fleet, applied):
+    ok = _household(db_session, "FleetOk", limit=45)
+    broken = _household(db_session, "FleetBroken")
+    expired = _household(db_session, "FleetExpired")
+    partial = _household(db_session, "FleetPartial")
+    childless = _household(db_session, "FleetChildless", with_child=False)
+    _household(db_session, "FleetUnlinked", linked=False)
+    applied.errors = {
+        broken.id: RuntimeError("boom"),
+        expired.id: InvalidSessionTokenException(400, "invalid_grant"),
+        partial.id: "devices",
+    }
+
+    summary = await fleet.run()
+
+    assert summary["status"] == "done"
+    assert summary["total"] == 5
+    assert summary["processed"] == 5
+    assert (summary["synced"], summary["skipped"], summary["failed"]) == (1, 1, 3)
+    assert summary["cursor"] == childless.id
+    assert (ok.id, "token-FleetOk", 45) in applied.calls
+    # Every account ran under the run's shared call budget
+    assert all(isinstance(b, fleet_sync.TokenBucket) for b in applied.budgets)
+    assert nintendo_call_budget.get() is None
+
+
+@pytest.mark.asyncio
+async def test_fleet_push_resumes_abandoned_run_from_cursor(db_session, fleet, applied):
+    first = _household(db_session, "ResumeA")
+    second = _household(db_session, "ResumeB")
+    third = _household(db_session, "ResumeC")
+    stale = datetime.utcnow() - timedelta(seconds=fleet_sync.SWITCH_FLEET_LEASE + 1)
+    run = SwitchFleetRun(
+        trigger="cli",
+        total=3,
+        processed=2,
+        synced=2,
+        cursor=second.id,
+        heartbeat_at=stale,
+    )
+    db_session.add(run)
+    db_session.commit()
+
+    # An abandoned run does not block a new one, but resume() finishes it
+    summaries = await fleet.resume()
+
+    assert [c[0] for c in applied.calls] == [third.id]
+    assert first.id not in [c[0] for c in applied.calls]
+    assert summaries[0]["id"] == run.id
+    assert summaries[0]["processed"] == 3
+    assert summaries[0]["status"] == "done"
+    assert await fleet.resume() == []
+
+
+@pytest.mark.asyncio
+async def test_fleet_push_refuses_to_overlap_active_run(db_session, fleet, applied):
+    _household(db_session, "OverlapA")
+    db_session.add(SwitchFleetRun(trigger="cli", status=FleetRunStatus.RUNNING))
+    db_session.commit()
+
+    assert await fleet.run() is None
+    assert applied.calls == []
+
+
+@pytest.mark.asyncio
+async def test_scheduler_starts_daily_run_once(db_session, fleet, applied):
+    _household(db_session, "DailyA")
+    scheduler = fleet_sync.FleetScheduler(fleet, at="04:00")
+    early = datetime(2026, 4, 1, 3, 59)
+    due = datetime(2026, 4, 1, 4, 0)
+
+    assert await scheduler.tick(early) == []
+    summaries = await scheduler.tick(due)
+    assert [s["trigger"] for s in summaries] == ["schedule"]
+    assert await scheduler.tick(due + timedelta(hours=1)) == []
+    assert len(applied.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_run_keeps_cursor_for_resume(db_session, fleet, monkeypatch):
+    households = [_household(db_session, f"Cancel{i}") for i in range(4)]
+    release = asyncio.Event()
+
+    async def slow_apply(db, parent_id, token, limit, devices=None):
+        if parent_id != households[0].id:
+            await release.wait()
+        return ["Living"], []
+
+    monkeypatch.setattr(fleet_sync, "apply_switch_limit", slow_apply)
+    task = asyncio.create_task(fleet.run())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    run = db_session.query(SwitchFleetRun).one()
+    db_session.refresh(run)
+    assert run.status == FleetRunStatus.RUNNING
+    assert run.cursor == households[0].id
+    assert run.processed == 1
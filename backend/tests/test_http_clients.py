@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+from backend import http_clients
+
+
+@pytest.mark.asyncio
+async def test_nintendo_session_is_shared_and_closed():
+    session = http_clients.nintendo_session()
+
+    assert http_clients.nintendo_session() is session
+    assert session.connector.limit_per_host == (
+        http_clients.NINTENDO_MAX_CONNECTIONS_PER_HOST
+    )
+
+    await http_clients.aclose()
+    assert session.closed
+    assert http_clients.nintendo_session() is not session
+    await http_clients.aclose()
+
+
+def test_clients_are_recreated_and_old_ones_closed_for_a_new_loop():
+    async def get():
+        clients = http_clients.nintendo_session(), http_clients.line_client()
+        await asyncio.sleep(0)  # let the replaced clients close
+        return clients
+
+    first = asyncio.run(get())
+    second = asyncio.run(get())
+    assert first[0] is not second[0] and first[1] is not second[1]
+    assert first[0].closed
+    assert first[1].is_closed
+    asyncio.run(http_clients.aclose())
+    assert second[0].closed
+    assert second[1].is_closed
+
+
+@pytest.mark.asyncio
+async def test_line_client_is_reused_until_closed():
+    client = http_clients.line_client()
+    assert http_clients.line_client() is client
+
+    await http_clients.aclose()
+    assert client.is_closed
+    assert http_clients.line_client() is not client
+    await http_clients.aclose()
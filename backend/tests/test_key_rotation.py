@@ -0,0 +1,116 @@
+"""Tests for the decrypted-token cache and key rotation (backend/key_rotation.py)."""
+
+import time
+
+import pytest
+from backend import security
+from backend.key_rotation import remaining_tokens, rotate_nintendo_tokens
+from backend.models import User, UserRole
+from cryptography.fernet import Fernet, MultiFernet
+from sqlalchemy.orm import sessionmaker
+
+
+def test_token_cache_skips_repeat_decrypts(monkeypatch):
+    calls = []
+    real_decrypt = security.decrypt_token
+    monkeypatch.setattr(
+        security, "decrypt_token", lambda t: calls.append(t) or real_decrypt(t)
+    )
+    cache = security.DecryptedTokenCache(max_entries=2, ttl=60)
+    encrypted = security.encrypt_token("session-1")
+
+    assert cache.decrypt(encrypted) == "session-1"
+    assert cache.decrypt(encrypted) == "session-1"
+    assert len(calls) == 1
+
+    cache.ttl = 0.01
+    cache.forget(encrypted)
+    cache.decrypt(encrypted)
+    time.sleep(0.02)
+    cache.decrypt(encrypted)
+    assert len(calls) == 3
+
+
+def test_token_cache_is_bounded_and_zeroes_evicted_buffers():
+    cache = security.DecryptedTokenCache(max_entries=2, ttl=60)
+    tokens = [security.encrypt_token(f"session-{i}") for i in range(3)]
+    cache.decrypt(tokens[0])
+    buffer = next(iter(cache._entries.values()))[1]
+
+    cache.decrypt(tokens[1])
+    cache.decrypt(tokens[2])
+
+    assert len(cache) == 2
+    assert buffer == bytearray(len("session-0"))
+
+
+def test_relinking_drops_cached_token(db_session):
+    user = User(name="CacheParent", role=UserRole.PARENT, pin="x")
+    user.set_nintendo_token("old-session")
+    old = user.nintendo_session_token
+    assert user.get_nintendo_token() == "old-session"
+
+    user.set_nintendo_token("new-session")
+    assert user.get_nintendo_token() == "new-session"
+    assert security.token_cache.decrypt(old) == "old-session"  # decrypted afresh
+
+
+@pytest.fixture
+def switch_key(monkeypatch):
+    """Move to a new ENCRYPTION_KEY, keeping the current one as an old key."""
+
+    def switch():
+        old = security.primary_fernet
+        new = Fernet(Fernet.generate_key())
+        monkeypatch.setattr(security, "primary_fernet", new)
+        monkeypatch.setattr(security, "fernet", MultiFernet([new, old]))
+        return new
+
+    return switch
+
+
+def test_rotation_reencrypts_tokens_in_chunks(db_session, switch_key):
+    users = []
+    for i in range(5):
+        user = User(name=f"Rotate{i}", role=UserRole.PARENT, pin="x")
+        user.set_nintendo_token(f"session-{i}")
+        users.append(user)
+    stray = User(name="RotateStray", role=UserRole.PARENT, pin="x")
+    stray.nintendo_session_token = Fernet(Fernet.generate_key()).encrypt(b"x").decode()
+    db_session.add_all(users + [stray])
+    db_session.commit()
+    new_key = switch_key()
+    users[0].set_nintendo_token("session-0")  # re-linked under the new key
+    db_session.commit()
+    factory = sessionmaker(bind=db_session.get_bind())
+    assert remaining_tokens(factory) == 5
+
+    progress = []
+    summary = rotate_nintendo_tokens(factory, batch_size=2, progress=progress.append)
+
+    assert (summary["rotated"], summary["current"], summary["failed"]) == (4, 1, 1)
+    assert len(progress) == 3
+    assert summary["last_id"] == stray.id
+    assert remaining_tokens(factory) == 1  # only the undecryptable one
+    for i, user in enumerate(users):
+        db_session.refresh(user)
+        assert new_key.decrypt(user.nintendo_session_token.encode()).decode() == (
+            f"session-{i}"
+        )
+
+
+def test_rotation_dry_run_changes_nothing(db_session, switch_key):
+    user = User(name="DryRun", role=UserRole.PARENT, pin="x")
+    user.set_nintendo_token("session")
+    db_session.add(user)
+    db_session.commit()
+    switch_key()
+    before = user.nintendo_session_token
+
+    summary = rotate_nintendo_tokens(
+        sessionmaker(bind=db_session.get_bind()), dry_run=True
+    )
+
+    db_session.refresh(user)
+    assert summary["rotated"] == 1
+    assert user.nintendo_session_token == before
@@ -0,0 +1,140 @@
+"""Tests for the async LINE notifier (backend/services/line_notify.py)."""
+
+import asyncio
+from urllib.parse import unquote_plus
+
+import httpx
+import pytest
+from backend import http_clients
+from backend.models import User, UserRole
+from backend.services import line_notify
+from backend.services.line_notify import LineNotifier, line_notifier
+
+
+@pytest.fixture
+def line_server(monkeypatch):
+    """Fake LINE endpoint recording delivered messages and peak concurrency."""
+    state = {"sent": [], "active": {}, "peak": 0, "peak_per_token": 0}
+
+    async def handler(request):
+        token = request.headers["Authorization"]
+        active = state["active"]
+        active[token] = active.get(token, 0) + 1
+        state["peak"] = max(state["peak"], sum(active.values()))
+        state["peak_per_token"] = max(state["peak_per_token"], active[token])
+        await asyncio.sleep(0.02)
+        active[token] -= 1
+        state["sent"].append((token, request.content.decode()))
+        return httpx.Response(200)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(http_clients, "line_client", lambda: client)
+    return state
+
+
+@pytest.mark.asyncio
+async def test_send_line_notify_posts_message(line_server):
+    assert await line_notify.send_line_notify("tok", "hello")
+    assert line_server["sent"] == [("Bearer tok", "message=hello")]
+    assert not await line_notify.send_line_notify("", "hello")
+
+
+@pytest.mark.asyncio
+async def test_notifier_caps_global_and_per_token_concurrency(line_server):
+    notifier = LineNotifier(concurrency=3, per_token=1)
+    notifier.start()
+    for i in range(8):
+        assert notifier.enqueue(f"token-{i % 4}", f"m{i}")
+
+    await notifier.stop(drain_timeout=5)
+
+    assert len(line_server["sent"]) == 8
+    assert line_server["peak"] == 3
+    assert line_server["peak_per_token"] == 1
+    assert not notifier.running
+    assert notifier._token_slots == {}
+
+
+@pytest.mark.asyncio
+async def test_enqueue_from_threadpool_and_when_full(line_server):
+    notifier = LineNotifier(concurrency=1, queue_limit=1)
+    assert not notifier.enqueue("tok", "not started")
+    notifier.start()
+
+    assert await asyncio.to_thread(notifier.enqueue, "tok", "from thread")
+    await asyncio.sleep(0)  # worker takes it off the queue
+    assert notifier.enqueue("tok", "queued")
+    assert not notifier.enqueue("tok", "over the limit")
+
+    await notifier.stop(drain_timeout=5)
+    assert [m for _, m in line_server["sent"]] == [
+        "message=from+thread",
+        "message=queued",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_digest_merges_notifications_within_window(line_server):
+    notifier = LineNotifier(digest_window=0.05, digest_max=10)
+    notifier.start()
+    for subject in ("算数", "国語", "理科"):
+        notifier.enqueue_digest(
+            "parent-a",
+            line_notify.APPROVAL_REQUEST,
+            {"child_name": "Taro", "subject": subject, "minutes": 20},
+        )
+    notifier.enqueue_digest(
+        "parent-b", line_notify.GAME_TIMEOUT, {"child_name": "Hanako"}
+    )
+    await asyncio.sleep(0.01)
+    assert line_server["sent"] == []  # still inside the window
+
+    await asyncio.sleep(0.2)
+    sent = dict(line_server["sent"])
+    assert len(line_server["sent"]) == 2
+    assert "承認依頼が3件届きました" in unquote_plus(sent["Bearer parent-a"])
+    await notifier.stop(drain_timeout=5)
+
+
+@pytest.mark.asyncio
+async def test_full_digest_is_sent_without_waiting(line_server):
+    notifier = LineNotifier(digest_window=60, digest_max=2)
+    notifier.start()
+    for name in ("Taro", "Jiro", "Saburo"):
+        notifier.enqueue_digest("tok", line_notify.GAME_TIMEOUT, {"child_name": name})
+    await asyncio.sleep(0.1)
+    assert len(line_server["sent"]) == 1  # Taro + Jiro; Saburo still waiting
+
+    await notifier.stop(drain_timeout=5)  # flushes the open digest
+    assert len(line_server["sent"]) == 2
+
+
+def test_digest_messages():
+    one = line_notify._approval_message(
+        [{"child_name": "Taro", "subject": "算数", "minutes": 30}]
+    )
+    assert one.startswith("\n📚 承認依頼が届きました！")
+    many = line_notify._game_timeout_message(
+        [{"child_name": "Taro"}, {"child_name": "Jiro"}, {"child_name": "Taro"}]
+    )
+    assert "Taro、Jiroのゲーム時間が終了しました。" in many
+
+
+def test_game_timeout_endpoint_only_enqueues(client, db_session, monkeypatch):
+    queued = []
+    monkeypatch.setattr(
+        line_notifier,
+        "enqueue_digest",
+        lambda token, kind, item: queued.append(token) or True,
+    )
+    parent = User(name="LineParent", role=UserRole.PARENT, line_notify_token="lt")
+    db_session.add(parent)
+    db_session.flush()
+    child = User(name="LineChild", role=UserRole.CHILD, parent_id=parent.id)
+    db_session.add(child)
+    db_session.commit()
+
+    resp = client.post(f"/api/notify/game-timeout/{child.id}")
+
+    assert resp.json()["notified_parents"] == ["LineParent"]
+    assert queued == ["lt"]
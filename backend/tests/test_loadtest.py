@@ -0,0 +1,32 @@
+from backend.loadtest import EndpointStats
+
+
+def test_endpoint_stats_percentiles():
+    stats = EndpointStats(latencies=[i / 1000 for i in range(1, 101)])
+
+    assert stats.count == 100
+    assert stats.percentile(50) == 0.05
+    assert stats.percentile(95) == 0.095
+    assert stats.percentile(99) == 0.099
+    assert EndpointStats().percentile(99) == 0.0
+
+
+def test_link_mock_switch_enables_sync(client):
+    parent_id = client.post(
+        "/api/auth/register", json={"name": "LTP", "role": "parent"}
+    ).json()["id"]
+    client.post(
+        "/api/auth/register",
+        json={"name": "LTC", "role": "child", "parent_id": parent_id},
+    )
+
+    resp = client.post(f"/api/test/link-switch/{parent_id}")
+    assert resp.status_code == 200
+
+    sync = client.post(f"/api/switch/sync/{parent_id}")
+    assert sync.status_code == 200
+    assert sync.json()["synced_devices"] == ["E2E Mock Switch"]
+
+
+def test_link_mock_switch_unknown_user(client):
+    assert client.post("/api/test/link-switch/99999").status_code == 404
@@ -0,0 +1,72 @@
+from datetime import date
+
+from backend import metrics
+
+
+def test_metrics_endpoint_exposes_route_histogram(client):
+    client.get("/api/health")
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert "# TYPE s2a_http_request_duration_seconds histogram" in body
+    assert (
+        's2a_http_request_duration_seconds_count{method="GET",route="/api/health",status="200"}'
+        in body
+    )
+    assert 's2a_db_pool_connections{state="checkedout"}' in body
+    assert 's2a_http_requests_in_flight{method="GET"} 1' in body
+
+
+def test_reward_metrics_recorded_on_approval(client):
+    parent_id = client.post(
+        "/api/auth/register", json={"name": "MP", "role": "parent"}
+    ).json()["id"]
+    child_id = client.post(
+        "/api/auth/register", json={"name": "MC", "role": "child"}
+    ).json()["id"]
+    client.post(
+        "/api/rules/",
+        json={
+            "description": "メトリクス",
+            "reward_minutes": 10,
+            "trigger_type": "task_completed",
+        },
+    )
+    task_id = client.post(
+        "/api/plans/",
+        json={
+            "child_id": child_id,
+            "plan_date": str(date.today()),
+            "title": "m",
+            "tasks": [{"subject": "理科"}],
+        },
+    ).json()["tasks"][0]["id"]
+    client.post(f"/api/tasks/{task_id}/complete")
+
+    grants_before = metrics.REWARD_GRANTS.value()
+    evaluations_before = metrics.REWARD_EVALUATION_DURATION.count()
+    client.post(f"/api/tasks/{task_id}/approve?parent_id={parent_id}")
+
+    assert metrics.REWARD_EVALUATION_DURATION.count() == evaluations_before + 1
+    assert metrics.REWARD_GRANTS.value() >= grants_before + 1
+
+
+def test_histogram_buckets_are_cumulative():
+    # Own registry so the test metric never shows up on /metrics
+    registry = metrics.Registry()
+    hist = metrics.Histogram(
+        "s2a_test_hist_seconds", "test", buckets=(0.1, 1.0), registry=registry
+    )
+    hist.observe(0.05)
+    hist.observe(0.5)
+    hist.observe(5)
+
+    lines = hist.render()
+    assert 's2a_test_hist_seconds_bucket{le="0.1"} 1' in lines
+    assert 's2a_test_hist_seconds_bucket{le="1"} 2' in lines
+    assert 's2a_test_hist_seconds_bucket{le="+Inf"} 3' in lines
+    assert "s2a_test_hist_seconds_count 3" in lines
+    assert "s2a_test_hist_seconds" in registry.render()
+    assert "s2a_test_hist_seconds" not in metrics.REGISTRY.render()
@@ -0,0 +1,184 @@
+"""Tests for pending Nintendo login stores (backend/pending_auth.py)."""
+
+import asyncio
+import time
+
+import pytest
+from backend import switch_service as switch_service_module
+from backend.models import PendingNintendoAuth, User, UserRole
+from backend.pending_auth import DbPendingAuthStore, MemoryPendingAuthStore
+from backend.switch_service import SwitchService, switch_service
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def db_store_factory(db_session):
+    # Each store stands in for one worker process sharing the database
+    def make(ttl=600):
+        return DbPendingAuthStore(
+            session_factory=sessionmaker(bind=db_session.get_bind()), ttl=ttl
+        )
+
+    return make
+
+
+def test_memory_store_hands_token_out_once():
+    store = MemoryPendingAuthStore()
+    store.put("s1", "verifier-1")
+
+    assert store.take_token("s1") is None  # not completed yet
+    assert store.complete("s1", "token-1")
+    assert store.take_token("s1") == "token-1"
+    assert store.take_token("s1") is None
+    assert store.get("s1") is None
+
+
+def test_memory_store_sweeps_in_expiry_order():
+    store = MemoryPendingAuthStore(ttl=10)
+    store.put("old", "v")
+    store.put("new", "v")
+    store.get("new").expires_at += 100  # e.g. a later login under the same state
+    store.put("newer", "v")
+
+    now = time.time()
+    assert store.sweep(now) == 0
+    assert store.sweep(now + 11) == 2  # "old" and "newer"; "new" still valid
+    assert store.get("new") is not None
+    assert len(store) == 1
+
+
+def test_db_store_is_shared_between_workers(db_store_factory, db_session):
+    worker_a, worker_b = db_store_factory(), db_store_factory()
+    worker_a.put("s2", "verifier-2")
+
+    assert worker_b.get("s2").verifier == "verifier-2"
+    assert worker_b.complete("s2", "token-2")
+    row = db_session.get(PendingNintendoAuth, "s2")
+    assert "token-2" not in row.session_token  # stored encrypted
+    assert "verifier-2" not in row.verifier
+
+    assert worker_a.take_token("s2") == "token-2"
+    assert worker_b.take_token("s2") is None
+
+
+def test_db_store_sweep_removes_only_expired(db_store_factory):
+    store = db_store_factory(ttl=5)
+    store.put("keep", "v")
+    expired = db_store_factory(ttl=-1)
+    expired.put("gone", "v")
+
+    assert not store.complete("gone", "t")
+    assert store.sweep() == 1
+    assert store.get("gone") is None
+    assert store.get("keep") is not None
+
+
+def test_auth_status_polled_on_another_worker(db_store_factory):
+    started_on = SwitchService(pending_auth=db_store_factory())
+    polled_on = SwitchService(pending_auth=db_store_factory())
+    started_on.pending_auth.put("s3", "verifier-3")
+
+    assert polled_on.get_auth_status("s3") == {"status": "pending"}
+    started_on.pending_auth.complete("s3", "token-3")
+    assert polled_on.get_auth_status("s3") == {
+        "status": "complete",
+        "session_token": "token-3",
+    }
+    assert started_on.get_auth_status("s3") == {"status": "unknown"}
+
+
+def test_auth_status_reports_expired_login(db_store_factory):
+    service = SwitchService(pending_auth=db_store_factory(ttl=-1))
+    service.pending_auth.put("s4", "verifier-4")
+
+    assert service._pending_verifier("s4") is None
+    assert service.get_auth_status("s4") == {"status": "expired"}
+    assert service.get_auth_status("s4") == {"status": "unknown"}
+
+
+@pytest.mark.asyncio
+async def test_long_poll_wakes_on_completion():
+    service = SwitchService(pending_auth=MemoryPendingAuthStore())
+    service.pending_auth.put("w1", "verifier")
+
+    waiting = asyncio.create_task(service.wait_auth_status("w1", timeout=5))
+    await asyncio.sleep(0.01)
+    assert service.auth_waiters.waiting("w1") == 1
+    start = time.monotonic()
+    service.pending_auth.complete("w1", "token-w1")
+    service.auth_waiters.notify("w1")  # what complete_login does
+
+    result = await waiting
+    assert result == {"status": "complete", "session_token": "token-w1"}
+    assert time.monotonic() - start < 0.5
+    assert service.auth_waiters.waiting("w1") == 0
+
+
+@pytest.mark.asyncio
+async def test_long_poll_rechecks_store_shared_with_other_worker(
+    db_store_factory, monkeypatch
+):
+    # Without PostgreSQL NOTIFY the waiting worker re-checks the shared store
+    monkeypatch.setattr(switch_service_module, "SWITCH_AUTH_WAIT_RECHECK", 0.05)
+    started_on = SwitchService(pending_auth=db_store_factory())
+    polled_on = SwitchService(pending_auth=db_store_factory())
+    started_on.pending_auth.put("w2", "verifier")
+
+    waiting = asyncio.create_task(polled_on.wait_auth_status("w2", timeout=5))
+    await asyncio.sleep(0.1)
+    assert not waiting.done()
+    started_on.pending_auth.complete("w2", "token-w2")
+
+    result = await asyncio.wait_for(waiting, 1)
+    assert result["status"] == "complete"
+
+
+@pytest.mark.asyncio
+async def test_long_poll_returns_on_expiry_or_timeout():
+    service = SwitchService(pending_auth=MemoryPendingAuthStore(ttl=0.1))
+    service.pending_auth.put("w3", "verifier")
+    assert await service.wait_auth_status("w3", timeout=5) == {"status": "expired"}
+
+    service.pending_auth.ttl = 600
+    service.pending_auth.put("w4", "verifier")
+    assert await service.wait_auth_status("w4", timeout=0.05) == {"status": "pending"}
+    assert await service.wait_auth_status("nope", timeout=5) == {"status": "unknown"}
+
+
+def _parent(db_session):
+    parent = User(name="AuthWaitParent", role=UserRole.PARENT, pin="x")
+    db_session.add(parent)
+    db_session.commit()
+    return parent
+
+
+def test_auth_status_long_poll_endpoint_links_token(client, db_session):
+    parent = _parent(db_session)
+    switch_service.pending_auth.put("e1", "verifier")
+    switch_service.pending_auth.complete("e1", "token-e1")
+
+    resp = client.get(
+        f"/api/switch/auth-status/e1?user_id={parent.id}&wait=5",
+        headers={"X-API-Key": "test"},
+    )
+
+    assert resp.json() == {"status": "complete"}
+    db_session.refresh(parent)
+    assert parent.get_nintendo_token() == "token-e1"
+
+
+def test_auth_status_stream_reports_pending_then_expired(client, db_session):
+    parent = _parent(db_session)
+    switch_service.pending_auth.put("e2", "verifier")
+    switch_service.pending_auth.get("e2").expires_at = time.time() + 0.2
+
+    resp = client.get(
+        f"/api/switch/auth-status/e2/stream?user_id={parent.id}",
+        headers={"X-API-Key": "test"},
+    )
+
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    assert resp.text == (
+        'event: status\ndata: {"status": "pending"}\n\n'
+        'event: status\ndata: {"status": "expired"}\n\n'
+    )
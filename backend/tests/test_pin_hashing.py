@@ -0,0 +1,82 @@
+"""Tests for the bounded PIN hashing pool (backend/pin_hashing.py)."""
+
+import asyncio
+import threading
+
+import pytest
+from backend import metrics, pin_hashing
+from backend.models import User, UserRole
+from backend.pin_hashing import PinHasher, PinHasherBusy
+from backend.security import hash_pin, is_legacy_pin, verify_pin
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.mark.asyncio
+async def test_pool_rejects_when_queue_is_full():
+    hasher = PinHasher(workers=1, queue_limit=1)
+    release = threading.Event()
+    running = [asyncio.create_task(hasher.run("hash", release.wait)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    assert hasher.pending == 2
+
+    with pytest.raises(PinHasherBusy) as err:
+        await hasher.run("hash", release.wait)
+    assert err.value.retry_after == pin_hashing.PIN_HASH_RETRY_AFTER
+
+    release.set()
+    await asyncio.gather(*running)
+    assert hasher.pending == 0
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_pool_matches_inline_bcrypt_and_records_metrics():
+    hasher = PinHasher(workers=1, queue_limit=0)
+    before = metrics.PIN_HASH_DURATION.count(operation="verify")
+
+    hashed = await hasher.hash_pin("2468")
+    assert verify_pin("2468", hashed)
+    assert await hasher.verify_pin("2468", hashed)
+    assert not await hasher.verify_pin("1357", hashed)
+    assert await hasher.verify_pin("1234", "1234")  # legacy plain text, inline
+    assert await hasher.verify_pin(None, None)
+    assert metrics.PIN_HASH_DURATION.count(operation="verify") == before + 2
+    assert metrics.PIN_HASH_QUEUE_WAIT.count(operation="hash") >= 1
+    hasher.shutdown()
+
+
+def test_login_returns_429_when_pool_is_saturated(client, db_session, monkeypatch):
+    user = User(name="BusyParent", role=UserRole.PARENT, pin=hash_pin("1234"))
+    db_session.add(user)
+    db_session.commit()
+
+    async def busy(*args):
+        raise PinHasherBusy(retry_after=3)
+
+    monkeypatch.setattr(pin_hashing.pin_hasher, "run", busy)
+    resp = client.post("/api/auth/login", json={"user_id": user.id, "pin": "1234"})
+
+    assert resp.status_code == 429
+    assert resp.headers["retry-after"] == "3"
+
+
+def test_login_rehashes_legacy_plain_text_pin(client, db_session, monkeypatch):
+    # The background task opens its own session; keep it in the test transaction
+    monkeypatch.setattr(
+        pin_hashing,
+        "SessionLocal",
+        sessionmaker(
+            bind=db_session.connection(), join_transaction_mode="create_savepoint"
+        ),
+    )
+    user = User(name="LegacyParent", role=UserRole.PARENT, pin="4321")
+    db_session.add(user)
+    db_session.commit()
+    assert is_legacy_pin(user.pin)
+
+    resp = client.post("/api/auth/login", json={"user_id": user.id, "pin": "4321"})
+
+    assert resp.status_code == 200
+    db_session.refresh(user)
+    assert not is_legacy_pin(user.pin)
+    assert verify_pin("4321", user.pin)
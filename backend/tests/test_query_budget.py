@@ -0,0 +1,72 @@
+"""SQL statement budgets per endpoint.
+
+Budgets are independent of data size, so an N+1 query pattern in a router
+or service shows up here as a failure instead of as latency in production.
+"""
+
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def family(client):
+    parent_id = client.post(
+        "/api/auth/register", json={"name": "予算P", "role": "parent"}
+    ).json()["id"]
+    child_ids = [
+        client.post(
+            "/api/auth/register",
+            json={"name": f"予算C{i}", "role": "child", "parent_id": parent_id},
+        ).json()["id"]
+        for i in range(3)
+    ]
+    for child_id in child_ids:
+        for i in range(3):
+            client.post(
+                "/api/plans/",
+                json={
+                    "child_id": child_id,
+                    "plan_date": str(date.today()),
+                    "title": f"計画{i}",
+                    "tasks": [
+                        {"subject": "算数", "is_homework": True},
+                        {"subject": "国語"},
+                    ],
+                },
+            )
+    return parent_id, child_ids
+
+
+def test_server_timing_header_present(client):
+    resp = client.get("/api/health")
+    assert 'desc="0 statements"' in resp.headers["server-timing"]
+
+
+def test_child_dashboard_budget(client, family, assert_statement_budget):
+    _, child_ids = family
+    resp = client.get(f"/api/tasks/dashboard/child/{child_ids[0]}")
+    assert resp.status_code == 200
+    assert_statement_budget(resp, 5)
+
+
+def test_parent_dashboard_budget(client, family, assert_statement_budget):
+    resp = client.get("/api/tasks/dashboard/parent")
+    assert resp.status_code == 200
+    assert_statement_budget(resp, 8)
+
+
+def test_plan_list_and_weekly_budget(client, family, assert_statement_budget):
+    assert_statement_budget(client.get("/api/plans/"), 2)
+    assert_statement_budget(client.get("/api/plans/weekly"), 2)
+
+
+def test_history_budget(client, family, assert_statement_budget):
+    _, child_ids = family
+    plan = client.get(f"/api/plans/?child_id={child_ids[0]}").json()[0]
+    for task in plan["tasks"]:
+        client.post(f"/api/tasks/{task['id']}/complete")
+
+    resp = client.get(f"/api/history/{child_ids[0]}")
+    assert len(resp.json()["entries"]) == 2
+    assert_statement_budget(resp, 3)
@@ -0,0 +1,98 @@
+from datetime import date
+
+import pytest
+from backend import seed
+from backend.models import (
+    ActivityWallet,
+    StudyPlan,
+    StudyTask,
+    TaskStatus,
+    User,
+    UserRole,
+)
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+
+@pytest.fixture(autouse=True)
+def _small_pin_pool(monkeypatch):
+    # bcrypt dominates the runtime of tiny datasets
+    monkeypatch.setattr(seed, "PIN_POOL_SIZE", 1)
+
+
+def _seeded(seed_value, families=5, days=14, engine=None, anchor_date=None):
+    engine = engine or create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    seed.generate_synthetic(
+        families,
+        days=days,
+        seed_value=seed_value,
+        bind=engine,
+        verbose=False,
+        anchor_date=anchor_date,
+    )
+    return engine
+
+
+def _task_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(
+            select(
+                StudyTask.id,
+                StudyTask.plan_id,
+                StudyTask.subject,
+                StudyTask.status,
+                StudyTask.actual_minutes,
+            ).order_by(StudyTask.id)
+        ).all()
+
+
+def test_generate_synthetic_is_deterministic():
+    rows = _task_rows(_seeded(42))
+
+    assert rows
+    assert rows == _task_rows(_seeded(42))
+    assert rows != _task_rows(_seeded(43))
+
+
+def test_generate_synthetic_dates_follow_anchor_date():
+    def plan_dates(anchor):
+        engine = _seeded(7, anchor_date=anchor)
+        with Session(engine) as db:
+            return sorted(d for (d,) in db.query(StudyPlan.plan_date).distinct())
+
+    # A Saturday and a Wednesday: weekday-dependent branches still agree
+    saturday = plan_dates(date(2024, 6, 1))
+    assert saturday == plan_dates(date(2024, 6, 1))
+    assert saturday[-1] <= date(2024, 6, 1)
+    assert _task_rows(_seeded(7, anchor_date=date(2024, 6, 5))) == _task_rows(
+        _seeded(7, anchor_date=date(2024, 6, 5))
+    )
+
+
+def test_generate_synthetic_rows_load_through_orm():
+    engine = _seeded(1)
+
+    with Session(engine) as db:
+        parents = db.query(User).filter(User.role == UserRole.PARENT).all()
+        children = db.query(User).filter(User.role == UserRole.CHILD).all()
+        assert len(parents) == 5
+        assert {c.parent_id for c in children} == {p.id for p in parents}
+        assert all(c.wallet is not None for c in children)
+        assert db.query(ActivityWallet).count() == len(children)
+
+        approved = (
+            db.query(StudyTask).filter(StudyTask.status == TaskStatus.APPROVED).first()
+        )
+        assert approved.approved_by in {p.id for p in parents}
+
+        before = db.query(User).count()
+
+    # A second run appends after the existing ids instead of colliding
+    _seeded(2, families=2, days=3, engine=engine)
+    with Session(engine) as db:
+        assert db.query(User).count() > before
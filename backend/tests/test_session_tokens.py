@@ -0,0 +1,115 @@
+"""Tests for HMAC-signed session tokens (backend/security.py)."""
+
+from datetime import date
+
+from backend import security
+from backend.security import issue_session_token, verify_session_token
+
+
+def test_token_round_trip_carries_claims():
+    token, expires_at = issue_session_token(7, "parent", 7)
+
+    claims = verify_session_token(token)
+    assert claims.user_id == 7
+    assert claims.role == "parent"
+    assert claims.family_id == 7
+    assert claims.expires_at == expires_at
+
+
+def test_tampered_or_expired_token_is_rejected(monkeypatch):
+    token, _ = issue_session_token(3, "child", 1)
+    payload, _, signature = token.partition(".")
+    forged, _ = issue_session_token(3, "parent", 1)
+
+    assert verify_session_token(f"{forged.partition('.')[0]}.{signature}") is None
+    assert verify_session_token(f"{payload}.{signature[:-2]}ñ") is None
+    assert verify_session_token("garbage") is None
+    expired, _ = issue_session_token(3, "child", 1, ttl=-1)
+    assert verify_session_token(expired) is None
+
+    monkeypatch.setattr(security, "SESSION_TOKEN_SECRET", b"another-secret")
+    assert verify_session_token(token) is None
+
+
+def _login(client, name, role, pin="1234", parent_id=None):
+    user = client.post(
+        "/api/auth/register",
+        json={"name": name, "role": role, "pin": pin, "parent_id": parent_id},
+    ).json()
+    resp = client.post("/api/auth/login", json={"user_id": user["id"], "pin": pin})
+    assert resp.status_code == 200
+    return user, resp.json()["session_token"]
+
+
+def test_login_issues_token_for_session_endpoint(client):
+    parent, token = _login(client, "SessionParent", "parent")
+
+    resp = client.get("/api/auth/session", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    assert resp.json()["user_id"] == parent["id"]
+    assert resp.json()["family_id"] == parent["id"]
+
+    resp = client.get("/api/auth/session", headers={"Authorization": "Bearer x.y"})
+    assert resp.status_code == 401
+    assert client.get("/api/auth/session").status_code == 401
+
+
+def _completed_task(client, child_id):
+    plan = client.post(
+        "/api/plans/",
+        json={
+            "child_id": child_id,
+            "plan_date": str(date.today()),
+            "title": "Session Plan",
+            "tasks": [{"subject": "Math", "estimated_minutes": 30}],
+        },
+    ).json()
+    task_id = plan["tasks"][0]["id"]
+    client.post(f"/api/tasks/{task_id}/complete")
+    return task_id
+
+
+def test_approve_with_parent_session_token(client):
+    parent, parent_token = _login(client, "ApproveParent", "parent")
+    child, child_token = _login(client, "ApproveChild", "child")
+    task_id = _completed_task(client, child["id"])
+
+    # Child tokens and another user's parent_id are refused
+    resp = client.post(
+        f"/api/tasks/{task_id}/approve",
+        headers={"Authorization": f"Bearer {child_token}"},
+    )
+    assert resp.status_code == 403
+    resp = client.post(
+        f"/api/tasks/{task_id}/approve?parent_id={parent['id'] + 100}",
+        headers={"Authorization": f"Bearer {parent_token}"},
+    )
+    assert resp.status_code == 403
+    assert client.post(f"/api/tasks/{task_id}/approve").status_code == 401
+
+    resp = client.post(
+        f"/api/tasks/{task_id}/approve",
+        headers={"Authorization": f"Bearer {parent_token}"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["task"]["status"] == "approved"
+
+
+def test_approve_is_limited_to_the_childs_family(client, monkeypatch):
+    parent, parent_token = _login(client, "FamilyParent", "parent")
+    _, other_token = _login(client, "OtherParent", "parent")
+    child, _ = _login(client, "FamilyChild", "child", parent_id=parent["id"])
+    task_id = _completed_task(client, child["id"])
+
+    resp = client.post(
+        f"/api/tasks/{task_id}/approve",
+        headers={"Authorization": f"Bearer {other_token}"},
+    )
+    assert resp.status_code == 403
+
+    # A bare parent_id needs the backend API key
+    monkeypatch.setattr(security, "BACKEND_API_KEY", "secret")
+    url = f"/api/tasks/{task_id}/approve?parent_id={parent['id']}"
+    assert client.post(url).status_code == 401
+    resp = client.post(url, headers={"X-API-Key": "secret"})
+    assert resp.status_code == 200
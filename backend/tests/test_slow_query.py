@@ -0,0 +1,41 @@
+from backend import slow_query
+
+
+def test_parameter_shape_hides_values():
+    assert slow_query.parameter_shape((1, "secret")) == ["int", "str"]
+    assert slow_query.parameter_shape({"pin": "1234"}) == {"pin": "str"}
+    assert slow_query.parameter_shape([(1,), (2,)], executemany=True) == {
+        "rows": 2,
+        "row": ["int"],
+    }
+
+
+def test_slow_query_captures_sqlite_plan_and_is_listed(client, db_session):
+    slow_query.clear()
+    record = slow_query.record_slow_query(
+        db_session.get_bind().engine,
+        "SELECT * FROM users WHERE users.id = ?",
+        (1,),
+        duration_ms=512.0,
+    )
+    assert record.wait_for_plan(timeout=5)
+    assert record.plan, record.plan_error
+    assert any("users" in line for line in record.plan)
+
+    resp = client.get("/api/debug/slow-queries")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["queries"][0]["statement"].startswith("SELECT * FROM users")
+    assert data["queries"][0]["parameter_shape"] == ["int"]
+
+
+def test_slow_statement_detected_by_listener(client, monkeypatch):
+    slow_query.clear()
+    monkeypatch.setattr(slow_query, "SLOW_QUERY_MS", 1e-9)
+    # Plan capture runs on the shared in-memory connection; skip it here.
+    monkeypatch.setattr(slow_query, "_EXPLAINABLE", ())
+
+    client.get("/api/auth/users")
+
+    routes = {q["route"] for q in slow_query.recent_slow_queries()}
+    assert "GET /api/auth/users" in routes
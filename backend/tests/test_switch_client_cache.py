@@ -0,0 +1,205 @@
+"""Tests for the cached Nintendo clients and device lists in SwitchService."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from backend import switch_service as switch_module
+from backend.switch_service import DeviceListCache, NintendoClientCache, SwitchService
+from pynintendoauth.exceptions import InvalidSessionTokenException
+
+
+class FakeAuth:
+    logins = 0
+
+    def __init__(self, session_token=None, client_session=None):
+        self.session_token = session_token
+        self._at_expiry = None
+
+    async def async_complete_login(self, use_session_token=False):
+        if self.session_token == "revoked":
+            raise InvalidSessionTokenException(400, "invalid_grant")
+        FakeAuth.logins += 1
+        self._at_expiry = datetime.now() + timedelta(hours=3)
+
+
+class FakeDevice:
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.name = f"Switch {device_id}"
+        self.limit_time = -1
+        self.fail_with = None
+
+    async def update_max_daily_playtime(self, minutes):
+        if self.fail_with:
+            raise self.fail_with
+        self.limit_time = minutes
+
+
+class FakeParental:
+    creates = 0
+
+    def __init__(self):
+        self.devices = {d: FakeDevice(d) for d in ("d1", "d2", "d3")}
+        self.updates = 0
+
+    @classmethod
+    async def create(cls, auth, timezone, lang):
+        cls.creates += 1
+        return cls()
+
+    async def update(self):
+        self.updates += 1
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(switch_module, "Authenticator", FakeAuth)
+    monkeypatch.setattr(switch_module, "NintendoParental", FakeParental)
+    FakeAuth.logins = 0
+    FakeParental.creates = 0
+    return SwitchService()
+
+
+@pytest.mark.asyncio
+async def test_sync_over_three_devices_logs_in_once(service):
+    devices = await service.get_devices("token-a")
+    for dev in devices:
+        assert await service.update_device_limit("token-a", dev["device_id"], 90)
+
+    assert FakeAuth.logins == 1
+    assert FakeParental.creates == 1
+    api, logged_in = await service.clients.get("token-a")
+    assert not logged_in
+    assert {d.limit_time for d in api.devices.values()} == {90}
+    await service.clients.clear()
+
+
+@pytest.mark.asyncio
+async def test_cached_client_refetches_devices(service):
+    await service._fetch_devices("token-a")
+    await service._fetch_devices("token-a")
+
+    api, _ = await service.clients.get("token-a")
+    assert api.updates == 1
+    await service.clients.clear()
+
+
+@pytest.mark.asyncio
+async def test_access_token_refreshed_before_expiry(service):
+    api, _ = await service.clients.get("token-a")
+    entry = next(iter(service.clients._entries.values()))
+    entry.auth._at_expiry = datetime.now() + timedelta(seconds=30)
+
+    again, logged_in = await service.clients.get("token-a")
+
+    assert again is api and not logged_in
+    assert FakeAuth.logins == 2  # refresh only, no new NintendoParental
+    assert FakeParental.creates == 1
+    await service.clients.clear()
+
+
+@pytest.mark.asyncio
+async def test_invalid_session_token_evicts_client(service):
+    api, _ = await service.clients.get("token-a")
+    api.devices["d1"].fail_with = InvalidSessionTokenException(400, "invalid_grant")
+
+    with pytest.raises(InvalidSessionTokenException):
+        await service.update_device_limit("token-a", "d1", 30)
+
+    assert len(service.clients) == 0
+    await service.get_devices("token-a")
+    assert FakeParental.creates == 2
+    await service.clients.clear()
+
+
+@pytest.mark.asyncio
+async def test_lru_and_ttl_eviction(service, monkeypatch):
+    cache = NintendoClientCache(max_entries=1)
+    await cache.get("token-a")
+    await cache.get("token-b")
+    assert len(cache) == 1
+    _, logged_in = await cache.get("token-a")
+    assert logged_in
+
+    monkeypatch.setattr(switch_module, "NINTENDO_CLIENT_TTL", 0)
+    _, logged_in = await cache.get("token-a")
+    assert logged_in
+    await cache.clear()
+
+
+class FakeFetch:
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+        self.gate = None
+
+    async def __call__(self, session_token):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error:
+            raise self.error
+        return [{"device_id": "d1", "name": f"v{self.calls}", "current_limit": 0}]
+
+
+@pytest.mark.asyncio
+async def test_device_list_served_from_cache_while_fresh():
+    fetch = FakeFetch()
+    cache = DeviceListCache(fetch)
+
+    first = await cache.get("token-a")
+    first[0]["name"] = "mutated"
+    second = await cache.get("token-a")
+
+    assert fetch.calls == 1
+    assert second[0]["name"] == "v1"
+
+
+@pytest.mark.asyncio
+async def test_stale_device_list_served_while_revalidating(monkeypatch):
+    fetch = FakeFetch()
+    cache = DeviceListCache(fetch)
+    await cache.get("token-a")
+    monkeypatch.setattr(switch_module, "SWITCH_DEVICE_CACHE_TTL", 0)
+
+    fetch.gate = asyncio.Event()
+    stale = await cache.get("token-a")
+    again = await cache.get("token-a")  # only one refresh in flight
+    assert stale[0]["name"] == again[0]["name"] == "v1"
+
+    fetch.gate.set()
+    await asyncio.sleep(0.01)
+    monkeypatch.setattr(switch_module, "SWITCH_DEVICE_CACHE_TTL", 300)
+    assert (await cache.get("token-a"))[0]["name"] == "v2"
+    assert fetch.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_last_known_devices_served_when_refresh_fails(monkeypatch):
+    fetch = FakeFetch()
+    cache = DeviceListCache(fetch)
+    await cache.get("token-a")
+    monkeypatch.setattr(switch_module, "SWITCH_DEVICE_CACHE_TTL", 0)
+    monkeypatch.setattr(switch_module, "SWITCH_DEVICE_CACHE_STALE", 0)
+
+    fetch.error = TimeoutError()
+    assert (await cache.get("token-a"))[0]["name"] == "v1"
+
+    fetch.error = InvalidSessionTokenException(400, "invalid_grant")
+    with pytest.raises(InvalidSessionTokenException):
+        await cache.get("token-a")
+    with pytest.raises(InvalidSessionTokenException):
+        await cache.get("token-a")  # evicted: nothing left to fall back to
+
+
+@pytest.mark.asyncio
+async def test_relinking_invalidates_device_list(service):
+    fetch = FakeFetch()
+    service.device_lists = DeviceListCache(fetch)
+    await service.get_devices("token-a")
+
+    await service.forget_token("token-a")
+    await service.get_devices("token-a")
+
+    assert fetch.calls == 2
@@ -4,11 +4,15 @@ Covers:
 1. _calculate_switch_limit includes today's earned bonus
 2. SQLAlchemy filter uses .isnot(None) instead of Python `is not None`
 3. Sync endpoint returns error when no devices were updated
+4. Syncs only touch the consoles linked to the child (SwitchDeviceLink)
+5. Relinking to another Nintendo account drops the old account's device state
+6. A parent without children never syncs another family's child
 """
 
 from datetime import date
 from unittest.mock import AsyncMock, patch
 
+import pytest
 from backend.models import ActivityWallet, RewardLog, User, UserRole
 from backend.sync_utils import _calculate_switch_limit
 
@@ -201,3 +205,236 @@ def test_background_sync_finds_parent_with_token(db_session):
     # Python's `is not None` always evaluates to True for a Column object
     buggy_result = User.nintendo_session_token is not None
     assert buggy_result is True  # This is always True - the bug!
+
+
+def _linked_parent(client, name):
+    parent_id = client.post(
+        "/api/auth/register", json={"name": name, "role": "parent", "pin": "1234"}
+    ).json()["id"]
+    client.post(
+        "/api/auth/register",
+        json={"name": f"{name}Child", "role": "child", "pin": "1234"},
+    )
+    from backend.database import get_db
+    from backend.main import app
+
+    db = next(app.dependency_overrides[get_db]())
+    db.query(User).filter(
+        User.id == parent_id
+    ).first().nintendo_session_token = "encrypted_dummy"
+    db.flush()
+    return parent_id
+
+
+def test_sync_only_pushes_devices_that_differ(client):
+    """Devices already at the target limit are not updated."""
+    parent_id = _linked_parent(client, "DeltaParent")
+    get_devices = AsyncMock(
+        return_value=[
+            {"device_id": "a", "name": "Living", "current_limit": -999},
+            {"device_id": "b", "name": "Bedroom", "current_limit": -999},
+        ]
+    )
+    update = AsyncMock(return_value=True)
+
+    with (
+        patch("backend.routers.switch.switch_service.get_devices", get_devices),
+        patch("backend.routers.switch.switch_service.update_device_limit", update),
+        patch("backend.security.decrypt_token", return_value="dummy_session_token"),
+    ):
+        first = client.post(f"/api/switch/sync/{parent_id}")
+        assert first.status_code == 200
+        assert update.await_count == 2
+
+        # Bedroom already shows the target; only Living has drifted
+        limit = update.await_args.args[2]
+        get_devices.return_value[1]["current_limit"] = limit
+        from backend.database import get_db
+        from backend.main import app
+        from backend.models import SwitchDeviceState
+
+        db = next(app.dependency_overrides[get_db]())
+        db.query(SwitchDeviceState).filter(
+            SwitchDeviceState.device_id == "a"
+        ).first().applied_limit = -1
+        db.flush()
+
+        update.reset_mock()
+        second = client.post(f"/api/switch/sync/{parent_id}")
+        assert second.status_code == 200
+        assert [c.args[1] for c in update.await_args_list] == ["a"]
+        assert sorted(second.json()["synced_devices"]) == ["Bedroom", "Living"]
+
+
+def test_sync_skips_device_fetch_when_limit_already_applied(client):
+    """A repeated sync with an unchanged limit makes no Nintendo calls."""
+    parent_id = _linked_parent(client, "NoopParent")
+    get_devices = AsyncMock(return_value=[{"device_id": "a", "name": "Living"}])
+    update = AsyncMock(return_value=True)
+
+    with (
+        patch("backend.routers.switch.switch_service.get_devices", get_devices),
+        patch("backend.routers.switch.switch_service.update_device_limit", update),
+        patch("backend.security.decrypt_token", return_value="dummy_session_token"),
+    ):
+        client.post(f"/api/switch/sync/{parent_id}")
+        resp = client.post(f"/api/switch/sync/{parent_id}")
+
+    assert resp.status_code == 200
+    assert resp.json()["synced_devices"] == ["Living"]
+    assert get_devices.await_count == 1
+    assert update.await_count == 1
+
+
+def _family(db, name, limits, linked=True):
+    parent = User(name=name, role=UserRole.PARENT, pin="x")
+    if linked:
+        parent.set_nintendo_token(f"token-{name}")
+    db.add(parent)
+    db.flush()
+    children = []
+    for i, limit in enumerate(limits):
+        child = User(
+            name=f"{name}Child{i}", role=UserRole.CHILD, pin="x", parent_id=parent.id
+        )
+        db.add(child)
+        db.flush()
+        db.add(
+            ActivityWallet(
+                child_id=child.id, balance_minutes=100, daily_limit_minutes=limit
+            )
+        )
+        children.append(child)
+    db.commit()
+    return parent, children
+
+
+def _link(db, parent, child, *device_ids):
+    from backend.models import SwitchDeviceLink
+
+    for device_id in device_ids:
+        db.add(
+            SwitchDeviceLink(
+                parent_id=parent.id,
+                child_id=child.id,
+                device_id=device_id,
+                device_name=device_id.upper(),
+            )
+        )
+    db.commit()
+
+
+@pytest.mark.asyncio
+async def test_child_sync_pushes_only_its_own_consoles(db_session):
+    """One call per linked console, with the child's own family token."""
+    from backend.sync_utils import sync_child
+
+    parent_a, (a1, a2) = _family(db_session, "FamA", [30, 90])
+    parent_b, (b1,) = _family(db_session, "FamB", [45])
+    _link(db_session, parent_a, a1, "a-living", "a-lite")
+    _link(db_session, parent_a, a2, "a-bedroom")
+    _link(db_session, parent_b, b1, "b-living")
+    get_devices = AsyncMock()
+    update = AsyncMock(return_value=True)
+
+    with (
+        patch("backend.sync_utils.switch_service.get_devices", get_devices),
+        patch("backend.sync_utils.switch_service.update_device_limit", update),
+    ):
+        assert await sync_child(db_session, a1.id)
+        assert await sync_child(db_session, a1.id)  # already applied today
+
+    assert get_devices.await_count == 0
+    assert sorted(c.args for c in update.await_args_list) == [
+        ("token-FamA", "a-lite", 30),
+        ("token-FamA", "a-living", 30),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_child_sync_never_uses_another_familys_token(db_session):
+    from backend.sync_utils import sync_child
+
+    _family(db_session, "Linked", [60])
+    _, (orphan,) = _family(db_session, "Unlinked", [60], linked=False)
+    update = AsyncMock(return_value=True)
+
+    with patch("backend.sync_utils.switch_service.update_device_limit", update):
+        assert not await sync_child(db_session, orphan.id)
+    assert update.await_count == 0
+
+
+def test_device_links_route_each_childs_limit(client, db_session):
+    parent, (c1, c2) = _family(db_session, "LinkFam", [30, 90])
+    headers = {"X-API-Key": "test"}
+
+    client.put(
+        f"/api/switch/device-links/{c1.id}",
+        json={"device_ids": ["living", "lite"]},
+        headers=headers,
+    )
+    resp = client.put(
+        f"/api/switch/device-links/{c2.id}",
+        json={"device_ids": ["lite"]},  # moves from c1 to c2
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    links = client.get(f"/api/switch/device-links/{parent.id}", headers=headers)
+    assert [(link["child_id"], link["device_id"]) for link in links.json()] == [
+        (c1.id, "living"),
+        (c2.id, "lite"),
+    ]
+
+    update = AsyncMock(return_value=True)
+    with patch("backend.routers.switch.switch_service.update_device_limit", update):
+        resp = client.post(f"/api/switch/sync/{parent.id}", headers=headers)
+
+    assert resp.status_code == 200
+    assert resp.json()["message"] == "30分、90分 を同期しました"
+    assert sorted(c.args[1:] for c in update.await_args_list) == [
+        ("lite", 90),
+        ("living", 30),
+    ]
+
+
+def test_sync_never_pushes_another_familys_child(client, db_session):
+    parent, _ = _family(db_session, "Childless", [])
+    _family(db_session, "Neighbour", [15], linked=False)
+    update = AsyncMock(return_value=True)
+
+    with patch("backend.routers.switch.switch_service.update_device_limit", update):
+        resp = client.post(
+            f"/api/switch/sync/{parent.id}", headers={"X-API-Key": "test"}
+        )
+
+    assert resp.status_code == 404
+    assert update.await_count == 0
+
+
+@pytest.mark.asyncio
+async def test_relinking_drops_state_of_the_previous_account(db_session):
+    from backend.models import SwitchDeviceLink, SwitchDeviceState
+    from backend.routers.switch import _link_token
+
+    parent, (child,) = _family(db_session, "Relink", [60])
+    _link(db_session, parent, child, "kept", "gone")
+    db_session.add(
+        SwitchDeviceState(
+            parent_id=parent.id,
+            device_id="kept",
+            applied_limit=60,
+            applied_on=date.today(),
+        )
+    )
+    db_session.commit()
+    get_devices = AsyncMock(return_value=[{"device_id": "kept", "name": "Kept"}])
+
+    with patch("backend.routers.switch.switch_service.get_devices", get_devices):
+        await _link_token(db_session, parent, "token-new-account")
+    db_session.commit()
+
+    get_devices.assert_awaited_once_with("token-new-account")
+    assert db_session.query(SwitchDeviceState).count() == 0
+    links = db_session.query(SwitchDeviceLink).filter_by(parent_id=parent.id)
+    assert [link.device_id for link in links] == ["kept"]
+    assert parent.get_nintendo_token() == "token-new-account"
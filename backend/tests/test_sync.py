@@ -1,5 +1,4 @@
 from datetime import date
-from unittest.mock import AsyncMock, patch
 
 import pytest
 from backend.sync_utils import trigger_switch_sync
@@ -79,8 +78,8 @@ async def test_sync_skips_when_no_parent_with_token_exists(db_session):
     assert wallet.balance_minutes == 60
 
 
-def test_approve_task_triggers_background_sync(client):
-    """タスク承認時にバックグラウンド同期が呼び出されることを確認するテスト"""
+def test_approve_task_triggers_background_sync(client, db_session):
+    """タスク承認時に Switch 同期ジョブがキューに積まれることを確認するテスト"""
     # 1. ユーザー作成
     parent_resp = client.post(
         "/api/auth/register", json={"name": "P", "role": "parent", "pin": "1234"}
@@ -91,10 +90,6 @@ def test_approve_task_triggers_background_sync(client):
     parent_id = parent_resp.json()["id"]
     child_id = child_resp.json()["id"]
 
-    # 親にトークンをセット (同期条件)
-    # 実際はAPI経由だが、ここではDBを直接触るか、あるいはモックで同期処理自体を乗っ取る
-    # 今回は sync_utils.trigger_switch_sync 自体をモックする
-
     # 2. 報酬ルール作成
     client.post(
         "/api/rules/",
@@ -122,19 +117,73 @@ def test_approve_task_triggers_background_sync(client):
     task_id = plan_resp.json()["tasks"][0]["id"]
     client.post(f"/api/tasks/{task_id}/complete")
 
-    # 4. 承認時に同期ユーティリティが呼ばれるかパッチを当てる
-    with patch("backend.routers.tasks.trigger_switch_sync") as mock_sync:
-        # AsyncMockとして設定
-        mock_sync.side_effect = AsyncMock()
-
-        response = client.post(f"/api/tasks/{task_id}/approve?parent_id={parent_id}")
-        assert response.status_code == 200
-        assert len(response.json()["rewards_granted"]) > 0
-
-        # TestClient はレスポンス返却後にバックグラウンドタスクを実行する
-        # そのため、ここでモックの呼び出しを確認できる
-        mock_sync.assert_called_once()
-        # 引数の確認 (db_session, child_id)
-        # 第1引数は Session オブジェクトなので型チェック
-        args, _ = mock_sync.call_args
-        assert args[1] == child_id
+    # 4. 承認すると永続キュー (switch_sync_jobs) に同期ジョブが積まれる
+    from backend.models import SwitchSyncJob, SyncJobStatus
+
+    response = client.post(f"/api/tasks/{task_id}/approve?parent_id={parent_id}")
+    assert response.status_code == 200
+    assert len(response.json()["rewards_granted"]) > 0
+
+    job = db_session.query(SwitchSyncJob).filter_by(child_id=child_id).one()
+    assert job.status == SyncJobStatus.PENDING
+    assert job.desired_limit > 0
+
+
+@pytest.mark.asyncio
+async def test_push_limit_updates_devices_concurrently(monkeypatch):
+    """複数台のデバイス更新は直列ではなく並行して行われること。"""
+    import asyncio
+    import time
+
+    from backend import sync_utils
+
+    async def slow_update(token, device_id, limit):
+        await asyncio.sleep(0.2)
+        return device_id != "broken"
+
+    monkeypatch.setattr(sync_utils.switch_service, "update_device_limit", slow_update)
+    devices = [{"device_id": f"d{i}", "name": f"Switch {i}"} for i in range(3)] + [
+        {"device_id": "broken", "name": "Broken"}
+    ]
+
+    start = time.perf_counter()
+    synced, failed = await sync_utils.push_limit_to_devices("tok", devices, 60)
+
+    assert time.perf_counter() - start < 0.5
+    assert synced == ["Switch 0", "Switch 1", "Switch 2"]
+    assert failed == ["Broken"]
+
+
+@pytest.mark.asyncio
+async def test_push_limit_retries_and_times_out(monkeypatch):
+    """タイムアウト・例外のデバイスはリトライし、最終的に失敗として集計されること。"""
+    import asyncio
+
+    from backend import sync_utils
+
+    calls = {"flaky": 0, "hung": 0}
+
+    async def update(token, device_id, limit):
+        calls[device_id] += 1
+        if device_id == "flaky" and calls["flaky"] == 1:
+            raise ConnectionError("reset")
+        if device_id == "hung":
+            await asyncio.sleep(10)
+        return True
+
+    monkeypatch.setattr(sync_utils.switch_service, "update_device_limit", update)
+    monkeypatch.setattr(sync_utils, "SWITCH_DEVICE_TIMEOUT", 0.05)
+    monkeypatch.setattr(sync_utils, "SWITCH_DEVICE_RETRY_DELAY", 0)
+
+    synced, failed = await sync_utils.push_limit_to_devices(
+        "tok",
+        [
+            {"device_id": "flaky", "name": "Flaky"},
+            {"device_id": "hung", "name": "Hung"},
+        ],
+        60,
+    )
+
+    assert synced == ["Flaky"]
+    assert failed == ["Hung"]
+    assert calls == {"flaky": 2, "hung": sync_utils.SWITCH_DEVICE_RETRIES + 1}
@@ -0,0 +1,236 @@
+"""Tests for the durable Switch sync queue (backend/sync_queue.py)."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from backend import sync_queue
+from backend.circuit_breaker import CircuitBreaker, CircuitOpenError
+from backend.models import (
+    ActivityWallet,
+    SwitchSyncJob,
+    SyncJobStatus,
+    User,
+    UserRole,
+)
+from backend.sync_utils import SwitchSyncError, desired_switch_limit
+from pynintendoauth.exceptions import InvalidSessionTokenException
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+
+@pytest.fixture
+def child(db_session):
+    child = User(name="QueueChild", role=UserRole.CHILD, pin="x")
+    db_session.add(child)
+    db_session.flush()
+    db_session.add(
+        ActivityWallet(child_id=child.id, balance_minutes=30, daily_limit_minutes=60)
+    )
+    db_session.commit()
+    return child
+
+
+@pytest.fixture
+def worker(db_session):
+    # Worker sessions share the test connection (and its outer transaction)
+    return sync_queue.SwitchSyncWorker(
+        session_factory=sessionmaker(bind=db_session.get_bind())
+    )
+
+
+class FakeSync:
+    def __init__(self):
+        self.calls = []
+        self.error = None
+
+    async def __call__(self, db, child_id, limit=None):
+        if limit is None:
+            limit = desired_switch_limit(db, child_id)
+        self.calls.append((child_id, limit))
+        if self.error:
+            raise self.error
+        return True
+
+
+@pytest.fixture
+def pushed(monkeypatch):
+    fake = FakeSync()
+    monkeypatch.setattr(sync_queue, "sync_child", fake)
+    return fake
+
+
+def test_enqueue_keeps_one_job_per_child_latest_limit_wins(db_session, child):
+    sync_queue.enqueue_switch_sync(db_session, child.id)
+    child.wallet.daily_limit_minutes = 90
+    db_session.commit()
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+
+    assert db_session.query(SwitchSyncJob).filter_by(child_id=child.id).count() == 1
+    assert job.version == 2
+    assert job.desired_limit == 90
+
+
+@pytest.mark.asyncio
+async def test_worker_pushes_due_job_and_marks_done(db_session, child, worker, pushed):
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+
+    assert await worker.run_once() == 1
+    assert pushed.calls == [(child.id, job.desired_limit)]
+    db_session.refresh(job)
+    assert job.status == SyncJobStatus.DONE
+    assert job.locked_until is None
+    assert await worker.run_once() == 0
+
+
+def test_concurrent_enqueues_share_one_row_and_bump_version(db_session, child):
+    # Two request sessions, neither having seen a job row for the child
+    make_session = sessionmaker(bind=db_session.get_bind())
+    first, second = make_session(), make_session()
+    sync_queue.enqueue_switch_sync(first, child.id)
+    job = sync_queue.enqueue_switch_sync(second, child.id)
+
+    assert job.version == 2
+    assert db_session.query(SwitchSyncJob).filter_by(child_id=child.id).count() == 1
+    first.close()
+    second.close()
+
+
+def test_enqueue_restarts_a_finished_job(db_session, child):
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+    job.status = SyncJobStatus.DEAD
+    job.attempts = 8
+    job.last_error = "boom"
+    db_session.commit()
+
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+    assert job.status == SyncJobStatus.PENDING
+    assert job.attempts == 0
+    assert job.last_error is None
+
+
+@pytest.mark.asyncio
+async def test_worker_pushes_limit_computed_at_push_time(
+    db_session, child, worker, pushed
+):
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+    assert job.desired_limit == 60
+    # e.g. a reward change that did not re-enqueue, or a retry past midnight
+    child.wallet.daily_limit_minutes = 45
+    db_session.commit()
+
+    await worker.run_once()
+    assert pushed.calls == [(child.id, 45)]
+
+
+@pytest.mark.asyncio
+async def test_failed_job_backs_off_then_dead_letters(
+    db_session, child, worker, pushed, monkeypatch
+):
+    monkeypatch.setattr(sync_queue, "SWITCH_SYNC_MAX_ATTEMPTS", 2)
+    pushed.error = SwitchSyncError("0/1 devices updated")
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+
+    await worker.run_once()
+    db_session.refresh(job)
+    assert job.status == SyncJobStatus.PENDING
+    assert job.attempts == 1
+    assert job.next_attempt_at > datetime.utcnow()
+    assert "devices updated" in job.last_error
+    assert await worker.run_once() == 0  # still backing off
+
+    job.next_attempt_at = datetime.utcnow()
+    db_session.commit()
+    await worker.run_once()
+    db_session.refresh(job)
+    assert job.status == SyncJobStatus.DEAD
+
+
+@pytest.mark.asyncio
+async def test_rejected_token_dead_letters_immediately(
+    db_session, child, worker, pushed
+):
+    pushed.error = InvalidSessionTokenException(400, "invalid_grant")
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+
+    await worker.run_once()
+    db_session.refresh(job)
+    assert job.status == SyncJobStatus.DEAD
+    assert job.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_defers_job_without_counting_attempt(
+    db_session, child, worker, pushed, monkeypatch
+):
+    breaker = CircuitBreaker("nintendo", failure_threshold=1, reset_timeout=60)
+    breaker._record_failure("get_devices", TimeoutError())
+    monkeypatch.setattr(sync_queue.switch_service, "breaker", breaker)
+    pushed.error = CircuitOpenError("nintendo", 60)
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+
+    await worker.run_once()
+    db_session.refresh(job)
+    assert job.status == SyncJobStatus.PENDING
+    assert job.attempts == 0
+    assert job.next_attempt_at > datetime.utcnow() + timedelta(seconds=50)
+    assert "circuit open" in job.last_error
+
+
+@pytest.mark.asyncio
+async def test_newer_limit_enqueued_during_push_stays_pending(
+    db_session, child, worker, monkeypatch
+):
+    async def sync_and_reenqueue(db, child_id, limit=None):
+        sync_queue.enqueue_switch_sync(db_session, child_id)
+        return True
+
+    monkeypatch.setattr(sync_queue, "sync_child", sync_and_reenqueue)
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+
+    await worker.run_once()
+    db_session.refresh(job)
+    assert job.status == SyncJobStatus.PENDING
+    assert job.version == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reclaimed_after_restart(
+    db_session, child, worker, pushed
+):
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+    job.locked_until = datetime.utcnow() + timedelta(minutes=5)  # held elsewhere
+    db_session.commit()
+    assert await worker.run_once() == 0
+
+    job.locked_until = datetime.utcnow() - timedelta(seconds=1)  # worker died
+    db_session.commit()
+    assert await worker.run_once() == 1
+
+
+def test_idle_claim_does_not_commit(db_session):
+    # Every commit fires the dashboard cache's invalidation hook
+    factory = sessionmaker(bind=db_session.get_bind())
+    commits = []
+    event.listen(factory, "after_commit", commits.append)
+    worker = sync_queue.SwitchSyncWorker(session_factory=factory)
+
+    assert worker._claim() == []
+    assert commits == []
+
+
+def test_queue_stats_reports_depth_and_lag(db_session, child):
+    job = sync_queue.enqueue_switch_sync(db_session, child.id)
+    job.enqueued_at = datetime.utcnow() - timedelta(seconds=30)
+    db_session.commit()
+
+    stats = sync_queue.queue_stats(db_session)
+    assert stats["depth"]["pending"] >= 1
+    assert stats["lag_seconds"] >= 30
+
+
+def test_backoff_grows_exponentially_with_jitter():
+    first = sync_queue.backoff_seconds(1)
+    fourth = sync_queue.backoff_seconds(4)
+    base = sync_queue.SWITCH_SYNC_BACKOFF_BASE
+    assert 0.5 * base <= first <= 1.5 * base
+    assert 0.5 * base * 8 <= fourth <= 1.5 * base * 8
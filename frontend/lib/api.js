@@ -58,11 +58,29 @@ export function isNetworkError(err) {
  * @returns {Promise<any>} パース済みの JSON レスポンス
  * @throws {Error} API がエラーレスポンスを返した場合
  */
+/** ログイン時に発行されるセッショントークンの localStorage キー */
+const SESSION_TOKEN_KEY = "s2a_session";
+
+/**
+ * 保存済みのセッショントークンを Authorization ヘッダーとして返す。
+ * サーバー側実行時やトークン未保存時は空オブジェクト。
+ * @returns {Record<string, string>}
+ */
+function sessionHeader() {
+  if (typeof window === "undefined") return {};
+  const token = window.localStorage.getItem(SESSION_TOKEN_KEY);
+  return token ? { Authorization: `Bearer ${token}` } : {};
+}
+
 async function request(path, options = {}) {
   const url = `${API_BASE}${path}`;
   const { headers: optHeaders, ...rest } = options;
   const fetchOptions = {
-    headers: { "Content-Type": "application/json", ...optHeaders },
+    headers: {
+      "Content-Type": "application/json",
+      ...sessionHeader(),
+      ...optHeaders,
+    },
     ...rest,
   };
 
@@ -117,9 +135,20 @@ export const authApi = {
   register: (data) =>
     request("/auth/register", { method: "POST", body: JSON.stringify(data) }),
 
-  /** PIN 認証でログインし、ユーザー情報とメッセージを返す */
-  login: (data) =>
-    request("/auth/login", { method: "POST", body: JSON.stringify(data) }),
+  /**
+   * PIN 認証でログインし、ユーザー情報とメッセージを返す。
+   * 発行されたセッショントークンは以降のリクエストに自動で付与される。
+   */
+  login: async (data) => {
+    const res = await request("/auth/login", {
+      method: "POST",
+      body: JSON.stringify(data),
+    });
+    if (res.session_token && typeof window !== "undefined") {
+      window.localStorage.setItem(SESSION_TOKEN_KEY, res.session_token);
+    }
+    return res;
+  },
 
   /** 全ユーザー一覧を取得（ロール選択画面で使用） */
   listUsers: () => request("/auth/users"),
@@ -399,15 +428,28 @@ export const switchApi = {
     request("/switch/callback", { method: "POST", body: JSON.stringify(data), headers: switchHeaders() }),
 
   /**
-   * 認証ステータスをポーリングする。
+   * 認証ステータスを取得する。
+   * wait（秒）を指定するとロングポーリングになり、認証完了・期限切れまで
+   * （最大 wait 秒）サーバー側で待ってから応答する。
    * @returns {{ status: "pending" | "complete" | "expired" | "unknown" }}
    */
-  authStatus: (state, userId) =>
-    request(`/switch/auth-status/${state}?user_id=${userId}`, { headers: switchHeaders() }),
+  authStatus: (state, userId, wait = 0) =>
+    request(`/switch/auth-status/${state}?user_id=${userId}&wait=${wait}`, { headers: switchHeaders() }),
 
   /** 連携済みデバイス一覧を取得 */
   listDevices: (userId) => request(`/switch/devices/${userId}`, { headers: switchHeaders() }),
 
+  /** 親アカウントの各 Switch 本体がどの子供に紐づいているかを取得 */
+  deviceLinks: (parentId) => request(`/switch/device-links/${parentId}`, { headers: switchHeaders() }),
+
+  /** 子供に紐づける Switch 本体（device_id の配列）を設定 */
+  setDeviceLinks: (childId, deviceIds) =>
+    request(`/switch/device-links/${childId}`, {
+      method: "PUT",
+      body: JSON.stringify({ device_ids: deviceIds }),
+      headers: switchHeaders(),
+    }),
+
   /** 現在の残高を Switch に同期 */
   sync: (userId) => request(`/switch/sync/${userId}`, { method: "POST", headers: switchHeaders() }),
 };